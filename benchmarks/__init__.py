@@ -0,0 +1 @@
+"""Бенчмарки yatube; запуск: python -m benchmarks.<модуль> --help."""
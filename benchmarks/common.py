@@ -0,0 +1,186 @@
+"""Общее для бенчмарков: настройка Django, статистика и JSON-отчёты."""
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_DIR = os.path.join(REPO_DIR, 'yatube')
+
+SQL_COUNT_RE = re.compile(r'sql;[^,]*desc="(\d+) queries"')
+
+
+def setup_django(database=None, media_root=None):
+    """Поднимает Django с боевыми настройками поверх yatube.settings.
+
+    DEBUG и поиск N+1 выключаются: они копят запросы в памяти и
+    искажают время. database подменяет файл SQLite, чтобы мерить
+    засеянную копию, а не рабочую базу; media_root — каталог с её
+    картинками.
+    """
+    if PROJECT_DIR not in sys.path:
+        sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+    import django
+    from django.conf import settings
+    settings.DEBUG = False
+    settings.NPLUSONE_MODE = None
+    settings.SERVER_TIMING_SAMPLE_RATE = 1.0
+    settings.PERF_LOG_SAMPLE_RATE = 0.0
+    if database:
+        settings.DATABASES['default']['NAME'] = os.path.abspath(database)
+    if media_root:
+        settings.MEDIA_ROOT = os.path.abspath(media_root)
+    django.setup()
+
+
+def add_report_arguments(parser):
+    parser.add_argument(
+        '--output', help='Куда сохранить результаты в JSON.'
+    )
+    parser.add_argument(
+        '--baseline', help='JSON прошлого запуска для сравнения.'
+    )
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2,
+        help='Допустимое ухудшение относительно базы, доля.'
+    )
+
+
+def percentile(ordered, fraction):
+    """Перцентиль по ближайшему рангу из отсортированной выборки."""
+    if not ordered:
+        return 0.0
+    rank = max(1, round(fraction * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(durations, elapsed):
+    """Сводка по длительностям в секундах и общему времени прогона."""
+    ordered = sorted(durations)
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'rps': round(len(ordered) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def queries_from_header(value):
+    """Число SQL-запросов из заголовка Server-Timing."""
+    match = SQL_COUNT_RE.search(value or '')
+    return int(match.group(1)) if match else None
+
+
+def reset_peak_rss(pid='self'):
+    # Linux сбрасывает VmHWM записью «5» в clear_refs.
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as file:
+            file.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb(pid='self'):
+    """Пиковый RSS процесса в килобайтах."""
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    if pid != 'self':
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux в килобайтах.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def environment():
+    import django
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def load_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_results(path, results, **meta):
+    with open(path, 'w') as file:
+        json.dump(
+            {'meta': {**environment(), **meta}, 'results': results},
+            file, ensure_ascii=False, indent=2, sort_keys=True
+        )
+
+
+def compare(results, baseline, metrics, tolerance):
+    """Строки сравнения с базой и список ухудшившихся метрик.
+
+    metrics — пары (имя, больше_лучше). Ухудшением считается сдвиг в
+    плохую сторону больше чем на tolerance.
+    """
+    lines = []
+    regressions = []
+    for name in sorted(results):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric, higher_is_better in metrics:
+            before, after = old.get(metric), results[name].get(metric)
+            if before is None or after is None:
+                continue
+            if before:
+                change = (after - before) / before
+            else:
+                change = float('inf') if after > before else 0.0
+            worse = -change if higher_is_better else change
+            mark = ''
+            if worse > tolerance:
+                mark = '  <-- хуже'
+                regressions.append(f'{name} {metric}')
+            lines.append(
+                f'{name:<40} {metric:<12} {before:>10} -> {after:>10} '
+                f'({change:+.1%}){mark}'
+            )
+    return lines, regressions
+
+
+def report(results, args, metrics, columns, **meta):
+    """Печатает таблицу, сохраняет JSON и сверяет с базой.
+
+    Возвращает код выхода: 1, если есть ухудшения относительно базы.
+    """
+    print(' '.join(
+        [f'{"name":<40}'] + [f'{column:>10}' for column in columns]
+    ))
+    for name in sorted(results):
+        row = results[name]
+        print(' '.join(
+            [f'{name:<40}']
+            + [f'{str(row.get(column, "")):>10}' for column in columns]
+        ))
+    if args.output:
+        save_results(args.output, results, **meta)
+    if not args.baseline:
+        return 0
+    baseline = load_results(args.baseline)['results']
+    lines, regressions = compare(results, baseline, metrics, args.tolerance)
+    print()
+    print('\n'.join(lines))
+    if regressions:
+        print(f'\nУхудшилось: {", ".join(regressions)}')
+        return 1
+    return 0
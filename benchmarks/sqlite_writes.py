@@ -0,0 +1,233 @@
+"""Конкурентные чтения и записи в SQLite до и после настроек core.sqlite.
+
+Несколько процессов, как воркеры gunicorn, одновременно открывают
+посты и создают посты и комментарии через тестовый клиент Django.
+Профиль «default» — журнал DELETE и новое соединение на каждый запрос,
+как было раньше; «production» — SQLITE_PRAGMAS и CONN_MAX_AGE из
+настроек; «write_queue» — то же, но записи идут через одного писателя
+(posts.write_queue). Каждый профиль работает на своей копии базы.
+
+    python -m benchmarks.sqlite_writes --workers 8 --seconds 20 \\
+        --output sqlite.json
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import common
+
+PROFILES = {
+    'default': {
+        'pragmas': {'journal_mode': 'delete'},
+        'conn_max_age': 0,
+    },
+    'production': {
+        'pragmas': None,
+        'conn_max_age': None,
+    },
+    'write_queue': {
+        'pragmas': None,
+        'conn_max_age': None,
+        'write_queue': True,
+    },
+}
+METRICS = (
+    ('reads_per_s', True), ('writes_per_s', True),
+    ('read_p95_ms', False), ('write_p95_ms', False), ('lock_errors', False),
+)
+COLUMNS = (
+    'reads_per_s', 'writes_per_s', 'read_p50_ms', 'read_p95_ms',
+    'write_p50_ms', 'write_p95_ms', 'lock_errors', 'other_errors',
+)
+
+
+def setup(database, profile):
+    common.setup_django(database)
+    from django.conf import settings
+    from django.db import connections
+
+    if profile['pragmas'] is not None:
+        settings.SQLITE_PRAGMAS = profile['pragmas']
+    if profile['conn_max_age'] is not None:
+        connections['default'].settings_dict['CONN_MAX_AGE'] = (
+            profile['conn_max_age']
+        )
+    if profile.get('write_queue'):
+        settings.WRITE_QUEUE_ENABLED = True
+        settings.WRITE_QUEUE_SOCKET = database + '.sock'
+    # Метрики и журналы пишут файлы и мешают замеру.
+    settings.METRICS_ENABLED = False
+    settings.SLOW_QUERY_THRESHOLD = None
+
+
+def worker(database, profile, seconds, write_ratio, seed, barrier, results):
+    setup(database, profile)
+    from django.test import Client
+    from django.urls import reverse
+    from posts.models import Post, User
+
+    rng = random.Random(seed)
+    user = User.objects.order_by('pk')[seed % 100]
+    last_pk = Post.objects.order_by('-pk').values_list('pk', flat=True)[0]
+    client = Client()
+    client.force_login(user)
+    counts = {'reads': [], 'writes': [], 'lock_errors': 0, 'other_errors': 0}
+    barrier.wait()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        post_id = rng.randint(1, last_pk)
+        write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if not write:
+                response = client.get(
+                    reverse('posts:post_detail', args=(post_id,))
+                )
+            elif rng.random() < 0.5:
+                response = client.post(
+                    reverse('posts:create'), {'text': 'Пост бенчмарка'}
+                )
+            else:
+                response = client.post(
+                    reverse('posts:add_comment', args=(post_id,)),
+                    {'text': 'Комментарий бенчмарка'}
+                )
+        except Exception as error:
+            if 'locked' in str(error):
+                counts['lock_errors'] += 1
+            else:
+                counts['other_errors'] += 1
+            continue
+        duration = time.perf_counter() - started
+        if response.status_code in (200, 302, 404):
+            counts['writes' if write else 'reads'].append(duration)
+        else:
+            counts['other_errors'] += 1
+    results.put(counts)
+
+
+def prepare_database(directory, source):
+    """Исходная база: копия --database или небольшая засеянная."""
+    path = os.path.join(directory, 'source.sqlite3')
+    if source:
+        shutil.copy(source, path)
+        return path
+    setup(path, PROFILES['default'])
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    call_command(
+        'seed', users=200, groups=10, posts=20000, comments=20000,
+        follows=2000, images=0, verbosity=0
+    )
+    from django.db import connections
+    connections.close_all()
+    return path
+
+
+def run_profile(name, source, directory, args):
+    from django.conf import settings
+
+    profile = PROFILES[name]
+    database = os.path.join(directory, f'{name}.sqlite3')
+    shutil.copy(source, database)
+    pragmas = profile['pragmas'] or settings.SQLITE_PRAGMAS
+    # Режим журнала меняем заранее: переключение требует монопольного
+    # доступа и в гонке воркеров само упало бы с «locked».
+    with sqlite3.connect(database) as raw:
+        raw.execute(f'PRAGMA journal_mode = {pragmas["journal_mode"]}')
+    writer = None
+    if profile.get('write_queue'):
+        writer = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.sqlite_writes',
+             '--serve-writer', database],
+            stdout=subprocess.DEVNULL,
+        )
+        while not os.path.exists(database + '.sock'):
+            time.sleep(0.1)
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(
+            database, profile, args.seconds, args.write_ratio, number,
+            barrier, results,
+        ))
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    parts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    if writer is not None:
+        writer.terminate()
+        writer.wait()
+
+    reads = sorted(value for part in parts for value in part['reads'])
+    writes = sorted(value for part in parts for value in part['writes'])
+    row = {
+        'reads_per_s': round(len(reads) / args.seconds, 1),
+        'writes_per_s': round(len(writes) / args.seconds, 1),
+        'lock_errors': sum(part['lock_errors'] for part in parts),
+        'other_errors': sum(part['other_errors'] for part in parts),
+    }
+    for kind, values in (('read', reads), ('write', writes)):
+        for label, fraction in (('p50', 0.5), ('p95', 0.95)):
+            row[f'{kind}_{label}_ms'] = round(
+                common.percentile(values, fraction) * 1000, 2
+            )
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--database',
+        help='Файл SQLite для копирования; без него база засеется.'
+    )
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument(
+        '--write-ratio', type=float, default=0.2,
+        help='Доля запросов на запись.'
+    )
+    parser.add_argument(
+        '--profile', action='append', choices=tuple(PROFILES),
+        help='Какие профили мерить, по умолчанию все.'
+    )
+    common.add_report_arguments(parser)
+    parser.add_argument('--serve-writer', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_writer:
+        setup(args.serve_writer, PROFILES['write_queue'])
+        from django.conf import settings
+        from django.core.management import call_command
+        call_command('write_queue', socket=settings.WRITE_QUEUE_SOCKET)
+        return 0
+    directory = tempfile.mkdtemp(prefix='yatube-sqlite-')
+    try:
+        source = prepare_database(directory, args.database)
+        if args.database:
+            setup(source, PROFILES['default'])
+        results = {
+            name: run_profile(name, source, directory, args)
+            for name in args.profile or PROFILES
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return common.report(
+        results, args, METRICS, COLUMNS, workers=args.workers,
+        seconds=args.seconds, write_ratio=args.write_ratio,
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
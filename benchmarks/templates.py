@@ -0,0 +1,271 @@
+"""Микробенчмарк рендера шаблонов posts.
+
+Рендерит posts/index.html, posts/profile.html, posts/post_detail.html
+и posts/includes/paginator.html с готовыми контекстами разного размера
+без запросов и middleware. Чтобы отделить стоимость движка от тегов,
+каждый случай рендерится ещё в вариантах, где из исходников всех
+шаблонов вырезаны {% thumbnail %}, {% url %} или |addclass; «bare» —
+без всех трёх. Цена тега — разница между полным рендером и рендером
+без него. Фрагментный {% cache %} вырезан всегда: меряется рендер, а
+не попадание в кэш.
+
+    python -m benchmarks.templates --output templates.json \\
+        --baseline baseline.json
+
+Миниатюры генерируются при прогреве, в замер попадает их поиск в
+хранилище sorl-thumbnail, как на рабочем сайте.
+"""
+import argparse
+import atexit
+import os
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+from . import common
+
+TAGS = {
+    'thumbnail': (
+        re.compile(r'{%\s*thumbnail\b.*?{%\s*endthumbnail\s*%}', re.S), ''
+    ),
+    'url': (re.compile(r'{%\s*url\s[^%]*%}'), '#'),
+    'addclass': (re.compile(r'\|addclass:"[^"]*"'), ''),
+}
+CACHE_RE = re.compile(r'{%\s*(?:cache\s[^%]*|endcache\s*)%}')
+
+METRICS = (('full_ms', False), ('bare_ms', False))
+COLUMNS = (
+    'full_ms', 'bare_ms', 'thumbnail_ms', 'url_ms', 'addclass_ms', 'size_kb'
+)
+IMAGES = 5
+
+
+def template_sources(removed=()):
+    """Исходники шаблонов проекта без фрагментного кэша и тегов removed."""
+    from django.conf import settings
+
+    sources = {}
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                with open(path, encoding='utf-8') as file:
+                    source = CACHE_RE.sub('', file.read())
+                for tag in removed:
+                    pattern, replacement = TAGS[tag]
+                    source = pattern.sub(replacement, source)
+                sources[os.path.relpath(path, directory)] = source
+    return sources
+
+
+def make_engine(removed=()):
+    """Движок с настройками проекта поверх изменённых исходников."""
+    from django.template import Engine, engines
+
+    base = engines.all()[0].engine
+    return Engine(
+        loaders=[(
+            'django.template.loaders.locmem.Loader',
+            template_sources(removed),
+        )],
+        libraries=base.libraries,
+        string_if_invalid=base.string_if_invalid,
+        autoescape=base.autoescape,
+    )
+
+
+def make_images(count):
+    from django.conf import settings
+    from PIL import Image
+
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'posts'), exist_ok=True)
+    names = []
+    for number in range(count):
+        name = f'posts/bench_{number}.png'
+        Image.new('RGB', (1280, 720), (40 * number, 90, 160)).save(
+            os.path.join(settings.MEDIA_ROOT, name)
+        )
+        names.append(name)
+    return names
+
+
+def make_posts(count, images):
+    from posts.models import Group, Post, User
+
+    authors = [
+        User(pk=number, username=f'author_{number}', first_name='Автор')
+        for number in range(1, 21)
+    ]
+    groups = [
+        Group(pk=number, title=f'Группа {number}', slug=f'group-{number}')
+        for number in range(1, 6)
+    ]
+    started = datetime(2022, 1, 1)
+    return [
+        Post(
+            pk=number,
+            text='Текст поста для бенчмарка шаблонов. ' * 8,
+            pub_date=started + timedelta(hours=number),
+            author=authors[number % len(authors)],
+            group=groups[number % len(groups)] if number % 3 else None,
+            image=images[number % len(images)],
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def make_comments(count, post):
+    from posts.models import Comment, User
+
+    readers = [
+        User(pk=number, username=f'reader_{number}')
+        for number in range(100, 150)
+    ]
+    return [
+        Comment(
+            pk=number, post=post, author=readers[number % len(readers)],
+            text='Комментарий к посту.',
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def page(objects, per_page, number=1):
+    from django.core.paginator import Paginator
+    return Paginator(objects, per_page).page(number)
+
+
+def cases(images):
+    """(шаблон, имя контекста, контекст) для всех замеров."""
+    from django.conf import settings
+    from django.test import RequestFactory
+    from posts.forms import CommentForm
+    from posts.models import User
+
+    limit = settings.LIMIT
+    posts_10 = make_posts(10, images)
+    posts_100 = make_posts(100, images)
+    # 1000 страниц по LIMIT постов, открыта страница из середины.
+    posts_pages = make_posts(1000 * limit, images)
+    author = posts_10[0].author
+    post = posts_10[0]
+    base = {
+        'request': RequestFactory().get('/'),
+        'user': User(pk=1000, username='reader'),
+        'csrf_token': 'x' * 64,
+        'year': 2022,
+    }
+    feeds = {
+        '10 posts': page(posts_10, 10),
+        '100 posts': page(posts_100, 100),
+        '1k pages': page(posts_pages, limit, 500),
+    }
+    for name, page_obj in feeds.items():
+        yield 'posts/index.html', name, {**base, 'page_obj': page_obj}
+        yield 'posts/profile.html', name, {
+            **base, 'page_obj': page_obj, 'author': author,
+            'counted_posts': page_obj.paginator.count, 'following': False,
+        }
+    for count, name in ((10, '10 comments'), (10000, '10k comments')):
+        yield 'posts/post_detail.html', name, {
+            **base, 'post': post, 'user_posts': 100,
+            'comments': make_comments(count, post), 'form': CommentForm(),
+        }
+    for pages, name in ((10, '10 pages'), (1000, '1k pages')):
+        yield 'posts/includes/paginator.html', name, {
+            **base,
+            'page_obj': page(range(pages * limit), limit, pages // 2),
+        }
+
+
+def measure(templates, context, repeat):
+    """Лучшее время одного рендера каждого варианта, в секундах.
+
+    Варианты чередуются внутри серии, чтобы фоновый шум попадал во все
+    одинаково; минимум по сериям устойчивее медианы для микрозамеров.
+    """
+    from django.template import Context
+
+    timers = {
+        variant: timeit.Timer(
+            lambda template=template: template.render(Context(context))
+        )
+        for variant, template in templates.items()
+    }
+    number, _ = timers['full'].autorange()
+    best = dict.fromkeys(timers, float('inf'))
+    for _ in range(repeat):
+        for variant, timer in timers.items():
+            best[variant] = min(best[variant], timer.timeit(number) / number)
+    return best
+
+
+def prepare(directory):
+    """Временная база для хранилища миниатюр и MEDIA_ROOT."""
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    common.setup_django(
+        os.path.join(directory, 'db.sqlite3'),
+        os.path.join(directory, 'media'),
+    )
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='Сколько серий замеров; берётся лучшая.'
+    )
+    parser.add_argument(
+        '--only', action='append',
+        help='Только шаблоны, имя которых содержит строку.'
+    )
+    common.add_report_arguments(parser)
+    args = parser.parse_args()
+
+    prepare(tempfile.mkdtemp(prefix='yatube-bench-'))
+    from django.template import Context
+
+    variants = {
+        'full': make_engine(),
+        'bare': make_engine(tuple(TAGS)),
+    }
+    for tag in TAGS:
+        variants[tag] = make_engine((tag,))
+
+    results = {}
+    for template_name, context_name, context in cases(make_images(IMAGES)):
+        if args.only and not any(
+            part in template_name for part in args.only
+        ):
+            continue
+        templates = {
+            variant: engine.get_template(template_name)
+            for variant, engine in variants.items()
+        }
+        # Прогрев: компиляция, миниатюры, кэш хранилища sorl.
+        size = len(templates['full'].render(Context(context)).encode())
+        for template in templates.values():
+            template.render(Context(context))
+        timings = measure(templates, context, args.repeat)
+        row = {
+            'full_ms': timings['full'] * 1000,
+            'bare_ms': timings['bare'] * 1000,
+            'size_kb': size / 1024,
+        }
+        for tag in TAGS:
+            row[f'{tag}_ms'] = (timings['full'] - timings[tag]) * 1000
+        results[f'{template_name} [{context_name}]'] = {
+            key: round(value, 3) for key, value in row.items()
+        }
+    return common.report(
+        results, args, METRICS, COLUMNS, repeat=args.repeat
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
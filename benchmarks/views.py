@@ -0,0 +1,328 @@
+"""Сквозной бенчмарк представлений posts.
+
+Гоняет именованные URL через тестовый клиент Django и через настоящий
+WSGI-сервер (многопоточный сервер runserver в отдельном процессе) на
+засеянной базе и считает p50/p95/p99, пропускную способность, число
+SQL-запросов на запрос (из Server-Timing) и пиковый RSS.
+
+    cd yatube && python manage.py seed --posts 1000000
+    cp yatube/db.sqlite3 /tmp/bench.sqlite3
+    python -m benchmarks.views --database /tmp/bench.sqlite3 \\
+        --output results.json --baseline baseline.json
+
+Сценарии с POST и подписками пишут в базу, поэтому мерить лучше копию.
+"""
+import argparse
+import itertools
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from . import common
+
+METRICS = (
+    ('p50_ms', False), ('p95_ms', False), ('p99_ms', False),
+    ('rps', True), ('queries', False), ('peak_rss_kb', False),
+)
+COLUMNS = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries', 'peak_rss_kb')
+
+
+@dataclass
+class Scenario:
+    name: str
+    url_name: str
+    state: str = 'guest'
+    method: str = 'get'
+    # Аргументы URL и данные формы на каждую итерацию.
+    kwargs: object = field(default=lambda number: {})
+    data: object = field(default=lambda number: None)
+
+
+def pick_targets():
+    """Самые тяжёлые объекты засеянной базы: так видно худший случай."""
+    from django.db.models import Count
+    from posts.models import Follow, Group, Post, User
+
+    group = (
+        Group.objects.annotate(size=Count('posts')).order_by('-size').first()
+    )
+    author = (
+        User.objects.annotate(size=Count('posts')).order_by('-size').first()
+    )
+    post = (
+        Post.objects.annotate(size=Count('comments')).order_by('-size')
+        .first()
+    )
+    reader_id = (
+        Follow.objects.values_list('user', flat=True)
+        .annotate(size=Count('id')).order_by('-size').first()
+    )
+    reader = User.objects.get(pk=reader_id) if reader_id else author
+    authors = list(
+        User.objects.exclude(pk=reader.pk)
+        .order_by('pk').values_list('username', flat=True)[:1000]
+    )
+    if None in (group, author, post) or not authors:
+        sys.exit('База пуста: сначала запустите manage.py seed.')
+    return group, author, post, reader, authors
+
+
+def scenarios(group, author, post, authors):
+    return [
+        Scenario('index-guest', 'posts:index'),
+        Scenario('index-user', 'posts:index', 'user'),
+        Scenario(
+            'group_list-guest', 'posts:group_list',
+            kwargs=lambda number: {'group': group.slug}
+        ),
+        Scenario(
+            'profile-guest', 'posts:profile',
+            kwargs=lambda number: {'username': author.username}
+        ),
+        Scenario(
+            'post_detail-guest', 'posts:post_detail',
+            kwargs=lambda number: {'post_id': post.pk}
+        ),
+        Scenario(
+            'post_detail-user', 'posts:post_detail', 'user',
+            kwargs=lambda number: {'post_id': post.pk}
+        ),
+        Scenario('follow_index-user', 'posts:follow_index', 'user'),
+        Scenario('create-user', 'posts:create', 'user'),
+        Scenario(
+            'create-post', 'posts:create', 'user', 'post',
+            data=lambda number: {
+                'text': f'Пост бенчмарка {number}', 'group': group.pk
+            }
+        ),
+        Scenario(
+            'add_comment-post', 'posts:add_comment', 'user', 'post',
+            kwargs=lambda number: {'post_id': post.pk},
+            data=lambda number: {'text': f'Комментарий {number}'}
+        ),
+        Scenario(
+            'profile_follow-user', 'posts:profile_follow', 'user',
+            kwargs=lambda number: {
+                'username': authors[number % len(authors)]
+            }
+        ),
+    ]
+
+
+def check_status(scenario, status):
+    if status not in (200, 302):
+        sys.exit(f'{scenario.name}: ответ {status}')
+
+
+def run_client(items, reader, args):
+    """Последовательные запросы тестовым клиентом в этом процессе."""
+    from django.test import Client
+    from django.urls import reverse
+
+    clients = {'guest': Client(), 'user': Client()}
+    clients['user'].force_login(reader)
+    results = {}
+    for scenario in items:
+        client = clients[scenario.state]
+        durations, queries = [], []
+        total = args.warmup + args.requests
+        started = None
+        for number in range(total):
+            if number == args.warmup:
+                common.reset_peak_rss()
+                started = time.perf_counter()
+            url = reverse(scenario.url_name, kwargs=scenario.kwargs(number))
+            request = getattr(client, scenario.method)
+            data = scenario.data(number)
+            begin = time.perf_counter()
+            response = request(url, data) if data else request(url)
+            duration = time.perf_counter() - begin
+            check_status(scenario, response.status_code)
+            if number >= args.warmup:
+                durations.append(duration)
+                queries.append(
+                    common.queries_from_header(response.get('Server-Timing'))
+                )
+        elapsed = time.perf_counter() - started
+        results[f'client/{scenario.name}'] = summary(
+            durations, elapsed, queries, common.peak_rss_kb()
+        )
+    return results
+
+
+def summary(durations, elapsed, queries, peak_rss):
+    result = common.summarize(durations, elapsed)
+    counted = [count for count in queries if count is not None]
+    if counted:
+        result['queries'] = round(sum(counted) / len(counted), 2)
+    result['peak_rss_kb'] = peak_rss
+    return result
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    port = args.port or free_port()
+    command = [
+        sys.executable, '-m', 'benchmarks.views', '--serve',
+        '--port', str(port),
+    ]
+    if args.database:
+        command += ['--database', args.database]
+    if args.media_root:
+        command += ['--media-root', args.media_root]
+    server = subprocess.Popen(
+        command, cwd=common.REPO_DIR,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit('WSGI-сервер не запустился.')
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    sys.exit('WSGI-сервер не ответил за 30 секунд.')
+
+
+def server_sessions(base_url, reader):
+    """Сессии requests для гостя и для вошедшего читателя."""
+    import requests
+    from django.conf import settings
+    from django.test import Client
+    from django.urls import reverse
+
+    # Сессию создаём тестовым клиентом: база у сервера та же.
+    client = Client()
+    client.force_login(reader)
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def make(state):
+        session = requests.Session()
+        if state == 'user':
+            session.cookies.set(settings.SESSION_COOKIE_NAME, cookie)
+            # Страница формы выдаёт csrftoken для POST-запросов.
+            session.get(base_url + reverse('posts:create'))
+            session.headers['X-CSRFToken'] = session.cookies.get(
+                settings.CSRF_COOKIE_NAME, ''
+            )
+        return session
+    return make
+
+
+def run_server(items, reader, args):
+    """Параллельные запросы к WSGI-серверу из --concurrency потоков."""
+    from django.urls import reverse
+
+    server, base_url = start_server(args)
+    make_session = server_sessions(base_url, reader)
+    results = {}
+    try:
+        for scenario in items:
+            counter = itertools.count()
+            sessions = [
+                make_session(scenario.state) for _ in range(args.concurrency)
+            ]
+
+            def worker(session, count):
+                durations, queries = [], []
+                for _ in range(count):
+                    number = next(counter)
+                    url = base_url + reverse(
+                        scenario.url_name, kwargs=scenario.kwargs(number)
+                    )
+                    begin = time.perf_counter()
+                    response = session.request(
+                        scenario.method, url, data=scenario.data(number),
+                        allow_redirects=False
+                    )
+                    durations.append(time.perf_counter() - begin)
+                    check_status(scenario, response.status_code)
+                    queries.append(common.queries_from_header(
+                        response.headers.get('Server-Timing')
+                    ))
+                return durations, queries
+
+            for session in sessions:
+                worker(session, max(1, args.warmup // args.concurrency))
+            common.reset_peak_rss(server.pid)
+            shares = [
+                args.requests // args.concurrency
+                + (index < args.requests % args.concurrency)
+                for index in range(args.concurrency)
+            ]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                parts = list(pool.map(worker, sessions, shares))
+            elapsed = time.perf_counter() - started
+            durations = [value for part in parts for value in part[0]]
+            queries = [value for part in parts for value in part[1]]
+            results[f'server/{scenario.name}'] = summary(
+                durations, elapsed, queries, common.peak_rss_kb(server.pid)
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def serve(args):
+    from django.core.servers.basehttp import run
+    from django.core.wsgi import get_wsgi_application
+
+    run('127.0.0.1', args.port, get_wsgi_application(), threading=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--database', help='Файл SQLite засеянной базы.')
+    parser.add_argument(
+        '--media-root', help='MEDIA_ROOT засеянной базы.'
+    )
+    parser.add_argument(
+        '--mode', choices=('client', 'server', 'both'), default='both'
+    )
+    parser.add_argument(
+        '--only', action='append',
+        help='Запустить только сценарии, имя которых содержит строку.'
+    )
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    common.add_report_arguments(parser)
+    args = parser.parse_args()
+
+    common.setup_django(args.database, args.media_root)
+    if args.serve:
+        return serve(args)
+    group, author, post, reader, authors = pick_targets()
+    items = [
+        scenario for scenario in scenarios(group, author, post, authors)
+        if not args.only or any(part in scenario.name for part in args.only)
+    ]
+    results = {}
+    if args.mode in ('client', 'both'):
+        results.update(run_client(items, reader, args))
+    if args.mode in ('server', 'both'):
+        results.update(run_server(items, reader, args))
+    return common.report(
+        results, args, METRICS, COLUMNS,
+        database=args.database, requests=args.requests,
+        concurrency=args.concurrency,
+    )
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+"""Бюджеты SQL для представлений posts на засеянных данных.
+
+Каждая строка: имя URL, кто запрашивает (guest или user), метод,
+максимум запросов и максимум прочитанных из БД строк. Данные и
+аргументы URL описаны в tests/fixtures/fixture_budget.py.
+"""
+BUDGETS = [
+    ('posts:index', 'guest', 'get', 2, 11),
+    ('posts:index', 'user', 'get', 4, 13),
+    ('posts:group_list', 'guest', 'get', 3, 12),
+    ('posts:group_list', 'user', 'get', 5, 14),
+    ('posts:profile', 'guest', 'get', 3, 12),
+    ('posts:profile', 'user', 'get', 6, 15),
+    ('posts:post_detail', 'guest', 'get', 4, 6),
+    ('posts:post_detail', 'user', 'get', 6, 8),
+    ('posts:follow_index', 'user', 'get', 4, 13),
+    ('posts:create', 'user', 'get', 3, 5),
+    ('posts:create', 'user', 'post', 4, 2),
+    ('posts:post_edit', 'user', 'get', 4, 6),
+    ('posts:add_comment', 'user', 'post', 8, 6),
+    ('posts:profile_follow', 'user', 'get', 6, 4),
+    ('posts:profile_unfollow', 'user', 'get', 6, 4),
+]
@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -36,4 +38,13 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
+    'tests.fixtures.fixture_queries',
+    'tests.fixtures.fixture_budget',
 ]
+
+
+@pytest.fixture(autouse=True)
+def outbox_inline(settings):
+    # Как в core.testing.DiscoverRunner: фоновый поток outbox писал бы в
+    # базу одновременно с транзакционными тестами.
+    settings.OUTBOX_DELIVERY = 'inline'
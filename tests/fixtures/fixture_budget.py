@@ -0,0 +1,95 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from mixer.backend.django import mixer
+
+from core.instrumentation import QueryLog
+from core.testing import on_commit_callbacks
+
+
+@pytest.fixture
+def seeded_data(django_user_model):
+    """Небольшой, но неоднородный набор данных для бюджетов SQL."""
+    reader = django_user_model.objects.create_user(username='Reader')
+    authors = mixer.cycle(3).blend(django_user_model)
+    groups = mixer.cycle(2).blend('posts.Group')
+    posts = []
+    for number in range(30):
+        posts.append(mixer.blend(
+            'posts.Post',
+            author=authors[number % 3],
+            group=groups[number % 2],
+            image='',
+        ))
+    for post in posts:
+        mixer.cycle(3).blend('posts.Comment', post=post, author=reader)
+    mixer.blend('posts.Follow', user=reader, author=authors[0])
+    return {
+        'reader': reader,
+        'author': authors[0],
+        'other_author': authors[1],
+        'group': groups[0],
+        'post': posts[-1],
+        'own_post': mixer.blend('posts.Post', author=reader, image=''),
+    }
+
+
+def budget_url(name, data):
+    kwargs = {
+        'posts:group_list': {'group': data['group'].slug},
+        'posts:profile': {'username': data['author'].username},
+        'posts:post_detail': {'post_id': data['post'].pk},
+        'posts:post_edit': {'post_id': data['own_post'].pk},
+        'posts:add_comment': {'post_id': data['post'].pk},
+        'posts:profile_follow': {'username': data['other_author'].username},
+        'posts:profile_unfollow': {'username': data['author'].username},
+    }
+    return reverse(name, kwargs=kwargs.get(name))
+
+
+def budget_report(name, state, log, max_queries, max_rows):
+    lines = [f'{name} ({state}): превышен бюджет SQL']
+    if len(log.queries) > max_queries:
+        lines.append(f'  запросов: {len(log.queries)} > {max_queries}')
+    if log.rows > max_rows:
+        lines.append(f'  строк:    {log.rows} > {max_rows}')
+    lines.append('  запросы:')
+    for number, entry in enumerate(log.queries, 1):
+        lines.append(f'  {number:3}. [{entry["rows"]} стр.] {entry["sql"]}')
+        if entry['params']:
+            lines.append(f'       параметры: {entry["params"]!r}')
+    return '\n'.join(lines)
+
+
+@pytest.fixture
+def measure_queries(client, seeded_data, settings):
+    """Выполняет запрос к URL и возвращает журнал его SQL.
+
+    В журнал попадают и колбэки transaction.on_commit: в TestCase сами
+    они не выполняются.
+    """
+
+    def measure(name, state, method):
+        if state == 'user':
+            client.force_login(seeded_data['reader'])
+        url = budget_url(name, seeded_data)
+        data = {'text': 'Комментарий'} if method == 'post' else None
+        cache.clear()
+        # Колбэки после фиксации — тоже часть запроса, а фоновый поток
+        # outbox, как в боевых настройках, работает вне его и в тесте не
+        # запускается.
+        settings.OUTBOX_DELIVERY = 'thread'
+        with mock.patch('posts.outbox.worker'):
+            with on_commit_callbacks():
+                # Колбэки от создания данных теста в журнал не идут.
+                pass
+            with QueryLog().capture() as log, on_commit_callbacks():
+                response = getattr(client, method)(url, data)
+        assert response.status_code in (200, 302), (
+            f'{name} ({state}) вернул {response.status_code}'
+        )
+        return log
+
+    return measure
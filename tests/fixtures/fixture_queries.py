@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def nplusone_raise(settings):
+    """N+1 запросы в представлениях роняют тест."""
+    settings.NPLUSONE_MODE = 'raise'
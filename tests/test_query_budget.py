@@ -0,0 +1,20 @@
+import pytest
+
+from tests.budgets import BUDGETS
+from tests.fixtures.fixture_budget import budget_report
+
+pytestmark = [pytest.mark.django_db]
+
+
+@pytest.mark.parametrize(
+    'name, state, method, max_queries, max_rows', BUDGETS,
+    ids=[f'{name}-{state}-{method}' for name, state, method, *_ in BUDGETS]
+)
+def test_query_budget(measure_queries, name, state, method,
+                      max_queries, max_rows):
+    log = measure_queries(name, state, method)
+    if len(log.queries) > max_queries or log.rows > max_rows:
+        pytest.fail(
+            budget_report(name, state, log, max_queries, max_rows),
+            pytrace=False
+        )
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import budget, slowlog, sqlite
+        connection_created.connect(sqlite.configure)
+        connection_created.connect(slowlog.install)
+        connection_created.connect(budget.install)
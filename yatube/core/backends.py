@@ -0,0 +1,64 @@
+"""Бэкенды шаблонов, кэша и миниатюр, считающие свою работу.
+
+Подключаются в settings вместо стандартных и пишут время и число
+операций в RequestMetrics текущего запроса (core.instrumentation).
+"""
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.django import DjangoTemplates, Template
+from sorl.thumbnail.base import ThumbnailBackend
+
+from .instrumentation import record_cache, timed
+from .metrics import registry
+
+MISSING = object()
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        with timed('template_time'):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Считает время рендера шаблонов верхнего уровня.
+
+    Вложенные include рендерятся внутри них и отдельно не считаются.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class InstrumentedCacheMixin:
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        record_cache(value is not MISSING)
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None):
+        values = super().get_many(keys, version)
+        for key in keys:
+            record_cache(key in values)
+        return values
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedThumbnailBackend(ThumbnailBackend):
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        registry.inc('yatube_thumbnails_total', action='lookup')
+        with timed('thumbnail_time', 'thumbnail_count'):
+            return super().get_thumbnail(file_, geometry_string, **options)
+
+    def _create_thumbnail(self, *args, **kwargs):
+        registry.inc('yatube_thumbnails_total', action='generate')
+        return super()._create_thumbnail(*args, **kwargs)
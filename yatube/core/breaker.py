@@ -0,0 +1,91 @@
+"""Размыкатель цепи для перегруженной базы.
+
+Блокировки SQLite («database is locked») и запросы, прерванные по
+бюджету времени (core.budget), считаются отказами базы. Если за
+BREAKER_WINDOW секунд их набралось BREAKER_THRESHOLD, размыкатель
+открывается, и BREAKER_OPEN_SECONDS секунд процесс не ходит в базу:
+core.middleware.QueryBudgetMiddleware отдаёт страницы из последней
+сохранённой копии или статического снимка, а записи отклоняет. Затем
+один запрос-проба идёт в базу: удача замыкает цепь, отказ снова
+размыкает её.
+
+Состояние своё у каждого процесса: процесс, который видит перегрузку,
+сам перестаёт нагружать базу.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .metrics import registry
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def is_overload(error):
+    """Отказ из-за перегрузки, а не ошибка в самом запросе."""
+    message = str(error)
+    return 'locked' in message or 'interrupted' in message
+
+
+class CircuitBreaker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = CLOSED
+        self.failures = deque()
+        self.opened_at = 0.0
+
+    def allow(self):
+        """Можно ли этому запросу идти в базу."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if (
+                self.state == OPEN
+                and time.monotonic() - self.opened_at
+                >= settings.BREAKER_OPEN_SECONDS
+            ):
+                # Пропускаем одну пробу, остальные ждут её исхода.
+                self._switch(HALF_OPEN)
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                self.failures.clear()
+                self._switch(CLOSED)
+
+    def failure(self):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open(now)
+                return
+            self.failures.append(now)
+            while self.failures[0] < now - settings.BREAKER_WINDOW:
+                self.failures.popleft()
+            if (
+                self.state == CLOSED
+                and len(self.failures) >= settings.BREAKER_THRESHOLD
+            ):
+                self._open(now)
+
+    def _open(self, now):
+        self.opened_at = now
+        self.failures.clear()
+        self._switch(OPEN)
+
+    def _switch(self, state):
+        self.state = state
+        registry.inc('yatube_breaker_transitions_total', state=state)
+
+
+breaker = CircuitBreaker()
@@ -0,0 +1,73 @@
+"""Бюджет времени на SQL одного запроса.
+
+Представление из QUERY_BUDGETS получает столько секунд, считая от его
+начала. SQLite каждые QUERY_BUDGET_CHECK_STEPS инструкций своей
+виртуальной машины вызывает обработчик прогресса, и тот прерывает
+выполняемый запрос, если время вышло: глубокий OFFSET или огромный
+список IN больше не держат процесс секундами. Запрос падает с
+OperationalError «interrupted», а core.middleware.QueryBudgetMiddleware
+вместо ошибки отдаёт гостю последнюю сохранённую копию страницы, а
+остальным — 503 с Retry-After.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+current_budget = ContextVar('current_budget', default=None)
+
+
+class Budget:
+    """Срок, до которого запросы к базе ещё можно выполнять."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self.deadline = self.started + seconds
+        self.exceeded = False
+
+    def used(self):
+        """Доля израсходованного бюджета."""
+        return (time.monotonic() - self.started) / self.seconds
+
+
+def budget_for(view_name):
+    return settings.QUERY_BUDGETS.get(
+        view_name, settings.QUERY_BUDGET_DEFAULT
+    )
+
+
+@contextmanager
+def limit(seconds):
+    """Бюджет на время блока; без seconds — без ограничения (None)."""
+    if not seconds:
+        yield None
+        return
+    budget = Budget(seconds)
+    token = current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        current_budget.reset(token)
+
+
+def progress():
+    """Обработчик прогресса SQLite: ненулевой ответ прерывает запрос.
+
+    Вызывается в потоке, который выполняет запрос, поэтому видит бюджет
+    своего HTTP-запроса.
+    """
+    budget = current_budget.get()
+    if budget is None or time.monotonic() < budget.deadline:
+        return 0
+    budget.exceeded = True
+    return 1
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor == 'sqlite':
+        connection.connection.set_progress_handler(
+            progress, settings.QUERY_BUDGET_CHECK_STEPS
+        )
@@ -0,0 +1,43 @@
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.utils.cache import patch_cache_control
+
+
+def is_anonymous_request(request):
+    """Запрос без сессионной куки: страница не зависит от пользователя.
+
+    Проверяем только наличие куки, чтобы не обращаться к сессии:
+    иначе SessionMiddleware добавит в ответ Vary: Cookie.
+    """
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def anonymous_cache(view_func):
+    """Отдаёт гостям общую для всех версию страницы с публичным кэшем.
+
+    Личные блоки шаблона (меню, подписка, форма комментария) для
+    такой страницы догружаются отдельным запросом к posts:personal.
+    """
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        timeout = settings.ANONYMOUS_CACHE_TIMEOUT
+        if not timeout or not is_anonymous_request(request):
+            response = view_func(request, *args, **kwargs)
+            patch_cache_control(response, private=True)
+            return response
+        request.user = AnonymousUser()
+        request.anonymous_page = True
+        response = view_func(request, *args, **kwargs)
+        if response.status_code not in (200, 304) or response.cookies:
+            return response
+        # cache_page мог выставить свой короткий max-age.
+        del response['Cache-Control']
+        del response['Expires']
+        patch_cache_control(response, public=True, max_age=timeout)
+        return response
+    return wrapped_view
@@ -0,0 +1,35 @@
+"""Запрос страницы у самого приложения, как от гостя.
+
+Прогрев кэша (posts.warming) и статические снимки (posts.snapshots)
+получают страницы без сети, но через все промежуточные слои, как
+обычный запрос без cookie. Тестовый клиент для этого не годится: он
+подменяет обработку ошибок и сигналы для тестов.
+"""
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlsplit
+
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+
+
+def get(url, host):
+    """Ответ на GET url с заголовком Host: host и без cookie."""
+    parts = urlsplit(url)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        # В WSGI путь уже раскодирован и передан байтами latin-1.
+        'PATH_INFO': unquote_to_bytes(parts.path).decode('iso-8859-1'),
+        'QUERY_STRING': parts.query,
+        'SCRIPT_NAME': '',
+        'HTTP_HOST': host,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+    }
+    # Обработчик на каждый вызов: так он видит текущие MIDDLEWARE.
+    handler = BaseHandler()
+    handler.load_middleware()
+    return handler.get_response(WSGIRequest(environ))
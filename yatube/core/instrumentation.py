@@ -0,0 +1,172 @@
+"""Счётчики производительности текущего запроса.
+
+ServerTimingMiddleware кладёт RequestMetrics в contextvar, а обёртки
+вокруг БД, шаблонов, кэша и sorl-thumbnail дописывают в него время и
+число операций. Вне запроса (команды, воркеры) счётчики не ведутся.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+from .metrics import registry
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.view_name = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.thumbnail_count = 0
+        self.thumbnail_time = 0.0
+        self.total_time = 0.0
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'thumbnails': self.thumbnail_count,
+            'thumbnail_ms': round(self.thumbnail_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def server_timing(self):
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'thumb;dur={self.thumbnail_time * 1000:.1f};'
+            f'desc="{self.thumbnail_count} thumbnails"',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def record_sql(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper()."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_count += 1
+        metrics.sql_time += time.perf_counter() - started
+
+
+def record_cache(hit):
+    registry.inc(
+        'yatube_cache_requests_total', result='hit' if hit else 'miss'
+    )
+    metrics = current_metrics.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def timed(attribute, counter=None):
+    """Прибавляет длительность блока к атрибуту RequestMetrics."""
+    metrics = current_metrics.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            elapsed = time.perf_counter() - started
+            setattr(metrics, attribute, getattr(metrics, attribute) + elapsed)
+            if counter is not None:
+                setattr(metrics, counter, getattr(metrics, counter) + 1)
+
+
+@contextmanager
+def collect(metrics):
+    """Собирает счётчики блока кода в metrics."""
+    token = current_metrics.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(record_sql))
+            yield metrics
+    finally:
+        current_metrics.reset(token)
+
+
+class RowCountingCursor:
+    """Прокси курсора БД, считающий прочитанные строки."""
+
+    def __init__(self, cursor, entry):
+        self._cursor = cursor
+        self._entry = entry
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._entry['rows'] += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._entry['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._entry['rows'] += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._entry['rows'] += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class QueryLog:
+    """Журнал SQL блока кода: текст, параметры, время и число строк."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        entry = {'sql': sql, 'params': params, 'time': 0.0, 'rows': 0}
+        self.queries.append(entry)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            entry['time'] = time.perf_counter() - started
+            cursor = context['cursor']
+            if not isinstance(cursor.cursor, RowCountingCursor):
+                cursor.cursor = RowCountingCursor(cursor.cursor, entry)
+            else:
+                cursor.cursor._entry = entry
+
+    @property
+    def rows(self):
+        return sum(entry['rows'] for entry in self.queries)
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
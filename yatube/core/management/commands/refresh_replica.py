@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+
+def sqlite_path(alias):
+    database = settings.DATABASES.get(alias)
+    if database is None:
+        raise CommandError(f'Нет базы {alias} в DATABASES.')
+    if not database['ENGINE'].endswith('sqlite3'):
+        raise CommandError(f'База {alias} — не SQLite.')
+    return database['NAME']
+
+
+def refresh(source, target):
+    """Копирует базу онлайн-бэкапом SQLite.
+
+    Читатели реплики ждут конца копирования и не видят файл наполовину.
+    """
+    primary = sqlite3.connect(source)
+    replica = sqlite3.connect(target)
+    try:
+        primary.backup(replica)
+    finally:
+        replica.close()
+        primary.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет реплику SQLite копией основной базы. С --interval '
+        'повторяет копирование, пока не остановят.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alias', action='append',
+            help='Псевдоним реплики, по умолчанию все DATABASE_REPLICAS.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Секунд между обновлениями; 0 — обновить один раз.'
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['alias'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError('DATABASE_REPLICAS пуст.')
+        source = sqlite_path(DEFAULT_DB_ALIAS)
+        targets = [sqlite_path(alias) for alias in aliases]
+        while True:
+            started = time.perf_counter()
+            for target in targets:
+                refresh(source, target)
+            self.stdout.write(
+                'Реплики обновлены за {:.2f} с'.format(
+                    time.perf_counter() - started
+                )
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
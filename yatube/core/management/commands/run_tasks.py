@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи из базы (core.tasks). Нужен при '
+        'TASK_QUEUE_ENABLED; обработчиков может быть несколько.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', default=[],
+            help='Очередь; можно указать несколько раз, по умолчанию все.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASK_WORKERS,
+            help='Сколько задач выполнять одновременно.'
+        )
+        parser.add_argument(
+            '--executor', choices=('thread', 'process'),
+            default=settings.TASK_EXECUTOR,
+            help='Пул потоков или процессов.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи по одной и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            options['queue'], options['workers'], options['executor']
+        )
+        if options['once']:
+            done = worker.run_pending()
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        try:
+            worker.serve_forever()
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,116 @@
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Строки плана SQLite, которые обычно означают нехватку индекса.
+PLAN_WARNINGS = (
+    ('SCAN', 'полный просмотр таблицы'),
+    ('USE TEMP B-TREE', 'сортировка или группировка без индекса'),
+)
+
+
+def log_files(path):
+    """Файл журнала и его копии после ротации, от старых к новым."""
+    files = []
+    number = 1
+    while os.path.exists(f'{path}.{number}'):
+        files.append(f'{path}.{number}')
+        number += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_entries(path):
+    for name in log_files(path):
+        with open(name, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def plan_warning(line):
+    for prefix, warning in PLAN_WARNINGS:
+        if line.startswith(prefix) and 'INDEX' not in line:
+            return warning
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Группирует журнал медленных запросов (SLOW_QUERY_LOG) по видам '
+        'запросов и выводит их по убыванию суммарного времени.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG,
+            help='Файл журнала.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help='Сколько видов запросов показать.'
+        )
+        parser.add_argument(
+            '--view', help='Только запросы этого представления.'
+        )
+
+    def handle(self, *args, **options):
+        if not log_files(options['log']):
+            raise CommandError(f'Журнал {options["log"]} не найден.')
+        groups = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0,
+            'views': Counter(), 'origins': Counter(), 'plan': None,
+        })
+        for entry in read_entries(options['log']):
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            group = groups[entry['fingerprint']]
+            group['count'] += 1
+            group['total'] += entry['ms']
+            group['max'] = max(group['max'], entry['ms'])
+            group['views'][entry.get('view') or '-'] += 1
+            group['origins'][entry.get('origin') or '-'] += 1
+            if entry.get('plan') is not None:
+                group['plan'] = entry['plan']
+        ranked = sorted(
+            groups.items(), key=lambda item: item[1]['total'], reverse=True
+        )
+        for place, (shape, group) in enumerate(
+            ranked[:options['top']], start=1
+        ):
+            self.write_group(place, shape, group)
+        self.stdout.write(
+            f'Видов запросов: {len(groups)}, '
+            f'записей: {sum(group["count"] for group in groups.values())}'
+        )
+
+    def write_group(self, place, shape, group):
+        def top(counter):
+            return ', '.join(
+                f'{name} ({count})' for name, count in counter.most_common(3)
+            )
+
+        self.stdout.write(self.style.SQL_KEYWORD(
+            f'{place}. {group["total"]:.1f} мс всего, {group["count"]} раз, '
+            f'в среднем {group["total"] / group["count"]:.1f} мс, '
+            f'максимум {group["max"]:.1f} мс'
+        ))
+        self.stdout.write(f'   представления: {top(group["views"])}')
+        self.stdout.write(f'   откуда: {top(group["origins"])}')
+        self.stdout.write(f'   {shape}')
+        for line in group['plan'] or ():
+            warning = plan_warning(line)
+            if warning:
+                self.stdout.write(self.style.WARNING(
+                    f'   план: {line}  <-- {warning}'
+                ))
+            else:
+                self.stdout.write(f'   план: {line}')
+        self.stdout.write('')
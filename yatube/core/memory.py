@@ -0,0 +1,109 @@
+"""Рост памяти по представлениям на снимках tracemalloc.
+
+При MEMORY_PROFILE_ENABLED MemoryProfileMiddleware снимает снимок до и
+после каждого запроса и приписывает разницу имени URL: сколько памяти
+осталось занятым после запроса и в каких строках её выделили. Снимки
+дорогие и учитывают все потоки процесса, поэтому режим включают на
+одном однопоточном воркере. Результат — /admin/memory/.
+"""
+import os
+import threading
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+
+FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def project_frame(traceback):
+    """Ближайший к выделению кадр кода проекта."""
+    base_dir = settings.BASE_DIR + os.sep
+    for frame in reversed(traceback):
+        if (
+            frame.filename.startswith(base_dir)
+            and 'site-packages' not in frame.filename
+        ):
+            relative = os.path.relpath(frame.filename, settings.BASE_DIR)
+            return f'{relative}:{frame.lineno}'
+    return None
+
+
+class ViewMemory:
+
+    def __init__(self):
+        self.requests = 0
+        self.growth = 0
+        self.sites = Counter()
+
+    @property
+    def growth_per_request(self):
+        return self.growth // self.requests if self.requests else 0
+
+    @property
+    def top_sites(self):
+        # Counter в шаблоне не годится: sites.most_common ищется как ключ.
+        return self.sites.most_common(3)
+
+
+class MemoryTracker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.views = {}
+
+    @staticmethod
+    def start():
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_PROFILE_FRAMES)
+
+    @staticmethod
+    def snapshot():
+        return tracemalloc.take_snapshot().filter_traces(FILTERS)
+
+    def record(self, view_name, before, after):
+        growth = 0
+        sites = Counter()
+        for diff in after.compare_to(before, 'traceback'):
+            growth += diff.size_diff
+            if diff.size_diff <= 0:
+                continue
+            allocation = diff.traceback[-1]
+            site = f'{allocation.filename}:{allocation.lineno}'
+            origin = project_frame(diff.traceback)
+            if origin is not None and origin not in site:
+                site = f'{site} <- {origin}'
+            sites[site] += diff.size_diff
+        with self._lock:
+            view = self.views.setdefault(view_name, ViewMemory())
+            view.requests += 1
+            view.growth += growth
+            view.sites.update(sites)
+            limit = settings.MEMORY_PROFILE_SITES
+            if len(view.sites) > limit:
+                # Каждый запрос приносит и разовые места: без вытеснения
+                # редких счётчик рос бы, пока включён профиль.
+                view.sites = Counter(dict(view.sites.most_common(limit)))
+
+    def report(self):
+        """Представления по убыванию роста и общий список мест."""
+        with self._lock:
+            views = sorted(
+                self.views.items(),
+                key=lambda item: item[1].growth, reverse=True
+            )
+            sites = Counter()
+            for _, view in views:
+                sites.update(view.sites)
+        return views, sites.most_common(settings.MEMORY_PROFILE_TOP)
+
+    def reset(self):
+        with self._lock:
+            self.views.clear()
+
+
+tracker = MemoryTracker()
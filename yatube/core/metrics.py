@@ -0,0 +1,248 @@
+"""Счётчики и гистограммы в текстовом формате Prometheus.
+
+Каждый процесс копит значения в памяти и не чаще раза в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в свой файл в METRICS_DIR.
+Эндпоинт /metrics складывает файлы всех процессов, поэтому один
+опрос видит весь хост. Файлы завершившихся процессов он удаляет: их
+счётчики пропадают из суммы, и Prometheus видит это как сброс счётчика.
+Без METRICS_ENABLED процессы копят значения только в памяти.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+RATIO_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 1)
+
+HELP = {
+    'yatube_request_duration_seconds': 'Время обработки запроса.',
+    'yatube_request_queries': 'Число SQL-запросов на HTTP-запрос.',
+    'yatube_cache_requests_total': 'Обращения к кэшу по результату.',
+    'yatube_thumbnails_total': 'Работа с миниатюрами sorl-thumbnail.',
+    'yatube_sqlite_lock_waits_total': 'Ошибки "database is locked".',
+    'yatube_sqlite_write_seconds':
+        'Время записи в SQLite вместе с ожиданием блокировки.',
+    'yatube_write_queue_wait_seconds':
+        'Время от отправки записи писателю до его ответа.',
+    'yatube_write_queue_batch_size': 'Операций в одной транзакции писателя.',
+    'yatube_write_queue_commit_seconds': 'Время транзакции писателя.',
+    'yatube_write_queue_fallbacks_total':
+        'Записи на месте из-за недоступного писателя.',
+    'yatube_query_budget_used_ratio':
+        'Доля бюджета времени SQL, израсходованная представлением.',
+    'yatube_degraded_responses_total':
+        'Запасные ответы при перегрузке базы по причине и виду ответа.',
+    'yatube_breaker_transitions_total':
+        'Переходы размыкателя цепи базы по новому состоянию.',
+    'yatube_outbox_events_total': 'События outbox, переданные потребителю.',
+    'yatube_outbox_batch_seconds': 'Время обработки пачки событий outbox.',
+    'yatube_outbox_retries_total': 'Повторы упавших пачек событий outbox.',
+    'yatube_outbox_skipped_total':
+        'События outbox, пропущенные после всех повторов.',
+    'yatube_tasks_total': 'Фоновые задачи по результату.',
+    'yatube_task_delay_seconds':
+        'Задержка запуска фоновой задачи после назначенного времени.',
+    'yatube_task_seconds': 'Время выполнения фоновой задачи.',
+    'yatube_warmed_pages_total':
+        'Страницы, запрошенные прогревом кэша, по коду ответа.',
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._flushed_at = 0.0
+        atexit.register(self.flush)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._counters[name, _labels_key(labels)] += amount
+        self._maybe_flush()
+
+    def observe(self, name, value, buckets, **labels):
+        key = name, _labels_key(labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': list(buckets),
+                    'counts': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self._counters.items()
+                ],
+                'histograms': [
+                    [name, dict(labels), dict(histogram)]
+                    for (name, labels), histogram
+                    in self._histograms.items()
+                ],
+            }
+
+    def flush(self):
+        if not settings.METRICS_ENABLED:
+            return
+        if not self._counters and not self._histograms:
+            return
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(
+            temp_path, os.path.join(directory, f'{os.getpid()}.json')
+        )
+        self._flushed_at = time.monotonic()
+
+    def _maybe_flush(self):
+        elapsed = time.monotonic() - self._flushed_at
+        if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+def _alive(pid):
+    """Жив ли процесс pid на этом хосте."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        return True
+    return True
+
+
+def _load(path):
+    """Снимок процесса из файла; None, если процесса или файла уже нет."""
+    pid = os.path.basename(path)[:-len('.json')]
+    if pid.isdigit() and not _alive(int(pid)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        # Файл процесса могли подменить прямо во время чтения.
+        return None
+
+
+def read_all():
+    """Складывает снимки всех процессов из METRICS_DIR."""
+    counters = defaultdict(float)
+    histograms = {}
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return counters, histograms
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        data = _load(os.path.join(directory, name))
+        if data is None:
+            continue
+        for metric, labels, value in data['counters']:
+            counters[metric, _labels_key(labels)] += value
+        for metric, labels, histogram in data['histograms']:
+            key = metric, _labels_key(labels)
+            total = histograms.get(key)
+            if total is None:
+                histograms[key] = histogram
+                continue
+            total['counts'] = [
+                left + right
+                for left, right in zip(total['counts'], histogram['counts'])
+            ]
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def exposition():
+    """Текст для /metrics в формате Prometheus 0.0.4."""
+    registry.flush()
+    counters, histograms = read_all()
+    lines = []
+    described = set()
+
+    def describe(name, kind):
+        if name not in described:
+            described.add(name)
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        describe(name, 'histogram')
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            bucket_labels = labels + (('le', _format_value(bound)),)
+            lines.append(
+                f'{name}_bucket{_format_labels(bucket_labels)} {count}'
+            )
+        inf_labels = labels + (('le', '+Inf'),)
+        lines.append(
+            f'{name}_bucket{_format_labels(inf_labels)} {histogram["count"]}'
+        )
+        lines.append(
+            f'{name}_sum{_format_labels(labels)} '
+            f'{_format_value(histogram["sum"])}'
+        )
+        lines.append(
+            f'{name}_count{_format_labels(labels)} {histogram["count"]}'
+        )
+    return '\n'.join(lines) + '\n'
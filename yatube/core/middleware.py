@@ -0,0 +1,409 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import OperationalError, connections
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.utils.cache import add_never_cache_headers, cc_delim_re
+from django.utils.module_loading import import_string
+
+from . import budget, profiling
+from .breaker import breaker, is_overload
+from .decorators import is_anonymous_request
+from .instrumentation import RequestMetrics, collect, current_metrics
+from .memory import tracker
+from .metrics import LATENCY_BUCKETS, QUERY_BUCKETS, RATIO_BUCKETS, registry
+from .nplusone import Detector
+from .routers import Routing, current_routing
+
+perf_logger = logging.getLogger('core.perf')
+
+PAGE_NUMBER = re.compile(r'[1-9][0-9]{0,5}')
+
+
+def freeze_response(response):
+    """Превращает ответ в кортеж, который можно отдать ещё раз."""
+    return response.status_code, list(response.items()), response.content
+
+
+def thaw_response(frozen):
+    status, headers, content = frozen
+    response = HttpResponse(content, status=status)
+    for header, value in headers:
+        response[header] = value
+    return response
+
+
+def is_shareable(response):
+    """Ответ можно отдать другому гостю без изменений."""
+    if response.streaming or response.cookies:
+        return False
+    if response.status_code != 200:
+        return False
+    vary = cc_delim_re.split(response.get('Vary', ''))
+    return all(header.lower() in ('', 'accept-encoding') for header in vary)
+
+
+class Flight:
+    """Запрос, который прямо сейчас выполняется в этом процессе."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.frozen = None
+
+
+class RequestCoalescingMiddleware:
+    """Склеивает одинаковые одновременные GET-запросы гостей.
+
+    Внутри процесса ждущие потоки получают копию ответа первого
+    запроса. Между процессами роль ведущего разыгрывается через
+    cache.add(), а ответ передаётся через кэш; для этого нужен общий
+    бэкенд кэша (memcached, redis, файловый).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def __call__(self, request):
+        if (
+            not settings.COALESCE_TIMEOUT
+            or not is_anonymous_request(request)
+        ):
+            return self.get_response(request)
+        key = self.request_key(request)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            flight.done.wait(settings.COALESCE_TIMEOUT)
+            if flight.frozen is None:
+                return self.get_response(request)
+            return thaw_response(flight.frozen)
+        try:
+            response = self.lead(request, key)
+            if is_shareable(response):
+                flight.frozen = freeze_response(response)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return response
+
+    @staticmethod
+    def request_key(request):
+        raw = ' '.join((
+            request.method,
+            request.get_host(),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+        ))
+        return 'coalesce:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def lead(self, request, key):
+        timeout = settings.COALESCE_TIMEOUT
+        if cache.add(key + ':lock', 1, timeout):
+            # Ответ прошлой волны запросов уже мог устареть.
+            cache.delete(key + ':response')
+            try:
+                response = self.get_response(request)
+                if is_shareable(response) and cache.get(key + ':waiters'):
+                    cache.set(
+                        key + ':response', freeze_response(response), timeout
+                    )
+            finally:
+                cache.delete(key + ':lock')
+            return response
+        # Этот же запрос уже считает другой процесс: ждём его ответ.
+        cache.add(key + ':waiters', 0, timeout)
+        try:
+            cache.incr(key + ':waiters')
+        except ValueError:
+            pass
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            # Сначала замок: ответ кладут в кэш до его снятия.
+            running = cache.get(key + ':lock') is not None
+            frozen = cache.get(key + ':response')
+            if frozen is not None:
+                return thaw_response(frozen)
+            if not running:
+                break
+            time.sleep(settings.COALESCE_POLL_INTERVAL)
+        return self.get_response(request)
+
+
+class ServerTimingMiddleware:
+    """Отдаёт метрики запроса в Server-Timing, лог core.perf и /metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        send_header = random.random() < settings.SERVER_TIMING_SAMPLE_RATE
+        write_log = random.random() < settings.PERF_LOG_SAMPLE_RATE
+        if (
+            not send_header and not write_log
+            and not settings.METRICS_ENABLED
+        ):
+            return self.get_response(request)
+        with collect(RequestMetrics()) as metrics:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            metrics.total_time = time.perf_counter() - started
+        if request.resolver_match is not None:
+            metrics.view_name = request.resolver_match.view_name
+        if settings.METRICS_ENABLED:
+            view = metrics.view_name or 'unknown'
+            registry.observe(
+                'yatube_request_duration_seconds',
+                metrics.total_time, LATENCY_BUCKETS, view=view
+            )
+            registry.observe(
+                'yatube_request_queries',
+                metrics.sql_count, QUERY_BUCKETS, view=view
+            )
+        if send_header:
+            response['Server-Timing'] = metrics.server_timing()
+        if write_log:
+            line = metrics.as_dict()
+            line.update(
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+            )
+            perf_logger.info(json.dumps(line))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Имя представления нужно уже во время запроса: его пишет
+        # журнал медленных запросов.
+        metrics = current_metrics.get()
+        if metrics is not None and request.resolver_match is not None:
+            metrics.view_name = request.resolver_match.view_name
+
+
+class NPlusOneMiddleware:
+    """Ищет N+1 запросы, если задан NPLUSONE_MODE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.NPLUSONE_MODE:
+            return self.get_response(request)
+        detector = Detector(request.path)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(detector))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    """Профилирует запрос сотрудника по ?profile=1 или X-Profile.
+
+    Стоит после AuthenticationMiddleware: нужен request.user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiling.wants_profile(request):
+            return self.get_response(request)
+        return profiling.run(request, self.get_response)
+
+
+class MemoryProfileMiddleware:
+    """Снимки tracemalloc вокруг запроса, если MEMORY_PROFILE_ENABLED."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.MEMORY_PROFILE_ENABLED:
+            return self.get_response(request)
+        tracker.start()
+        before = tracker.snapshot()
+        response = self.get_response(request)
+        after = tracker.snapshot()
+        view_name = 'unknown'
+        if request.resolver_match is not None:
+            view_name = request.resolver_match.view_name
+        tracker.record(view_name, before, after)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Чтения представлений из REPLICA_VIEWS — с реплик (core.routers).
+
+    Cookie закрепления ставится, только если запрос записал контент
+    (core.routers.mark_write()).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = Routing(
+            pinned=settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        token = current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if routing.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        if routing is not None and request.resolver_match is not None:
+            routing.use_replica = (
+                request.resolver_match.view_name in settings.REPLICA_VIEWS
+            )
+
+
+class QueryBudgetMiddleware:
+    """Бюджет времени SQL (core.budget) и размыкатель цепи (core.breaker).
+
+    Стоит последним. Бюджет включается в process_view, когда проверки
+    остальных middleware (CSRF) уже пройдены, и действует до конца
+    get_response: на представление в транзакции ATOMIC_REQUESTS и рендер
+    TemplateResponse. Снимается он до обратного пути ответа, так что
+    сохранение сессии не прервётся. Если база перегружена, вместо
+    страницы process_exception отдаёт запасной ответ.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            request.query_budget = stack
+            response = self.get_response(request)
+        if getattr(request, 'query_budget_view', None) is None:
+            # Представления не было, или его не пустил размыкатель.
+            return response
+        view_name = request.query_budget_view
+        current = request.query_budget_current
+        if current is not None:
+            registry.observe(
+                'yatube_query_budget_used_ratio', current.used(),
+                RATIO_BUCKETS, view=view_name
+            )
+        if getattr(request, 'query_budget_failed', False):
+            return response
+        breaker.success()
+        if (
+            current is not None
+            and is_anonymous_request(request)
+            and is_shareable(response)
+        ):
+            cache.set(
+                self.stale_key(request), freeze_response(response),
+                settings.QUERY_BUDGET_STALE_TIMEOUT
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_name = request.resolver_match.view_name
+        if not breaker.allow():
+            return self.degrade(request, view_name, 'breaker')
+        request.query_budget_view = view_name
+        request.query_budget_current = request.query_budget.enter_context(
+            budget.limit(budget.budget_for(view_name))
+        )
+
+    def process_exception(self, request, exception):
+        if (
+            getattr(request, 'query_budget_view', None) is None
+            or not isinstance(exception, OperationalError)
+        ):
+            return None
+        current = request.query_budget_current
+        exceeded = current is not None and current.exceeded
+        if not exceeded and not is_overload(exception):
+            return None
+        breaker.failure()
+        request.query_budget_failed = True
+        reason = 'budget' if exceeded else 'locked'
+        return self.degrade(request, request.query_budget_view, reason)
+
+    @staticmethod
+    def stale_key(request):
+        raw = ' '.join((request.get_host(), request.get_full_path()))
+        return 'budget:stale:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def stale_copy(self, request):
+        """Последний удачный ответ гостю на этот адрес."""
+        frozen = cache.get(self.stale_key(request))
+        return None if frozen is None else thaw_response(frozen)
+
+    @staticmethod
+    def snapshot(request):
+        """Статический снимок страницы из DEGRADED_SNAPSHOT_PATH."""
+        if not settings.DEGRADED_SNAPSHOT_PATH:
+            return None
+        # Из строки запроса в путь попадает только номер страницы.
+        page = request.GET.get('page', '1')
+        if not PAGE_NUMBER.fullmatch(page):
+            return None
+        snapshot_path = import_string(settings.DEGRADED_SNAPSHOT_PATH)
+        path = snapshot_path(request.path, int(page))
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as file:
+                return HttpResponse(file.read())
+        except OSError:
+            return None
+
+    def degrade(self, request, view_name, reason):
+        """Ответ вместо страницы, на которую у базы не хватило сил.
+
+        Копии и снимки — версии страниц для гостя, личного в них нет,
+        поэтому их можно отдать и пользователю.
+        """
+        writing = request.method not in ('GET', 'HEAD')
+        response = None
+        if not writing:
+            sources = (('stale', self.stale_copy), ('snapshot', self.snapshot))
+            for fallback, source in sources:
+                response = source(request)
+                if response is not None:
+                    break
+        if response is not None:
+            response['Warning'] = '110 - "Response is Stale"'
+        else:
+            fallback = 'rejected' if writing else 'unavailable'
+            # Шапка шаблона не должна идти в базу за пользователем.
+            request.user = AnonymousUser()
+            response = render(
+                request, 'core/503.html', {'writing': writing}, status=503
+            )
+            response['Retry-After'] = str(settings.QUERY_BUDGET_RETRY_AFTER)
+        # Ни прокси, ни браузер не должны запомнить запасной ответ.
+        del response['Cache-Control']
+        add_never_cache_headers(response)
+        registry.inc(
+            'yatube_degraded_responses_total',
+            view=view_name, reason=reason, fallback=fallback
+        )
+        return response
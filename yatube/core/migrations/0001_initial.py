@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Функция')),
+                ('kwargs', models.TextField(default='{}', verbose_name='Аргументы')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='Очередь')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='Приоритет')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('failed', 'Не выполнена')], default='pending', max_length=10, verbose_name='Статус')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Запустить после')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=1, verbose_name='Попыток всего')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='Начало выполнения')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата постановки')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_at'], name='core_task_status_5742ae_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача core.tasks."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Не выполнена'),
+    )
+    name = models.CharField('Функция', max_length=200)
+    kwargs = models.TextField('Аргументы', default='{}')
+    queue = models.CharField('Очередь', max_length=50, default='default')
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=PENDING
+    )
+    run_at = models.DateTimeField('Запустить после', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Попыток всего', default=1
+    )
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    started = models.DateTimeField('Начало выполнения', null=True, blank=True)
+    created = models.DateTimeField('Дата постановки', auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.name
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'])]
@@ -0,0 +1,117 @@
+"""Поиск N+1 запросов: один и тот же SELECT повторяется внутри запроса.
+
+SQL приводится к «отпечатку» без значений, и если отпечаток встретился
+NPLUSONE_THRESHOLD раз, детектор сообщает строку шаблона или кода,
+откуда пришёл запрос. NPLUSONE_MODE: 'warn', 'raise' или None.
+"""
+import logging
+import os
+import re
+import sys
+import warnings
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+logger = logging.getLogger('core.nplusone')
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDERS_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACES_RE = re.compile(r'\s+')
+# Обёртки вокруг запросов: их кадры в стеке не считаются источником.
+INSTRUMENTATION_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in (
+        'instrumentation.py', 'nplusone.py', 'slowlog.py', 'sqlite.py'
+    )
+}
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Форма запроса без конкретных значений."""
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = PLACEHOLDERS_RE.sub('(...)', sql)
+    return SPACES_RE.sub(' ', sql).strip()
+
+
+def template_origin(frame):
+    """Строка шаблона, если запрос сделан во время рендера узла."""
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def code_origin(frame):
+    """Ближайшая строка кода проекта вне библиотек и этого модуля."""
+    base_dir = settings.BASE_DIR + os.sep
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base_dir)
+            and filename not in INSTRUMENTATION_FILES
+            and 'site-packages' not in filename
+        ):
+            relative = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{relative}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+def find_origin():
+    frame = sys._getframe(1)
+    return template_origin(frame) or code_origin(frame) or 'unknown'
+
+
+class Detector:
+    """Считает отпечатки SELECT-запросов; вешается на execute_wrapper."""
+
+    def __init__(self, path=''):
+        self.path = path
+        self.counts = Counter()
+        self.reported = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT' and not self.ignored(sql):
+            self.check(fingerprint(sql), context['connection'].alias)
+        return execute(sql, params, many, context)
+
+    @staticmethod
+    def ignored(sql):
+        return any(table in sql for table in settings.NPLUSONE_IGNORE)
+
+    def check(self, shape, alias=DEFAULT_DB_ALIAS):
+        # Один запрос к нескольким базам (шарды, реплики) — не N+1.
+        key = alias, shape
+        self.counts[key] += 1
+        if (
+            self.counts[key] < settings.NPLUSONE_THRESHOLD
+            or key in self.reported
+        ):
+            return
+        self.reported.add(key)
+        message = (
+            f'N+1 запрос на {self.path or "?"} из {find_origin()}: '
+            f'{self.counts[key]} одинаковых запросов {shape}'
+        )
+        if settings.NPLUSONE_MODE == 'raise':
+            raise NPlusOneError(message)
+        logger.warning(message)
+        warnings.warn(message, NPlusOneWarning)
@@ -0,0 +1,150 @@
+"""Профилирование отдельных запросов по требованию сотрудника.
+
+Сотрудник (is_staff) добавляет к адресу ?profile=1 или шлёт заголовок
+X-Profile: 1, и запрос выполняется под cProfile. Профиль (.prof для
+snakeviz и pstats) и описание с трассой SQL (.json) сохраняются в
+PROFILE_ROOT; хранятся последние PROFILE_KEEP профилей.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+
+from .instrumentation import QueryLog
+
+PROFILE_ID_RE = re.compile(r'^[0-9]{8}-[0-9]{12}-[0-9a-f]{8}$')
+TOP_FUNCTIONS = 40
+SORTS = ('cumulative', 'tottime', 'ncalls')
+
+
+def wants_profile(request):
+    # Без сессии сотрудником быть нельзя, а обращение к request.user
+    # добавило бы гостевым страницам Vary: Cookie.
+    if (
+        not settings.PROFILE_ENABLED
+        or settings.SESSION_COOKIE_NAME not in request.COOKIES
+    ):
+        return False
+    # Пользователя проверяем последним: без профиля запрос не идёт в
+    # базу за сессией, что важно при её перегрузке (core.breaker).
+    if not (
+        request.GET.get(settings.PROFILE_QUERY_PARAM)
+        or request.META.get(settings.PROFILE_HEADER)
+    ):
+        return False
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+def profile_path(profile_id, extension):
+    return os.path.join(settings.PROFILE_ROOT, f'{profile_id}.{extension}')
+
+
+def run(request, get_response):
+    """Выполняет запрос под профилировщиком и сохраняет результат."""
+    profiler = cProfile.Profile()
+    log = QueryLog()
+    started = time.perf_counter()
+    with log.capture():
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    total = time.perf_counter() - started
+    now = datetime.now()
+    profile_id = '{}-{}'.format(
+        now.strftime('%Y%m%d-%H%M%S%f'), uuid.uuid4().hex[:8]
+    )
+    meta = {
+        'id': profile_id,
+        'time': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': getattr(request.resolver_match, 'view_name', None),
+        'user': request.user.get_username(),
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 2),
+        'sql_ms': round(
+            sum(query['time'] for query in log.queries) * 1000, 2
+        ),
+        'queries': [
+            {
+                'sql': query['sql'],
+                'params': [str(param) for param in query['params'] or ()],
+                'ms': round(query['time'] * 1000, 3),
+                'rows': query['rows'],
+            }
+            for query in log.queries
+        ],
+    }
+    save(profiler, meta)
+    response['X-Profile-Id'] = profile_id
+    return response
+
+
+def save(profiler, meta):
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+    profiler.dump_stats(profile_path(meta['id'], 'prof'))
+    with open(profile_path(meta['id'], 'json'), 'w') as file:
+        json.dump(meta, file, ensure_ascii=False)
+    prune()
+
+
+def profile_ids():
+    """Идентификаторы сохранённых профилей, новые первыми."""
+    if not os.path.isdir(settings.PROFILE_ROOT):
+        return []
+    ids = []
+    for name in os.listdir(settings.PROFILE_ROOT):
+        profile_id, extension = os.path.splitext(name)
+        if extension == '.json' and PROFILE_ID_RE.match(profile_id):
+            ids.append(profile_id)
+    # Идентификатор начинается с даты, поэтому сортируется по времени.
+    return sorted(ids, reverse=True)
+
+
+def prune():
+    """Удаляет профили сверх PROFILE_KEEP, начиная со старых."""
+    for profile_id in profile_ids()[settings.PROFILE_KEEP:]:
+        for extension in ('json', 'prof'):
+            try:
+                os.remove(profile_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Описания профилей без трассы SQL, новые первыми."""
+    profiles = []
+    for profile_id in profile_ids():
+        meta = load(profile_id)
+        if meta is not None:
+            meta['query_count'] = len(meta.pop('queries'))
+            profiles.append(meta)
+    return profiles
+
+
+def load(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(profile_path(profile_id, 'json')) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def stats_text(profile_id, sort='cumulative'):
+    """Верх таблицы pstats в текстовом виде."""
+    output = io.StringIO()
+    stats = pstats.Stats(profile_path(profile_id, 'prof'), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(TOP_FUNCTIONS)
+    return output.getvalue()
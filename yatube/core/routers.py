@@ -0,0 +1,64 @@
+"""Чтение с реплик, запись в основную базу.
+
+ReplicaRoutingMiddleware отмечает запросы к представлениям из
+REPLICA_VIEWS, и ReplicaRouter отправляет их чтения на случайную базу
+из DATABASE_REPLICAS. Всё остальное, включая любые записи, идёт в
+default. Реплики отстают, поэтому после записи поста, комментария или
+подписки (mark_write() из posts.signals и posts.write_queue) пользователь
+получает cookie REPLICA_PIN_COOKIE и REPLICA_PIN_SECONDS секунд читает
+только из default: свои записи он видит сразу. Попутные записи — сессия,
+хранилище миниатюр — пользователя не закрепляют.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+current_routing = ContextVar('current_routing', default=None)
+
+
+class Routing:
+    """Состояние маршрутизации одного запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+
+
+def mark_write():
+    """Отмечает запись, которую пользователь должен сразу увидеть."""
+    routing = current_routing.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if (
+            routing is None
+            or routing.pinned
+            or routing.wrote
+            or not routing.use_replica
+            or not settings.DATABASE_REPLICAS
+        ):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии default, объекты из них можно связывать.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,86 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+Обёртка ставится на каждое новое соединение (CoreConfig.ready) и пишет
+в логгер core.slowlog запросы дольше SLOW_QUERY_THRESHOLD секунд:
+текст, параметры, время, представление, строку кода или шаблона и
+EXPLAIN QUERY PLAN. Сгруппировать журнал по видам запросов —
+manage.py slow_queries.
+"""
+import json
+import logging
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from .instrumentation import current_metrics
+from .nplusone import find_origin, fingerprint
+
+logger = logging.getLogger('core.slowlog')
+
+EXPLAINABLE_RE = re.compile(
+    r'^\s*(?:SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE
+)
+
+
+def explain(connection, sql, params):
+    """План запроса построчно; None, если его не получить."""
+    if connection.vendor == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    else:
+        prefix = 'EXPLAIN '
+    try:
+        # Курсор драйвера, без execute_wrappers: иначе план попал бы
+        # в журнал сам.
+        cursor = connection.create_cursor()
+        try:
+            cursor.execute(prefix + sql, params)
+            return [str(row[-1]) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except (DatabaseError, connection.Database.Error):
+        # Ошибки курсора драйвера Django не оборачивает.
+        return None
+
+
+def slow_query_logger(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_THRESHOLD
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        if elapsed >= threshold:
+            log_query(context['connection'], sql, params, many, elapsed)
+
+
+def log_query(connection, sql, params, many, elapsed):
+    metrics = current_metrics.get()
+    plan = None
+    if not many and EXPLAINABLE_RE.match(sql):
+        plan = explain(connection, sql, params)
+    logger.warning(json.dumps({
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'ms': round(elapsed * 1000, 3),
+        'database': connection.alias,
+        'view': metrics.view_name if metrics is not None else None,
+        'origin': find_origin(),
+        'fingerprint': fingerprint(sql),
+        'sql': sql,
+        'params': [] if many else [str(param) for param in params or ()],
+        'plan': plan,
+    }, ensure_ascii=False))
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик connection_created.
+
+    Обёртка встаёт первой: execute_wrapper() снимает обёртки с конца
+    списка, и наша не должна сняться вместо чужой.
+    """
+    if slow_query_logger not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_logger)
@@ -0,0 +1,45 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+На каждое новое соединение ставятся SQLITE_PRAGMAS (WAL, synchronous,
+mmap, кэш страниц, ожидание блокировки) и обёртка, которая считает
+время записей и ошибки «database is locked» для /metrics. Время записи
+включает ожидание чужой блокировки в пределах busy_timeout.
+"""
+import re
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+
+from .metrics import LATENCY_BUCKETS, registry
+
+WRITE_RE = re.compile(r'^\s*(?:INSERT|UPDATE|DELETE|REPLACE)\b', re.I)
+
+
+def lock_metrics(execute, sql, params, many, context):
+    is_write = WRITE_RE.match(sql) is not None
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as error:
+        if 'locked' in str(error):
+            registry.inc('yatube_sqlite_lock_waits_total')
+        raise
+    finally:
+        if is_write:
+            registry.observe(
+                'yatube_sqlite_write_seconds',
+                time.perf_counter() - started, LATENCY_BUCKETS
+            )
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    if lock_metrics not in connection.execute_wrappers:
+        # Первой, как и журнал медленных запросов: см. core.slowlog.
+        connection.execute_wrappers.insert(0, lock_metrics)
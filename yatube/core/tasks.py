@@ -0,0 +1,218 @@
+"""Очередь фоновых задач в базе.
+
+Функция с декоратором @task ставится в очередь вызовом
+func.enqueue(**kwargs): в таблицу Task ложится строка с именем функции и
+аргументами в JSON, в транзакции вызывающего — задача появится, только
+если его запись зафиксирована. manage.py run_tasks забирает готовые
+задачи, сначала с большим приоритетом, затем более ранние, и выполняет
+их в пуле потоков или процессов, не больше TASK_QUEUES[очередь]
+одновременно для каждой очереди. Задачу получает тот обработчик, чей
+UPDATE сменил её статус, поэтому обработчиков может быть несколько.
+
+Упавшая задача возвращается в очередь с удваивающейся паузой, а после
+последней попытки остаётся в статусе failed. Без TASK_QUEUE_ENABLED
+enqueue выполняет функцию сразу, как до очереди.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .metrics import LATENCY_BUCKETS, registry
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Сколько кандидатов перебрать, если задачи перехватывают соседи.
+CLAIM_ATTEMPTS = 10
+
+
+def task(queue='default', priority=0, max_attempts=None):
+    """Декоратор задачи: добавляет функции метод enqueue()."""
+    def decorator(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.queue = queue
+        func.priority = priority
+        func.max_attempts = max_attempts
+        func.enqueue = partial(enqueue, func)
+        return func
+    return decorator
+
+
+def enqueue(func, run_at=None, delay=None, priority=None, **kwargs):
+    """Ставит задачу: к run_at, через delay секунд или сразу."""
+    if not settings.TASK_QUEUE_ENABLED:
+        func(**kwargs)
+        return None
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+    registry.inc('yatube_tasks_total', task=func.task_name, result='queued')
+    return Task.objects.create(
+        name=func.task_name,
+        kwargs=json.dumps(kwargs),
+        queue=func.queue,
+        priority=func.priority if priority is None else priority,
+        max_attempts=func.max_attempts or settings.TASK_MAX_ATTEMPTS,
+        run_at=run_at,
+    )
+
+
+def limit(queue):
+    return settings.TASK_QUEUES.get(queue, 1)
+
+
+def claim(queues=None):
+    """Забирает следующую готовую задачу; None, если таких нет."""
+    now = timezone.now()
+    running = dict(
+        Task.objects.filter(status=Task.RUNNING)
+        .values_list('queue').annotate(Count('pk'))
+    )
+    ready = Task.objects.filter(status=Task.PENDING, run_at__lte=now).exclude(
+        queue__in=[
+            queue for queue, count in running.items() if count >= limit(queue)
+        ]
+    )
+    if queues:
+        ready = ready.filter(queue__in=queues)
+    candidates = ready.order_by('-priority', 'run_at', 'pk').values_list(
+        'pk', flat=True
+    )
+    for pk in candidates[:CLAIM_ATTEMPTS]:
+        claimed = Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING, started=now, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def recover():
+    """Возвращает в очередь задачи, брошенные упавшим обработчиком."""
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        started__lt=timezone.now() - timedelta(seconds=settings.TASK_TIMEOUT)
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, last_error='TimeoutError'
+    )
+    return stale.update(status=Task.PENDING)
+
+
+def execute(pk):
+    """Выполняет забранную задачу; вызывается в потоке или процессе пула."""
+    task = Task.objects.get(pk=pk)
+    registry.observe(
+        'yatube_task_delay_seconds',
+        (task.started - task.run_at).total_seconds(),
+        LATENCY_BUCKETS, queue=task.queue
+    )
+    started = time.perf_counter()
+    try:
+        func = import_string(task.name)
+        if getattr(func, 'task_name', None) != task.name:
+            raise ImportError(f'{task.name} не задача')
+        func(**json.loads(task.kwargs))
+    except Exception as error:
+        _failed(task, error)
+    else:
+        task.delete()
+        registry.inc('yatube_tasks_total', task=task.name, result='done')
+    registry.observe(
+        'yatube_task_seconds', time.perf_counter() - started,
+        LATENCY_BUCKETS, queue=task.queue
+    )
+
+
+def _failed(task, error):
+    task.last_error = f'{type(error).__name__}: {error}'
+    if task.attempts < task.max_attempts:
+        task.status = Task.PENDING
+        task.run_at = timezone.now() + timedelta(
+            seconds=settings.TASK_RETRY_DELAY * 2 ** (task.attempts - 1)
+        )
+        result = 'retry'
+        logger.warning('Задача %s упала, повтор', task, exc_info=True)
+    else:
+        task.status = Task.FAILED
+        result = 'failed'
+        logger.error('Задача %s не выполнена', task, exc_info=True)
+    task.save(update_fields=['status', 'run_at', 'last_error'])
+    registry.inc('yatube_tasks_total', task=task.name, result=result)
+
+
+def init_process():
+    # Соединения родителя нельзя использовать после fork().
+    connections.close_all()
+
+
+class Worker:
+    """Забирает задачи из базы и раздаёт их пулу."""
+
+    def __init__(self, queues=None, workers=None, executor=None,
+                 interval=None):
+        self.queues = queues
+        self.workers = workers or settings.TASK_WORKERS
+        self.executor = executor or settings.TASK_EXECUTOR
+        if interval is None:
+            interval = settings.TASK_POLL_INTERVAL
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def run_pending(self):
+        """Выполняет готовые задачи по одной в текущем потоке."""
+        recover()
+        done = 0
+        task = claim(self.queues)
+        while task is not None:
+            execute(task.pk)
+            done += 1
+            task = claim(self.queues)
+        return done
+
+    def pool(self):
+        if self.executor == 'process':
+            return ProcessPoolExecutor(
+                self.workers, initializer=init_process
+            )
+        return ThreadPoolExecutor(self.workers, thread_name_prefix='task')
+
+    def serve_forever(self):
+        running = set()
+        with self.pool() as pool:
+            while not self._stop.is_set():
+                try:
+                    recover()
+                    while len(running) < self.workers:
+                        task = claim(self.queues)
+                        if task is None:
+                            break
+                        running.add(pool.submit(execute, task.pk))
+                except DatabaseError:
+                    # Занятая база не должна останавливать обработчик.
+                    logger.exception('Очередь задач недоступна')
+                if not running:
+                    self._stop.wait(self.interval)
+                    continue
+                done, running = wait(
+                    running, self.interval, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception() is not None:
+                        logger.error(
+                            'Обработчик задач упал',
+                            exc_info=future.exception()
+                        )
+
+    def stop(self):
+        self._stop.set()
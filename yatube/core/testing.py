@@ -0,0 +1,35 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner as BaseDiscoverRunner
+
+
+class DiscoverRunner(BaseDiscoverRunner):
+    """Тестовый раннер, в котором N+1 запросы роняют тест.
+
+    Выборочный лог core.perf выключен: его строки попадали бы в вывод
+    тестов. Тесты самого лога включают его через override_settings.
+    Потребители outbox работают в потоке теста (on_commit_callbacks()):
+    фоновый поток не увидел бы незафиксированных данных TestCase.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_MODE = 'raise'
+        settings.PERF_LOG_SAMPLE_RATE = 0
+        settings.OUTBOX_DELIVERY = 'inline'
+
+
+@contextmanager
+def on_commit_callbacks(using=DEFAULT_DB_ALIAS):
+    """Выполняет на выходе колбэки transaction.on_commit.
+
+    TestCase не фиксирует транзакцию, и сами они не запустятся; в Django
+    3.2 то же делает captureOnCommitCallbacks(execute=True).
+    """
+    yield
+    connection = connections[using]
+    while connection.run_on_commit:
+        _, callback = connection.run_on_commit.pop(0)
+        callback()
@@ -0,0 +1,150 @@
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from core import breaker as breaker_module
+from core.breaker import breaker
+from core.metrics import registry
+from posts.models import Group, Post, User
+from posts.snapshots import snapshot_path
+
+TEMP_SNAPSHOT_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def locked(execute, sql, params, many, context):
+    raise OperationalError('database is locked')
+
+
+@override_settings(BREAKER_THRESHOLD=2, BREAKER_WINDOW=60,
+                   BREAKER_OPEN_SECONDS=60)
+class CircuitBreakerTest(SimpleTestCase):
+    def setUp(self):
+        self.breaker = breaker_module.CircuitBreaker()
+
+    def test_opens_after_threshold(self):
+        self.breaker.failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, breaker_module.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_single_probe_after_pause(self):
+        self.breaker.failure()
+        self.breaker.failure()
+        self.breaker.opened_at -= 60
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, breaker_module.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.breaker.opened_at -= 60
+        self.assertTrue(self.breaker.allow())
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, breaker_module.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(BREAKER_THRESHOLD=2, BREAKER_WINDOW=60,
+                   BREAKER_OPEN_SECONDS=60, SNAPSHOT_ROOT=TEMP_SNAPSHOT_ROOT)
+class DegradedModeTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_breaker')
+        cls.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test'
+        )
+        cls.post = Post.objects.create(
+            text='TEST POST', author=cls.user, group=cls.group
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SNAPSHOT_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        breaker.reset()
+        self.guest = Client()
+        self.url = reverse('posts:group_list', args=('test_slug',))
+
+    def tearDown(self):
+        breaker.reset()
+
+    def trip(self):
+        with connection.execute_wrapper(locked):
+            for _ in range(2):
+                self.guest.get(self.url)
+
+    def test_lock_errors_open_breaker_and_serve_copy(self):
+        fresh = self.guest.get(self.url)
+        self.trip()
+        self.assertEqual(breaker.state, 'open')
+        with self.assertNumQueries(0):
+            response = self.guest.get(self.url)
+        self.assertEqual(response.content, fresh.content)
+        self.assertIn('Stale', response['Warning'])
+        counters = registry.snapshot()['counters']
+        for reason in ('locked', 'breaker'):
+            self.assertIn([
+                'yatube_degraded_responses_total',
+                {'view': 'posts:group_list', 'reason': reason,
+                 'fallback': 'stale'},
+                1 if reason == 'breaker' else 2
+            ], counters)
+
+    def test_snapshot_served_without_copy(self):
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        path = snapshot_path(url)
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as file:
+            file.write('SNAPSHOT')
+        self.trip()
+        response = self.guest.get(url)
+        self.assertEqual(response.content, b'SNAPSHOT')
+        response = self.guest.get(
+            reverse('posts:profile', args=('test_breaker',))
+        )
+        self.assertEqual(response.status_code, 503)
+
+    def test_snapshot_outside_root_not_served(self):
+        outside = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, outside)
+        with open(os.path.join(outside, 'index.html'), 'w') as file:
+            file.write('SECRET')
+        relative = os.path.relpath(outside, TEMP_SNAPSHOT_ROOT)
+        self.assertIsNone(snapshot_path(relative))
+        self.trip()
+        url = reverse('about:author')
+        for query in (outside, relative, f'page={relative}', 'page=-1'):
+            response = self.guest.get(f'{url}?{query}')
+            self.assertEqual(response.status_code, 503)
+            self.assertNotIn(b'SECRET', response.content)
+
+    def test_writes_rejected(self):
+        client = Client()
+        client.force_login(self.user)
+        self.trip()
+        with self.assertNumQueries(0):
+            response = client.post(
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                {'text': 'TEST COMMENT'}
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(
+            response, 'только на чтение', status_code=503
+        )
+        self.assertFalse(self.post.comments.exists())
+
+    def test_probe_closes_breaker(self):
+        self.trip()
+        breaker.opened_at -= 60
+        response = self.guest.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Warning', response)
+        self.assertEqual(breaker.state, 'closed')
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import budget
+from core.middleware import QueryBudgetMiddleware
+from core.breaker import breaker
+from core.metrics import registry
+from posts.models import Comment, Group, Post, User
+
+# Без бюджета считает десятки секунд.
+SLOW_SQL = (
+    'WITH RECURSIVE counter(n) AS (SELECT 1 UNION ALL '
+    'SELECT n + 1 FROM counter WHERE n < 100000000) '
+    'SELECT count(*) FROM counter'
+)
+
+
+def slow_queries(execute, sql, params, many, context):
+    # Только внутри бюджета: запасной ответ строится уже без него.
+    if budget.current_budget.get() is not None:
+        database = context['connection']
+        with database.wrap_database_errors:
+            database.connection.execute(SLOW_SQL)
+    return execute(sql, params, many, context)
+
+
+def slow_events(execute, sql, params, many, context):
+    # Комментарий уже записан, событие о нём не успевает.
+    if sql.startswith('INSERT INTO "posts_outboxevent"'):
+        return slow_queries(execute, sql, params, many, context)
+    return execute(sql, params, many, context)
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_budget')
+        cls.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test'
+        )
+        Post.objects.create(
+            text='TEST POST', author=cls.user, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        breaker.reset()
+        self.url = reverse('posts:group_list', args=('test_slug',))
+
+    def tearDown(self):
+        breaker.reset()
+
+    def exceeded(self, fallback):
+        return [
+            'yatube_degraded_responses_total',
+            {'view': 'posts:group_list', 'reason': 'budget',
+             'fallback': fallback}, 1
+        ]
+
+    def test_statement_interrupted_when_budget_runs_out(self):
+        with budget.limit(0.05) as current:
+            with self.assertRaises(OperationalError):
+                with connection.cursor() as cursor:
+                    cursor.execute(SLOW_SQL)
+        self.assertTrue(current.exceeded)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_guest_gets_stale_copy(self):
+        guest = Client()
+        fresh = guest.get(self.url)
+        self.assertContains(fresh, 'TEST POST')
+        with override_settings(QUERY_BUDGETS={'posts:group_list': 0.05}):
+            with connection.execute_wrapper(slow_queries):
+                stale = guest.get(self.url)
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.content, fresh.content)
+        self.assertIn('Stale', stale['Warning'])
+        self.assertIn('no-cache', stale['Cache-Control'])
+        self.assertIn(
+            self.exceeded('stale'), registry.snapshot()['counters']
+        )
+
+    def test_user_gets_try_again(self):
+        client = Client()
+        client.force_login(self.user)
+        with override_settings(QUERY_BUDGETS={'posts:group_list': 0.05}):
+            with connection.execute_wrapper(slow_queries):
+                response = client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertTemplateUsed(response, 'core/503.html')
+        self.assertIn(
+            self.exceeded('unavailable'), registry.snapshot()['counters']
+        )
+
+    def test_budget_use_observed(self):
+        Client().get(self.url)
+        histograms = {
+            (name, labels['view']): histogram
+            for name, labels, histogram
+            in registry.snapshot()['histograms']
+        }
+        self.assertEqual(
+            histograms[
+                'yatube_query_budget_used_ratio', 'posts:group_list'
+            ]['count'],
+            1
+        )
+
+    def test_interrupted_write_rolled_back_with_request(self):
+        client = Client()
+        client.force_login(self.user)
+        post = Post.objects.get()
+        atomic = mock.patch.dict(
+            connection.settings_dict, ATOMIC_REQUESTS=True
+        )
+        with override_settings(QUERY_BUDGETS={'posts:add_comment': 0.05}):
+            with atomic, connection.execute_wrapper(slow_events):
+                response = client.post(
+                    reverse('posts:add_comment', args=(post.pk,)),
+                    {'text': 'TEST COMMENT'}
+                )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Comment.objects.exists())
+
+    @override_settings(QUERY_BUDGET_DEFAULT=5)
+    def test_template_response_checked_after_render(self):
+        # LoginView отдаёт TemplateResponse, а кука CSRF появляется только
+        # после рендера: такую страницу другим гостям отдавать нельзя.
+        response = Client().get(reverse('users:login'))
+        self.assertEqual(response.status_code, 200)
+        key = QueryBudgetMiddleware.stale_key(response.wsgi_request)
+        self.assertIsNone(cache.get(key))
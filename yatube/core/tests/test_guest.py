@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from core import guest
+from posts.models import Group, Post, User
+
+
+class GuestRequestTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='гость')
+        cls.group = Group.objects.create(
+            title='Группа', slug='test_slug', description='Test'
+        )
+        for number in range(12):
+            Post.objects.create(
+                text=f'TEST POST {number}', author=cls.user, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_rendered_for_guest(self):
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        response = guest.get(f'{url}?page=2', 'localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'TEST POST 0', response.content)
+        self.assertNotIn(b'TEST POST 11', response.content)
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_unicode_path(self):
+        url = reverse('posts:profile', args=(self.user.username,))
+        response = guest.get(url, 'localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('гость'.encode(), response.content)
+
+    def test_missing_page(self):
+        response = guest.get('/unknown/', 'localhost')
+        self.assertEqual(response.status_code, 404)
+
+    def test_disallowed_host(self):
+        response = guest.get(reverse('posts:index'), 'example.com')
+        self.assertEqual(response.status_code, 400)
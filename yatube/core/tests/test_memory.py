@@ -0,0 +1,79 @@
+import tracemalloc
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core.memory import tracker
+from posts.models import Post, User
+
+CACHE = []
+
+
+@override_settings(MEMORY_PROFILE_ENABLED=True, MEMORY_PROFILE_FRAMES=5)
+class MemoryProfileTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(
+            username='test_memory_staff', is_staff=True
+        )
+        cls.user = User.objects.create_user(username='test_memory')
+        Post.objects.create(text='TEST POST!!!', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        tracker.reset()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def tearDown(self):
+        tracemalloc.stop()
+        CACHE.clear()
+
+    def test_growth_attributed_to_view(self):
+        Client().get(reverse('posts:index'))
+        Client().get(reverse('posts:index'))
+        views, sites = tracker.report()
+        names = dict(views)
+        self.assertEqual(names['posts:index'].requests, 2)
+        self.assertTrue(sites)
+
+    def test_leak_site_reported(self):
+        tracker.start()
+        before = tracker.snapshot()
+        CACHE.append(bytearray(256 * 1024))
+        tracker.record('leaky', before, tracker.snapshot())
+        views, sites = tracker.report()
+        name, view = views[0]
+        self.assertEqual(name, 'leaky')
+        self.assertGreaterEqual(view.growth, 256 * 1024)
+        site, size = view.sites.most_common(1)[0]
+        self.assertIn('core/tests/test_memory.py', site)
+        self.assertGreaterEqual(size, 256 * 1024)
+
+    @override_settings(MEMORY_PROFILE_SITES=3)
+    def test_sites_bounded(self):
+        tracker.start()
+        for _ in range(5):
+            before = tracker.snapshot()
+            CACHE.append(bytearray(256 * 1024))
+            CACHE.extend(str(number) * 100 for number in range(50))
+            tracker.record('leaky', before, tracker.snapshot())
+        view = dict(tracker.report()[0])['leaky']
+        self.assertLessEqual(len(view.sites), 3)
+        site, size = view.sites.most_common(1)[0]
+        self.assertIn('core/tests/test_memory.py', site)
+        self.assertGreaterEqual(size, 5 * 256 * 1024)
+
+    def test_staff_page(self):
+        Client().get(reverse('posts:index'))
+        response = self.staff_client.get(reverse('memory_profile'))
+        self.assertContains(response, 'posts:index')
+        self.staff_client.post(reverse('memory_profile'))
+        views, _ = tracker.report()
+        self.assertNotIn('posts:index', dict(views))
+
+    def test_staff_only(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('memory_profile'))
+        self.assertEqual(response.status_code, 302)
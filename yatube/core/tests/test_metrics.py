@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core.metrics import registry
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR, METRICS_ENABLED=True,
+                   METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.client = Client(HTTP_AUTHORIZATION='Bearer secret')
+
+    def test_request_metrics_exposed(self):
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(
+            response['Content-Type'],
+            'text/plain; version=0.0.4; charset=utf-8'
+        )
+        text = response.content.decode()
+        for line in (
+            '# TYPE yatube_request_duration_seconds histogram',
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            'yatube_request_queries_bucket{view="posts:index",le="+Inf"} 1',
+            'yatube_cache_requests_total{result="miss"}',
+        ):
+            with self.subTest(line=line):
+                self.assertIn(line, text)
+
+    def test_other_processes_aggregated(self):
+        other = {
+            'counters': [
+                ['yatube_sqlite_lock_waits_total', {}, 2],
+            ],
+            'histograms': [[
+                'yatube_request_queries', {'view': 'posts:index'}, {
+                    'buckets': [1, 10], 'counts': [0, 1],
+                    'sum': 5, 'count': 1,
+                },
+            ]],
+        }
+        registry.observe(
+            'yatube_request_queries', 2, (1, 10), view='posts:index'
+        )
+        registry.inc('yatube_sqlite_lock_waits_total')
+        with open(os.path.join(TEMP_METRICS_DIR, '1.json'), 'w') as file:
+            json.dump(other, file)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_sqlite_lock_waits_total 3', text)
+        self.assertIn(
+            'yatube_request_queries_bucket{view="posts:index",le="10"} 2',
+            text
+        )
+        self.assertIn('yatube_request_queries_sum{view="posts:index"} 7', text)
+        os.remove(os.path.join(TEMP_METRICS_DIR, '1.json'))
+
+    def test_dead_process_files_removed(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        path = os.path.join(TEMP_METRICS_DIR, f'{process.pid}.json')
+        with open(path, 'w') as file:
+            json.dump({
+                'counters': [['yatube_sqlite_lock_waits_total', {}, 5]],
+                'histograms': [],
+            }, file)
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertNotIn('yatube_sqlite_lock_waits_total 5', text)
+        self.assertFalse(os.path.exists(path))
+
+    def test_nothing_written_when_disabled(self):
+        registry.inc('yatube_sqlite_lock_waits_total')
+        path = os.path.join(TEMP_METRICS_DIR, f'{os.getpid()}.json')
+        if os.path.exists(path):
+            os.remove(path)
+        with self.settings(METRICS_ENABLED=False):
+            registry.flush()
+        self.assertFalse(os.path.exists(path))
+
+    def test_metrics_require_token(self):
+        for header in ('', 'Bearer wrong', 'secret'):
+            with self.subTest(header=header):
+                response = Client(HTTP_AUTHORIZATION=header).get(
+                    reverse('metrics')
+                )
+                self.assertEqual(response.status_code, 403)
+        with self.settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'))
+            self.assertEqual(response.status_code, 403)
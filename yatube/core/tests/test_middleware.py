@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+from core.middleware import RequestCoalescingMiddleware, freeze_response
+
+
+@override_settings(COALESCE_TIMEOUT=5, COALESCE_POLL_INTERVAL=0.01)
+class RequestCoalescingMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+    def slow_view(self, request):
+        self.calls += 1
+        time.sleep(0.2)
+        return HttpResponse(f'call {self.calls}')
+
+    def test_concurrent_requests_share_response(self):
+        middleware = RequestCoalescingMiddleware(self.slow_view)
+        responses = []
+
+        def fetch():
+            request = self.factory.get('/group/test_slug/?page=1')
+            responses.append(middleware(request))
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            {response.content for response in responses}, {b'call 1'}
+        )
+        self.assertEqual(len({id(response) for response in responses}), 5)
+
+    def test_waits_for_other_worker(self):
+        middleware = RequestCoalescingMiddleware(self.slow_view)
+        request = self.factory.get('/')
+        key = middleware.request_key(request)
+        cache.add(key + ':lock', 1)
+
+        def other_worker():
+            time.sleep(0.1)
+            cache.set(
+                key + ':response', freeze_response(HttpResponse('other'))
+            )
+            cache.delete(key + ':lock')
+
+        threading.Thread(target=other_worker).start()
+        response = middleware(request)
+        self.assertEqual(response.content, b'other')
+        self.assertEqual(self.calls, 0)
+
+    def test_user_requests_not_coalesced(self):
+        middleware = RequestCoalescingMiddleware(self.slow_view)
+        request = self.factory.get('/', HTTP_COOKIE='sessionid=abc')
+        key = middleware.request_key(request)
+        cache.add(key + ':lock', 1)
+        middleware(request)
+        self.assertEqual(self.calls, 1)
+
+    def test_cookie_dependent_response_not_shared(self):
+        def view(request):
+            response = HttpResponse('csrf form')
+            response['Vary'] = 'Cookie'
+            return response
+
+        middleware = RequestCoalescingMiddleware(view)
+        request = self.factory.get('/auth/login/')
+        key = middleware.request_key(request)
+        cache.set(key + ':waiters', 1)
+        middleware(request)
+        self.assertIsNone(cache.get(key + ':response'))
+
+
+class ServerTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create_user(
+            username='test_timing'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1, PERF_LOG_SAMPLE_RATE=0)
+    def test_server_timing_header(self):
+        response = self.client.get(self.url)
+        timing = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            with self.subTest(metric=metric):
+                self.assertIn(metric, timing)
+        self.assertNotIn('desc="0 queries"', timing)
+
+    def test_server_timing_off_by_default(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0, PERF_LOG_SAMPLE_RATE=1)
+    def test_perf_log_line(self):
+        with self.assertLogs('core.perf', 'INFO') as logs:
+            response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'posts:profile')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['sql_count'], 0)
+        self.assertGreater(line['template_ms'], 0)
+        self.assertGreater(line['cache_misses'], 0)
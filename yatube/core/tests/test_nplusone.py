@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.template import Context, Engine
+from django.test import TestCase, override_settings
+from core.nplusone import Detector, NPlusOneError, fingerprint
+
+User = get_user_model()
+
+
+class FingerprintTest(TestCase):
+    def test_values_removed(self):
+        shapes = {
+            'SELECT * FROM t WHERE id = 5': 'SELECT * FROM t WHERE id = ?',
+            "SELECT * FROM t WHERE name = 'it''s'":
+                'SELECT * FROM t WHERE name = ?',
+            'SELECT * FROM t WHERE id IN (%s, %s, %s)':
+                'SELECT * FROM t WHERE id IN (...)',
+            'SELECT *\n  FROM t1': 'SELECT * FROM t1',
+        }
+        for sql, expected in shapes.items():
+            with self.subTest(sql=sql):
+                self.assertEqual(fingerprint(sql), expected)
+
+
+@override_settings(NPLUSONE_MODE='raise', NPLUSONE_THRESHOLD=3)
+class DetectorTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [
+            User.objects.create_user(username=f'user_{number}').pk
+            for number in range(3)
+        ]
+
+    def test_repeated_query_in_code(self):
+        with self.assertRaisesMessage(
+            NPlusOneError, 'core/tests/test_nplusone.py'
+        ):
+            with connection.execute_wrapper(Detector('/test/')):
+                for pk in self.ids:
+                    User.objects.get(pk=pk)
+
+    def test_repeated_query_in_template(self):
+        template = Engine().from_string(
+            '{% for pk in ids %}\n'
+            '{{ users.get.pk }}\n'
+            '{% endfor %}'
+        )
+
+        class Users:
+            def __init__(self, ids):
+                self.ids = iter(ids)
+
+            def get(self):
+                return User.objects.get(pk=next(self.ids))
+
+        context = Context({'ids': self.ids, 'users': Users(self.ids)})
+        with self.assertRaisesMessage(NPlusOneError, ':2:'):
+            with connection.execute_wrapper(Detector('/test/')):
+                template.render(context)
+
+    def test_different_queries_pass(self):
+        with connection.execute_wrapper(Detector('/test/')):
+            User.objects.get(pk=self.ids[0])
+            User.objects.filter(username='user_1').exists()
+            User.objects.count()
+
+    @override_settings(NPLUSONE_MODE='warn')
+    def test_warn_mode(self):
+        with self.assertLogs('core.nplusone', 'WARNING'):
+            with self.assertWarns(UserWarning):
+                with connection.execute_wrapper(Detector('/test/')):
+                    for pk in self.ids:
+                        User.objects.get(pk=pk)
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import profiling
+from posts.models import Post, User
+
+TEMP_PROFILE_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PROFILE_ROOT=TEMP_PROFILE_ROOT, PROFILE_KEEP=2)
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(
+            username='test_staff', is_staff=True
+        )
+        cls.user = User.objects.create_user(username='test_profiling')
+        Post.objects.create(text='TEST POST!!!', author=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILE_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_PROFILE_ROOT, ignore_errors=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.user_client = Client()
+        self.user_client.force_login(self.user)
+
+    def profile_url(self):
+        return reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+
+    def test_staff_request_profiled(self):
+        response = self.staff_client.get(self.profile_url(), {'profile': 1})
+        profile_id = response['X-Profile-Id']
+        meta = profiling.load(profile_id)
+        self.assertEqual(meta['view'], 'posts:profile')
+        self.assertEqual(meta['user'], self.staff.username)
+        self.assertTrue(meta['queries'])
+        self.assertTrue(os.path.exists(
+            profiling.profile_path(profile_id, 'prof')
+        ))
+        self.assertIn('cumulative', profiling.stats_text(profile_id))
+
+    def test_header_opt_in(self):
+        response = self.staff_client.get(
+            self.profile_url(), HTTP_X_PROFILE='1'
+        )
+        self.assertIn('X-Profile-Id', response)
+
+    def test_only_staff_and_opt_in(self):
+        for client, params in (
+            (self.user_client, {'profile': 1}),
+            (self.staff_client, {}),
+        ):
+            with self.subTest(params=params):
+                response = client.get(self.profile_url(), params)
+                self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.profile_ids(), [])
+
+    def test_retention(self):
+        for _ in range(3):
+            self.staff_client.get(self.profile_url(), {'profile': 1})
+        self.assertEqual(len(profiling.profile_ids()), 2)
+        self.assertEqual(len(os.listdir(TEMP_PROFILE_ROOT)), 4)
+
+    def test_admin_pages(self):
+        profile_id = self.staff_client.get(
+            self.profile_url(), {'profile': 1}
+        )['X-Profile-Id']
+        response = self.staff_client.get(reverse('request_profiles'))
+        self.assertContains(
+            response,
+            reverse('request_profile', kwargs={'profile_id': profile_id})
+        )
+        detail = reverse('request_profile', kwargs={'profile_id': profile_id})
+        response = self.staff_client.get(detail, {'sort': 'tottime'})
+        self.assertContains(response, 'posts_post')
+        response = self.staff_client.get(detail, {'download': 1})
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="{profile_id}.prof"'
+        )
+        response.close()
+
+    def test_admin_pages_staff_only(self):
+        response = self.user_client.get(reverse('request_profiles'))
+        self.assertEqual(response.status_code, 302)
+        response = self.staff_client.get(
+            reverse('request_profile', kwargs={'profile_id': 'missing'})
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,154 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import warnings
+from unittest import mock
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from core.routers import ReplicaRouter, Routing, current_routing
+from posts.models import Post, User
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def route(self, routing):
+        token = current_routing.set(routing)
+        try:
+            return self.router.db_for_read(Post)
+        finally:
+            current_routing.reset(token)
+
+    def test_replica_views_read_from_replicas(self):
+        routing = Routing()
+        routing.use_replica = True
+        self.assertIn(self.route(routing), settings.DATABASE_REPLICAS)
+
+    def test_other_reads_go_to_default(self):
+        pinned = Routing(pinned=True)
+        pinned.use_replica = True
+        wrote = Routing()
+        wrote.use_replica = True
+        wrote.wrote = True
+        cases = {
+            'вне запроса': None,
+            'не из REPLICA_VIEWS': Routing(),
+            'закреплён': pinned,
+            'после записи': wrote,
+        }
+        for case, routing in cases.items():
+            with self.subTest(case=case):
+                self.assertIsNone(self.route(routing))
+
+    def test_write_routing_does_not_pin(self):
+        routing = Routing()
+        token = current_routing.set(routing)
+        try:
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+        finally:
+            current_routing.reset(token)
+        self.assertFalse(routing.wrote)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+# Реплики 'replica' в DATABASES нет: любое чтение с неё упадёт, значит,
+# прошедшие запросы читали из default.
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaPinningTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_router')
+        cls.post = Post.objects.create(text='TEST POST', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_write_pins_user_to_primary(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'TEST COMMENT'}
+        )
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertContains(response, 'TEST COMMENT')
+
+    @override_settings(WRITE_QUEUE_ENABLED=True)
+    def test_queued_write_pins_user_to_primary(self):
+        reply = {'pk': 1, 'created': '2022-01-01T00:00:00+00:00'}
+        with mock.patch('posts.write_queue.submit', return_value=reply):
+            response = self.client.post(
+                reverse('posts:add_comment', args=(self.post.pk,)),
+                {'text': 'TEST COMMENT'}
+            )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_reads_without_pin_use_replica(self):
+        with self.assertRaisesMessage(Exception, 'replica'):
+            self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )
+
+    def test_guest_pages_not_pinned(self):
+        guest = Client()
+        response = guest.get(reverse('about:author'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_session_write_does_not_pin(self):
+        User.objects.create_user(
+            username='test_login', password='test_password'
+        )
+        response = Client().post(
+            reverse('users:login'),
+            {'username': 'test_login', 'password': 'test_password'}
+        )
+        self.assertIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+
+class RefreshReplicaTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.primary = os.path.join(self.directory, 'primary.sqlite3')
+        self.replica = os.path.join(self.directory, 'replica.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replica_gets_copy_of_primary(self):
+        with sqlite3.connect(self.primary) as primary:
+            primary.execute('CREATE TABLE items (name TEXT)')
+            primary.execute("INSERT INTO items VALUES ('first')")
+        engine = 'django.db.backends.sqlite3'
+        databases = {
+            'default': {'ENGINE': engine, 'NAME': self.primary},
+            'replica': {'ENGINE': engine, 'NAME': self.replica},
+        }
+        with warnings.catch_warnings():
+            # Django предупреждает о смене DATABASES, а команде нужны
+            # только пути к файлам.
+            warnings.simplefilter('ignore')
+            with override_settings(
+                DATABASES=databases, DATABASE_REPLICAS=['replica']
+            ):
+                call_command(
+                    'refresh_replica', stdout=open(os.devnull, 'w')
+                )
+        replica = sqlite3.connect(self.replica)
+        try:
+            rows = replica.execute('SELECT name FROM items').fetchall()
+        finally:
+            replica.close()
+        self.assertEqual(rows, [('first',)])
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core import slowlog
+from posts.models import Post, User
+
+TEMP_LOG_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class SlowQueryLoggerTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_slowlog')
+        Post.objects.create(text='TEST POST!!!', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_installed_first(self):
+        self.assertIs(
+            connection.execute_wrappers[0], slowlog.slow_query_logger
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_entry(self):
+        url = reverse('posts:profile', kwargs={'username': 'test_slowlog'})
+        with self.assertLogs('core.slowlog', 'WARNING') as logs:
+            Client().get(url)
+        entries = [
+            json.loads(record.getMessage()) for record in logs.records
+        ]
+        posts = [
+            entry for entry in entries
+            if 'ORDER BY "posts_post"."pub_date"' in entry['sql']
+        ]
+        self.assertTrue(posts)
+        entry = posts[-1]
+        self.assertEqual(entry['view'], 'posts:profile')
+        self.assertTrue(entry['plan'])
+        self.assertTrue(entry['origin'])
+        self.assertNotIn('core/', entry['origin'])
+        self.assertIn(str(self.user.pk), entry['params'])
+        self.assertEqual(entry['fingerprint'].count('%s'), 0)
+
+    def test_unexplainable_query(self):
+        self.assertIsNone(
+            slowlog.explain(connection, 'SELECT * FROM no_such_table', ())
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD=0)
+    def test_failed_query_keeps_its_error(self):
+        with self.assertLogs('core.slowlog', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT * FROM no_such_table')
+
+    @override_settings(SLOW_QUERY_THRESHOLD=None)
+    def test_disabled(self):
+        with mock.patch.object(slowlog.logger, 'warning') as warning:
+            Post.objects.count()
+        warning.assert_not_called()
+
+    @override_settings(SLOW_QUERY_THRESHOLD=60)
+    def test_fast_queries_skipped(self):
+        with mock.patch.object(slowlog.logger, 'warning') as warning:
+            Post.objects.count()
+        warning.assert_not_called()
+
+
+class SlowQueriesCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def test_ranked_by_total_time(self):
+        path = os.path.join(TEMP_LOG_DIR, 'slow.log')
+        entries = [
+            ('SELECT * FROM a WHERE id = ?', 'posts:index', 50,
+             ['SEARCH a USING INTEGER PRIMARY KEY (rowid=?)']),
+            ('SELECT * FROM a WHERE id = ?', 'posts:index', 50, None),
+            ('SELECT * FROM b WHERE x = ?', 'posts:profile', 300,
+             ['SCAN b']),
+        ]
+        # Старые записи лежат в файле после ротации.
+        with open(path + '.1', 'w') as file:
+            shape, view, ms, plan = entries[0]
+            file.write(json.dumps({
+                'fingerprint': shape, 'view': view, 'ms': ms, 'plan': plan,
+            }) + '\n')
+        with open(path, 'w') as file:
+            for shape, view, ms, plan in entries[1:]:
+                file.write(json.dumps({
+                    'fingerprint': shape, 'view': view, 'ms': ms,
+                    'plan': plan, 'origin': 'posts/views.py:1',
+                }) + '\n')
+            file.write('неполная строка\n')
+        out = StringIO()
+        call_command('slow_queries', log=path, stdout=out, no_color=True)
+        output = out.getvalue()
+        self.assertLess(
+            output.index('FROM b'), output.index('FROM a')
+        )
+        self.assertIn('100.0 мс всего, 2 раз', output)
+        self.assertIn('SCAN b  <-- полный просмотр таблицы', output)
+        self.assertIn('Видов запросов: 2, записей: 3', output)
+
+        out = StringIO()
+        call_command(
+            'slow_queries', log=path, view='posts:index', stdout=out
+        )
+        self.assertNotIn('FROM b', out.getvalue())
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase
+from core import sqlite
+from core.metrics import registry
+from posts.models import Post, User
+
+TEMP_DB_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def pragma(cursor, name):
+    cursor.execute(f'PRAGMA {name}')
+    return cursor.fetchone()[0]
+
+
+class SQLiteProfileTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DB_DIR, ignore_errors=True)
+
+    def setUp(self):
+        registry.reset()
+
+    def test_pragmas_on_new_connection(self):
+        database = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(TEMP_DB_DIR, 'pragmas.sqlite3'),
+        })
+        try:
+            with database.cursor() as cursor:
+                self.assertEqual(pragma(cursor, 'journal_mode'), 'wal')
+                # 1 — NORMAL
+                self.assertEqual(pragma(cursor, 'synchronous'), 1)
+                self.assertEqual(pragma(cursor, 'busy_timeout'), 5000)
+                self.assertEqual(pragma(cursor, 'cache_size'), -65536)
+            self.assertIn(sqlite.lock_metrics, database.execute_wrappers)
+        finally:
+            database.close()
+
+    def test_write_time_observed(self):
+        user = User.objects.create_user(username='test_sqlite')
+        Post.objects.create(text='TEST POST!!!', author=user)
+        histograms = dict(
+            (name, histogram)
+            for name, _, histogram in registry.snapshot()['histograms']
+        )
+        self.assertGreaterEqual(
+            histograms['yatube_sqlite_write_seconds']['count'], 2
+        )
+
+    def test_lock_errors_counted(self):
+        def locked(execute, sql, params, many, context):
+            raise OperationalError('database is locked')
+
+        with connection.execute_wrapper(locked):
+            with self.assertRaises(OperationalError):
+                Post.objects.count()
+        self.assertIn(
+            ['yatube_sqlite_lock_waits_total', {}, 1],
+            registry.snapshot()['counters']
+        )
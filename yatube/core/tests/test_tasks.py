@@ -0,0 +1,90 @@
+import os
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core import tasks
+from core.metrics import registry
+from core.models import Task
+
+calls = []
+
+
+@tasks.task()
+def remember(value):
+    calls.append(value)
+
+
+@tasks.task(queue='slow', priority=5)
+def remember_urgent(value):
+    calls.append(value)
+
+
+@tasks.task(max_attempts=2)
+def broken():
+    raise ValueError('broken')
+
+
+@override_settings(
+    TASK_QUEUE_ENABLED=True,
+    TASK_QUEUES={'default': 1, 'slow': 1},
+    TASK_RETRY_DELAY=10,
+)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+        registry.reset()
+
+    def test_runs_inline_without_queue(self):
+        with self.settings(TASK_QUEUE_ENABLED=False):
+            self.assertIsNone(remember.enqueue(value='NOW'))
+        self.assertEqual(calls, ['NOW'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_priority_and_schedule(self):
+        remember.enqueue(value='FIRST')
+        remember.enqueue(value='LATER', delay=60)
+        remember_urgent.enqueue(value='URGENT')
+        remember.enqueue(value='SECOND')
+        remember.enqueue(value='TOP', priority=10)
+        call_command('run_tasks', '--once', stdout=open(os.devnull, 'w'))
+        self.assertEqual(calls, ['TOP', 'URGENT', 'FIRST', 'SECOND'])
+        self.assertEqual(Task.objects.get().kwargs, '{"value": "LATER"}')
+
+    def test_queue_concurrency_limit(self):
+        remember.enqueue(value='BUSY')
+        remember.enqueue(value='WAITING')
+        remember_urgent.enqueue(value='OTHER QUEUE')
+        Task.objects.filter(kwargs='{"value": "BUSY"}').update(
+            status=Task.RUNNING, started=timezone.now()
+        )
+        self.assertEqual(tasks.claim(['default']), None)
+        self.assertEqual(tasks.claim().queue, 'slow')
+
+    def test_retry_with_backoff(self):
+        broken.enqueue()
+        with self.assertLogs('core.tasks', 'WARNING'):
+            tasks.execute(tasks.claim().pk)
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.last_error, 'ValueError: broken')
+        self.assertGreater(task.run_at, timezone.now() + timedelta(seconds=9))
+        self.assertIsNone(tasks.claim())
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.execute(tasks.claim().pk)
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+        self.assertIn(
+            ['yatube_tasks_total',
+             {'result': 'failed', 'task': broken.task_name}, 1],
+            registry.snapshot()['counters']
+        )
+
+    def test_abandoned_task_recovered(self):
+        remember.enqueue(value='ABANDONED')
+        tasks.claim()
+        Task.objects.update(started=timezone.now() - timedelta(days=1))
+        self.assertEqual(tasks.recover(), 1)
+        tasks.execute(tasks.claim().pk)
+        self.assertEqual(calls, ['ABANDONED'])
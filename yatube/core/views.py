@@ -1,5 +1,16 @@
+import hmac
 from http import HTTPStatus
-from django.shortcuts import render
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import redirect, render
+from django.views.decorators.http import require_http_methods
+
+from . import profiling
+from .memory import tracker
+from .metrics import exposition
 
 
 def page_not_found(request, exception):
@@ -33,3 +44,64 @@ def csrf_failure(request, reason=''):
         'core/403csrf.html',
         status=HTTPStatus.FORBIDDEN
     )
+
+
+def metrics(request):
+    # REMOTE_ADDR за прокси у всех один, поэтому доступ — по токену.
+    token = settings.METRICS_TOKEN
+    given = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(given, f'Bearer {token}'):
+        return HttpResponse(status=HTTPStatus.FORBIDDEN)
+    return HttpResponse(
+        exposition(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@staff_member_required
+def request_profiles(request):
+    return render(request, 'core/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': profiling.list_profiles(),
+    })
+
+
+@staff_member_required
+def request_profile(request, profile_id):
+    meta = profiling.load(profile_id)
+    if meta is None:
+        raise Http404
+    if 'download' in request.GET:
+        return FileResponse(
+            open(profiling.profile_path(profile_id, 'prof'), 'rb'),
+            as_attachment=True,
+            filename=f'{profile_id}.prof'
+        )
+    sort = request.GET.get('sort')
+    if sort not in profiling.SORTS:
+        sort = profiling.SORTS[0]
+    return render(request, 'core/profile.html', {
+        **admin.site.each_context(request),
+        'title': f'Профиль {meta["path"]}',
+        'profile': meta,
+        'sort': sort,
+        'sorts': profiling.SORTS,
+        'stats': profiling.stats_text(profile_id, sort),
+    })
+
+
+@staff_member_required
+@require_http_methods(['GET', 'POST'])
+def memory_profile(request):
+    if request.method == 'POST':
+        tracker.reset()
+        return redirect('memory_profile')
+    views, sites = tracker.report()
+    return render(request, 'core/memory.html', {
+        **admin.site.each_context(request),
+        'title': 'Память по представлениям',
+        'enabled': settings.MEMORY_PROFILE_ENABLED,
+        'views': views,
+        'sites': sites,
+    })
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import sharding, signals  # noqa: F401
+        connection_created.connect(sharding.disable_foreign_keys)
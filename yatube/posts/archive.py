@@ -0,0 +1,119 @@
+"""Архив старых постов.
+
+Почти все чтения приходятся на свежие посты, поэтому
+manage.py archive_posts переносит посты старше ARCHIVE_AFTER_DAYS дней
+вместе с комментариями в таблицы ArchivedPost и ArchivedComment той же
+базы (default или шарда), и индексы лент покрывают только свежие посты.
+
+Архивный пост открывается по прежнему адресу: страница поста ищет его в
+архиве, если среди свежих его нет. Лента (ArchiveFeed) читает архив,
+только когда страница заходит за последний свежий пост.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+from django.http import Http404
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchivedComment, ArchivedPost, Comment, Post
+
+
+def cutoff(days=None):
+    """Посты старше этой даты уходят в архив."""
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def count(posts, archived):
+    """Число свежих и архивных постов ленты вместе."""
+    if isinstance(posts, QuerySet) and isinstance(archived, QuerySet):
+        # Одним запросом, как считалась лента до архива.
+        return (
+            posts.order_by().values('pk')
+            .union(archived.order_by().values('pk'), all=True)
+            .count()
+        )
+    return posts.count() + archived.count()
+
+
+class ArchiveFeed:
+    """Свежие посты, за ними архивные — последовательность для Paginator.
+
+    Архив старше любого свежего поста, поэтому ленты просто идут одна
+    за другой, и архив читается, только когда страница заходит за
+    последний свежий пост.
+    """
+
+    def __init__(self, posts, archived):
+        self.posts = posts
+        self.archived = archived
+
+    def count(self):
+        return count(self.posts, self.archived)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        objects = list(self.posts[start:stop])
+        if stop is not None and len(objects) == stop - start:
+            return objects
+        if objects or not start:
+            fresh = start + len(objects)
+        else:
+            fresh = self.posts.count()
+        objects += list(self.archived[
+            max(start - fresh, 0):None if stop is None else stop - fresh
+        ])
+        return objects
+
+
+def feed(posts, archived, authors=None):
+    """Лента свежих постов posts с архивом archived в конце."""
+    return ArchiveFeed(
+        sharding.feed(posts, authors), sharding.feed(archived, authors)
+    )
+
+
+def get_post(post_id):
+    """Архивный пост с автором и группой; если его нет — Http404."""
+    posts = ArchivedPost.objects.select_related('author', 'group')
+    for alias in sharding.databases():
+        found = list(sharding.local(posts.filter(pk=post_id), alias))
+        if found:
+            return found[0]
+    raise Http404('Пост не найден ни среди свежих, ни в архиве.')
+
+
+def _copy(model, instance):
+    return model(**{
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    })
+
+
+def move(posts, alias):
+    """Переносит посты из базы alias с комментариями в её архив."""
+    post_ids = [post.pk for post in posts]
+    comments = Comment.objects.using(alias).filter(post_id__in=post_ids)
+    with transaction.atomic(using=alias):
+        # Повторный запуск после сбоя найдёт копии уже в архиве.
+        ArchivedPost.objects.using(alias).bulk_create(
+            [_copy(ArchivedPost, post) for post in posts],
+            ignore_conflicts=True
+        )
+        ArchivedComment.objects.using(alias).bulk_create(
+            [_copy(ArchivedComment, comment) for comment in comments],
+            ignore_conflicts=True
+        )
+        sharding.delete_rows(alias, Comment, 'post_id', post_ids)
+        sharding.delete_rows(alias, Post, 'id', post_ids)
+    cache.delete_many([sharding.POST_KEY.format(pk) for pk in post_ids])
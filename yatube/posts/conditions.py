@@ -0,0 +1,147 @@
+"""Валидаторы ETag и Last-Modified для лент и страницы поста.
+
+Для каждой области (главная, группа, профиль, пост, подписки
+пользователя) в кэше 'conditions', общем для всех процессов, лежит
+запись со случайной версией и временем, с которого область не менялась.
+Потребитель outbox (posts.consumers) после записи заменяет её новой.
+Пропавшая запись тоже собирается заново с новой версией и текущим
+временем: клиент никогда не получит 304 на изменённую страницу, в худшем
+случае он лишний раз скачает неизменную.
+"""
+import hashlib
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from . import sharding
+from .models import Post, User
+
+KEY = 'posts:conditions:{}'
+
+
+def _key(scope):
+    # Слаги и имена пользователей могут содержать недопустимые для
+    # memcached символы.
+    return KEY.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def _new_record(last_modified):
+    return {'etag': uuid.uuid4().hex, 'last_modified': last_modified}
+
+
+def _now():
+    # Last-Modified передаётся с точностью до секунды.
+    return timezone.now().replace(microsecond=0)
+
+
+def touch(*scopes):
+    """Отмечает области как изменённые прямо сейчас."""
+    records = caches['conditions']
+    now = _now()
+    for scope in scopes:
+        key = _key(scope)
+        previous = records.get(key)
+        last_modified = now
+        if previous is not None:
+            # Правка в ту же секунду, что и прошлая, тоже сдвигает
+            # Last-Modified.
+            last_modified = max(
+                now, previous['last_modified'] + timedelta(seconds=1)
+            )
+        records.set(
+            key, _new_record(last_modified), settings.CONDITIONAL_GET_TIMEOUT
+        )
+
+
+def _record(scope):
+    records = caches['conditions']
+    key = _key(scope)
+    record = records.get(key)
+    if record is None:
+        record = _new_record(_now())
+        if not records.add(key, record, settings.CONDITIONAL_GET_TIMEOUT):
+            # Запись успел собрать другой процесс.
+            record = records.get(key) or record
+    return record
+
+
+def _post_author(post_id):
+    key = _key(f'post:{post_id}:author')
+    username = cache.get(key)
+    if username is not None:
+        return username
+    if sharding.enabled():
+        author_id = (
+            Post.objects.using(sharding.locate_post(post_id))
+            .filter(pk=post_id)
+            .values_list('author_id', flat=True)
+            .first()
+        )
+        username = (
+            User.objects.filter(pk=author_id)
+            .values_list('username', flat=True)
+            .first()
+        )
+    else:
+        username = (
+            Post.objects.filter(pk=post_id)
+            .values_list('author__username', flat=True)
+            .first()
+        )
+    if username is not None:
+        cache.set(key, username, settings.CONDITIONAL_GET_TIMEOUT)
+    return username
+
+
+def index_scopes(request):
+    return ['index']
+
+
+def group_scopes(request, group):
+    return [f'group:{group}']
+
+
+def profile_scopes(request, username):
+    scopes = [f'profile:{username}']
+    if request.user.is_authenticated:
+        scopes.append(f'follow:{request.user.pk}')
+    return scopes
+
+
+def post_scopes(request, post_id):
+    username = _post_author(post_id)
+    if username is None:
+        return []
+    # На странице поста выводится число постов автора.
+    return [f'post:{post_id}', f'profile:{username}']
+
+
+def follow_scopes(request):
+    return ['index', f'follow:{request.user.pk}']
+
+
+def conditional(get_scopes):
+    """Обёртка над condition(), вычисляющая валидаторы по областям."""
+
+    def etag(request, *args, **kwargs):
+        scopes = get_scopes(request, *args, **kwargs)
+        if not scopes:
+            return None
+        # Шапка страницы зависит от пользователя.
+        parts = [str(request.user.pk)]
+        parts += [_record(scope)['etag'] for scope in scopes]
+        return hashlib.md5(':'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        dates = [
+            _record(scope)['last_modified']
+            for scope in get_scopes(request, *args, **kwargs)
+        ]
+        dates = [date for date in dates if date is not None]
+        return max(dates) if dates else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
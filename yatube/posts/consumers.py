@@ -0,0 +1,113 @@
+"""Потребители outbox (posts.outbox): работа, производная от записей."""
+from django.conf import settings
+from django.urls import reverse
+
+from . import conditions, snapshots, warming
+from .models import Group, User
+from .outbox import Consumer
+
+
+def _names(model, field, ids):
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return {}
+    return dict(model.objects.filter(pk__in=ids).values_list('pk', field))
+
+
+def _post_url(post_id):
+    return reverse('posts:post_detail', kwargs={'post_id': post_id})
+
+
+def _feed_urls(username, slugs):
+    urls = [reverse('posts:index')]
+    if username is not None:
+        urls.append(reverse('posts:profile', kwargs={'username': username}))
+    urls += [
+        reverse('posts:group_list', kwargs={'group': slug}) for slug in slugs
+    ]
+    return urls
+
+
+def _posts(events):
+    """Для событий о постах: событие, имя автора и слаги групп.
+
+    Имена и слаги берутся одной выборкой на пачку; пост к этому моменту
+    может быть уже удалён, поэтому всё нужное лежит в самом событии.
+    """
+    events = [event for event in events if event.topic.startswith('post.')]
+    data = [event.data for event in events]
+    usernames = _names(User, 'username', [item['author_id'] for item in data])
+    slugs = _names(Group, 'slug', [
+        item.get(key) for item in data
+        for key in ('group_id', 'previous_group_id')
+    ])
+    for event, item in zip(events, data):
+        groups = [
+            slugs[pk] for pk in (item.get('group_id'),
+                                 item.get('previous_group_id'))
+            if pk in slugs
+        ]
+        yield event, usernames.get(item['author_id']), groups
+
+
+class ConditionsConsumer(Consumer):
+    """Подменяет валидаторы ETag и Last-Modified изменённых областей."""
+    name = 'conditions'
+
+    def handle(self, events):
+        scopes = set()
+        for event, username, slugs in _posts(events):
+            scopes.update(['index', f'post:{event.object_id}'])
+            if username is not None:
+                scopes.add(f'profile:{username}')
+            scopes.update(f'group:{slug}' for slug in slugs)
+        for event in events:
+            if event.topic.startswith('comment.'):
+                scopes.add(f'post:{event.data["post_id"]}')
+            elif event.topic.startswith('follow.'):
+                scopes.add(f'follow:{event.data["user_id"]}')
+        conditions.touch(*sorted(scopes))
+
+
+class SnapshotsConsumer(Consumer):
+    """Удаляет снимки страниц с изменёнными и удалёнными постами.
+
+    Снимок поста удаляется и при любом изменении его комментариев:
+    удалённый комментарий render_snapshots сам не заметит.
+    """
+    name = 'snapshots'
+    topics = ('post.saved', 'post.deleted', 'comment.saved', 'comment.deleted')
+
+    def handle(self, events):
+        # Новый пост снимки не портит: их обновит render_snapshots.
+        events = [event for event in events if not event.data.get('created')]
+        urls = set()
+        for event, username, slugs in _posts(events):
+            urls.update(_feed_urls(username, slugs))
+            urls.add(_post_url(event.object_id))
+        urls.update(
+            _post_url(event.data['post_id']) for event in events
+            if event.topic.startswith('comment.')
+        )
+        snapshots.discard(sorted(urls))
+
+
+class WarmingConsumer(Consumer):
+    """Прогревает в фоне ленты и страницы, затронутые записью."""
+    name = 'warming'
+    topics = ('post.saved', 'post.deleted', 'comment.saved', 'comment.deleted')
+
+    def wants(self, event):
+        return settings.WARM_AFTER_WRITE and super().wants(event)
+
+    def handle(self, events):
+        urls = set()
+        for event, username, slugs in _posts(events):
+            urls.update(_feed_urls(username, slugs))
+            if event.topic != 'post.deleted':
+                urls.add(_post_url(event.object_id))
+        urls.update(
+            _post_url(event.data['post_id']) for event in events
+            if event.topic.startswith('comment.')
+        )
+        warming.warm_later(sorted(urls))
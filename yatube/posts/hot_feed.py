@@ -0,0 +1,189 @@
+"""Кольцевой буфер самых свежих постов для первых страниц ленты.
+
+Каждый процесс держит в памяти N последних постов главной страницы и
+каждой группы вместе с уже подгруженными автором и группой. Буфер
+обновляется локально по сигналам save/delete модели Post после фиксации
+транзакции, а изменения из других процессов подтягиваются периодическим
+перечитыванием из БД.
+"""
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from . import archive
+from .models import ArchivedPost, Group, Post
+
+INDEX = 'index'
+
+
+class HotScope:
+    """Свежие посты одной ленты и общее число постов в ней."""
+
+    def __init__(self, posts, count, group=None):
+        self.posts = deque(posts, maxlen=settings.HOT_FEED_SIZE)
+        self.count = count
+        self.group = group
+        self.loaded_at = time.monotonic()
+
+    def is_fresh(self):
+        age = time.monotonic() - self.loaded_at
+        return (
+            age < settings.HOT_FEED_POLL_INTERVAL
+            and len(self.posts) >= min(self.count, settings.LIMIT)
+        )
+
+
+class HotFeed:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scopes = {}
+        self._group_ids = {}
+
+    def reset(self):
+        with self._lock:
+            self._scopes.clear()
+            self._group_ids.clear()
+
+    def index_page(self, request):
+        if not self._is_first_page(request):
+            return None
+        scope = self._get_scope(INDEX)
+        return self._page(scope)
+
+    def group_page(self, request, slug):
+        """Возвращает (group, page_obj) или None, если буфер не помог."""
+        if not self._is_first_page(request):
+            return None
+        group_id = self._group_ids.get(slug)
+        if group_id is None:
+            group = Group.objects.filter(slug=slug).first()
+            if group is None:
+                return None
+            group_id = group.pk
+            with self._lock:
+                self._group_ids[slug] = group_id
+        scope = self._get_scope(group_id)
+        if scope is None:
+            return None
+        return scope.group, self._page(scope)
+
+    def post_saved(self, post, created, using=None):
+        # Откатанная транзакция не должна попасть в буфер, а чужие
+        # запросы не должны видеть пост раньше, чем он появится в БД.
+        transaction.on_commit(
+            partial(self._post_saved, post, created), using=using
+        )
+
+    def post_deleted(self, post, using=None):
+        # После удаления Django обнуляет pk объекта: запоминаем его сразу.
+        transaction.on_commit(
+            partial(self._post_deleted, post.pk, post.group_id), using=using
+        )
+
+    def group_changed(self, group, using=None):
+        transaction.on_commit(
+            partial(self._group_changed, group.pk), using=using
+        )
+
+    def _post_saved(self, post, created):
+        keys = [INDEX, post.group_id]
+        with self._lock:
+            if not created:
+                # Пост мог сменить группу или текст: проще перечитать
+                # все ленты, в которых он лежит.
+                for key, scope in list(self._scopes.items()):
+                    if key in keys or self._contains(scope, post.pk):
+                        del self._scopes[key]
+                return
+            for key in keys:
+                scope = self._scopes.get(key)
+                if scope is not None:
+                    scope.posts.appendleft(post)
+                    scope.count += 1
+
+    def _post_deleted(self, pk, group_id):
+        with self._lock:
+            for key in (INDEX, group_id):
+                scope = self._scopes.get(key)
+                if scope is None:
+                    continue
+                # Удалённым мог оказаться объект из самого буфера: к
+                # колбэку его pk уже обнулён.
+                scope.posts = deque(
+                    (
+                        item for item in scope.posts
+                        if item.pk not in (pk, None)
+                    ),
+                    maxlen=settings.HOT_FEED_SIZE
+                )
+                scope.count = max(scope.count - 1, 0)
+
+    def _group_changed(self, group_id):
+        with self._lock:
+            self._scopes.pop(group_id, None)
+            self._group_ids = {
+                slug: pk for slug, pk in self._group_ids.items()
+                if pk != group_id
+            }
+
+    def _get_scope(self, key):
+        with self._lock:
+            scope = self._scopes.get(key)
+        if scope is not None and scope.is_fresh():
+            return scope
+        scope = self._load(key)
+        with self._lock:
+            if scope is None:
+                self._scopes.pop(key, None)
+            else:
+                self._scopes[key] = scope
+        return scope
+
+    def _load(self, key):
+        posts = Post.objects.select_related('author', 'group')
+        archived = ArchivedPost.objects.all()
+        group = None
+        if key != INDEX:
+            group = Group.objects.filter(pk=key).first()
+            if group is None:
+                return None
+            posts = posts.filter(group=group)
+            archived = archived.filter(group=group)
+        # Архив идёт после свежих постов и входит в число страниц.
+        return HotScope(
+            posts[:settings.HOT_FEED_SIZE],
+            archive.count(posts, archived),
+            group
+        )
+
+    def _page(self, scope):
+        with self._lock:
+            posts = list(scope.posts)
+            count = scope.count
+        paginator = Paginator(posts, settings.LIMIT)
+        # Настоящее число постов, чтобы ссылки на следующие страницы
+        # строились так же, как при обычной пагинации.
+        paginator.count = count
+        return paginator.page(1)
+
+    @staticmethod
+    def _contains(scope, pk):
+        return any(item.pk == pk for item in scope.posts)
+
+    @staticmethod
+    def _is_first_page(request):
+        # Буфер читает посты из default и с шардами не работает.
+        return (
+            settings.HOT_FEED_ENABLED
+            and not settings.SHARD_DATABASES
+            and request.GET.get('page') in (None, '1')
+        )
+
+
+hot_feed = HotFeed()
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import archive, sharding
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты старше ARCHIVE_AFTER_DAYS дней вместе с '
+        'комментариями в архивные таблицы их базы, по --batch-size постов '
+        'за транзакцию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Возраст поста в днях, по умолчанию ARCHIVE_AFTER_DAYS.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+            help='Сколько постов переносить за одну транзакцию.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько постов уйдёт в архив.'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = archive.cutoff(options['days'])
+        moved = 0
+        for alias in sharding.databases():
+            posts = Post.objects.using(alias).filter(pub_date__lt=cutoff)
+            if options['dry_run']:
+                moved += posts.count()
+                continue
+            while True:
+                # Короткие транзакции не держат блокировку записи долго.
+                chunk = list(posts.order_by('pk')[:options['batch_size']])
+                if not chunk:
+                    break
+                archive.move(chunk, alias)
+                moved += len(chunk)
+        self.stdout.write(
+            f'Постов к переносу в архив: {moved}'
+            + (' (пробный запуск)' if options['dry_run'] else '')
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает потребителей outbox (OUTBOX_CONSUMERS) по всем базам. '
+        'Нужен при OUTBOX_DELIVERY = "external"; с --once обрабатывает '
+        'накопленные события и выходит.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--consumer', action='append', default=[],
+            help='Имя потребителя; можно указать несколько раз.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать накопленные события и выйти.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Пауза между опросами, по умолчанию OUTBOX_POLL_INTERVAL.'
+        )
+
+    def handle(self, *args, **options):
+        consumers = outbox.load_consumers()
+        if options['consumer']:
+            unknown = set(options['consumer']) - {
+                consumer.name for consumer in consumers
+            }
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные потребители: {", ".join(sorted(unknown))}'
+                )
+            consumers = [
+                consumer for consumer in consumers
+                if consumer.name in options['consumer']
+            ]
+        worker = outbox.Worker(consumers, options['interval'])
+        if options['once']:
+            processed = worker.run_pending()
+            self.stdout.write(f'Обработано событий: {processed}')
+            return
+        try:
+            worker.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import sharding
+from posts.models import (ArchivedComment, ArchivedPost, AuthorShard,
+                          Comment, Post)
+
+# Посты и комментарии к ним: свежие и архивные.
+TABLES = ((Post, Comment), (ArchivedPost, ArchivedComment))
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты авторов и комментарии к ним в шарды, которые '
+        'им назначает хэш-кольцо по текущему SHARD_DATABASES, и обновляет '
+        'таблицу маршрутизации. Посты из default, созданные до '
+        'шардирования, тоже переезжают, а из шардов, убранных из '
+        'SHARD_DATABASES, — если они указаны в --source.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько авторов и постов переедет.'
+        )
+        parser.add_argument(
+            '--source', action='append', default=[],
+            help=(
+                'Шард, убранный из SHARD_DATABASES, чьи посты тоже нужно '
+                'перенести; можно указать несколько раз.'
+            )
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Сколько постов переносить за одну транзакцию.'
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('SHARD_DATABASES пуст.')
+        unknown = set(options['source']) - set(settings.DATABASES)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные базы: {", ".join(sorted(unknown))}'
+            )
+        sources = sharding.databases() + [
+            alias for alias in options['source']
+            if alias not in sharding.databases()
+        ]
+        ring = sharding.ring()
+        moved_authors = moved_posts = 0
+        for source in sources:
+            author_ids = set()
+            for post_model, _ in TABLES:
+                author_ids.update(
+                    post_model.objects.using(source)
+                    .values_list('author_id', flat=True)
+                    .distinct()
+                )
+            for author_id in sorted(author_ids):
+                target = ring.node_for(author_id)
+                if target == source:
+                    continue
+                moved_authors += 1
+                if options['dry_run']:
+                    moved_posts += sum(
+                        post_model.objects.using(source)
+                        .filter(author_id=author_id).count()
+                        for post_model, _ in TABLES
+                    )
+                    continue
+                moved_posts += self.move(
+                    author_id, source, target, options['chunk_size']
+                )
+        if not options['dry_run']:
+            self.update_routes(ring, sources)
+        self.stdout.write(
+            f'Авторов к переносу: {moved_authors}, постов: {moved_posts}'
+            + (' (пробный запуск)' if options['dry_run'] else '')
+        )
+
+    def move(self, author_id, source, target, chunk_size):
+        """Копирует посты автора в target и только потом удаляет их.
+
+        Пока посты переезжают, автор отмечен в таблице маршрутизации, и
+        запись в его посты и комментарии к ним не принимается
+        (sharding.AuthorMoving): правка скопированной строки пропала бы
+        при удалении. Отметка снимается и после сбоя.
+        """
+        routes = AuthorShard.objects.filter(author_id=author_id)
+        if not routes.update(moving=True):
+            AuthorShard.objects.create(
+                author_id=author_id, shard=source, moving=True
+            )
+        try:
+            return self.copy_and_delete(
+                author_id, source, target, chunk_size
+            )
+        finally:
+            routes.update(moving=False)
+
+    def copy_and_delete(self, author_id, source, target, chunk_size):
+        moved = 0
+        for post_model, comment_model in TABLES:
+            posts = post_model.objects.using(source).filter(
+                author_id=author_id
+            )
+            while True:
+                chunk = list(posts.order_by('pk')[:chunk_size])
+                if not chunk:
+                    break
+                post_ids = [post.pk for post in chunk]
+                comments = list(
+                    comment_model.objects.using(source)
+                    .filter(post_id__in=post_ids)
+                )
+                # Повторный запуск после сбоя найдёт копии уже в target.
+                with transaction.atomic(using=target):
+                    sharding.copy_rows(target, chunk)
+                    sharding.copy_rows(target, comments)
+                AuthorShard.objects.filter(author_id=author_id).update(
+                    shard=target
+                )
+                cache.delete(sharding.AUTHOR_KEY.format(author_id))
+                with transaction.atomic(using=source):
+                    sharding.delete_rows(
+                        source, comment_model, 'post_id', post_ids
+                    )
+                    sharding.delete_rows(source, post_model, 'id', post_ids)
+                cache.delete_many(
+                    [sharding.POST_KEY.format(pk) for pk in post_ids]
+                )
+                moved += len(chunk)
+        return moved
+
+    def update_routes(self, ring, sources):
+        """Маршруты на шарды, убранные из SHARD_DATABASES.
+
+        Из просмотренных шардов (sources) посты авторов уже переехали в
+        move(), там остаются маршруты авторов без постов. Маршруты на
+        остальные убранные шарды не трогаем: посты ещё лежат там.
+        """
+        stale = AuthorShard.objects.exclude(
+            shard__in=settings.SHARD_DATABASES
+        )
+        for route in stale.filter(shard__in=sources).iterator():
+            route.shard = ring.node_for(route.author_id)
+            route.save(update_fields=['shard'])
+            cache.delete(sharding.AUTHOR_KEY.format(route.author_id))
+        skipped = sorted(
+            stale.exclude(shard__in=sources)
+            .values_list('shard', flat=True).distinct()
+        )
+        if skipped:
+            self.stderr.write(
+                'Маршруты на убранные шарды оставлены, передайте их в '
+                f'--source: {", ".join(skipped)}'
+            )
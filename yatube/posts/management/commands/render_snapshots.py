@@ -0,0 +1,69 @@
+import os
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Сохраняет гостевые версии страниц в SNAPSHOT_ROOT. '
+        'По умолчанию перерисовывает только страницы, затронутые постами '
+        'и комментариями после прошлого запуска; правки и удаления '
+        'постов убирают снимки сразу, а заново их создаёт --all.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перерисовать все страницы.'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1,
+            help='Сколько первых страниц пагинации сохранять.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов для рендера.'
+        )
+
+    def handle(self, *args, **options):
+        state_path = os.path.join(settings.SNAPSHOT_ROOT, snapshots.STATE_FILE)
+        started = timezone.now()
+        since = None
+        if not options['all'] and os.path.exists(state_path):
+            with open(state_path) as file:
+                since = parse_datetime(file.read().strip())
+        if since is None:
+            urls = snapshots.all_urls(options['pages'])
+        else:
+            urls = snapshots.touched_urls(since, options['pages'])
+
+        rendered = failed = 0
+        for url, status in self.render(urls, options['workers']):
+            if status == 200:
+                rendered += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{url}: {status}')
+
+        os.makedirs(settings.SNAPSHOT_ROOT, exist_ok=True)
+        with open(state_path, 'w') as file:
+            file.write(started.isoformat())
+        self.stdout.write(
+            self.style.SUCCESS(f'Сохранено страниц: {rendered}')
+            + (f', ошибок: {failed}' if failed else '')
+        )
+
+    def render(self, urls, workers):
+        if workers <= 1:
+            yield from map(snapshots.render_snapshot, urls)
+            return
+        with Pool(workers, snapshots.init_worker) as pool:
+            yield from pool.imap_unordered(
+                snapshots.render_snapshot, urls, chunksize=16
+            )
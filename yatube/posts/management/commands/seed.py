@@ -0,0 +1,299 @@
+import itertools
+import os
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts import sharding
+from posts.models import Comment, Follow, Group, Post, User
+
+WORDS = (
+    'дом лес река город утро вечер книга письмо дорога поезд море ветер '
+    'солнце дождь снег зима лето друг работа музыка кофе окно сад мост '
+    'идея вопрос ответ история встреча путь небо поле свет тень'
+).split()
+IMAGE_DIR = 'posts/seed'
+TEXT_POOL_SIZE = 10000
+
+
+def pareto_weights(rng, count, alpha):
+    """Накопленные веса со степенным хвостом для rng.choices()."""
+    return list(itertools.accumulate(
+        rng.paretovariate(alpha) for _ in range(count)
+    ))
+
+
+def random_text(rng, low, high):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high))).capitalize()
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками. Посты по авторам и подписки по '
+        'авторам распределены по степенному закону; при одном --seed '
+        'данные совпадают, даты отсчитываются от начала текущих суток.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Размер пула картинок, 0 — посты без картинок.'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.1,
+            help='Доля постов с картинкой.'
+        )
+        parser.add_argument(
+            '--group-ratio', type=float, default=0.7,
+            help='Доля постов в группах.'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.16,
+            help='Параметр распределения Парето; 1.16 даёт «80/20».'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросаны даты.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс имён пользователей и slug групп.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help='Строк в одной транзакции.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        if sharding.enabled():
+            # Вставка пишет посты и комментарии в default подряд идущими pk,
+            # мимо маршрутизации по шардам и выдачи id (posts.sharding).
+            raise CommandError(
+                'Заполнение работает только без шардирования: заполните базу '
+                'с пустым SHARD_DATABASES, затем перенесите посты командой '
+                'rebalance_shards.'
+            )
+        if options['posts'] > 0 and options['users'] <= 0:
+            raise CommandError('У постов нет авторов: задайте --users.')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix}_ уже есть, '
+                'задайте другой --prefix.'
+            )
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            # Данные можно пересоздать, поэтому fsync на каждый коммит
+            # не нужен: это ускоряет вставку в несколько раз.
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+
+        users = self.seed_users()
+        groups = self.seed_groups()
+        images = self.seed_images()
+        posts = self.seed_posts(users, groups, images)
+        self.seed_comments(users, posts)
+        self.seed_follows(users)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def log(self, message):
+        if self.options['verbosity'] > 0:
+            self.stdout.write(message)
+
+    def random_date(self):
+        seconds = self.rng.random() * self.options['days'] * 86400
+        return self.now - timedelta(seconds=seconds)
+
+    def insert(self, model, rows, total, fields=None):
+        """Пишет строки кусками, каждый кусок в своей транзакции.
+
+        Без fields rows — объекты модели для bulk_create. С fields —
+        кортежи значений для executemany: для постов и комментариев
+        сборка SQL в bulk_create дороже самой вставки. Возвращает
+        диапазон pk новых строк: SQLite и PostgreSQL выдают их подряд,
+        пока в таблицу пишет только эта команда.
+        """
+        start = self.last_pk(model)
+        if fields is not None:
+            sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+                connection.ops.quote_name(model._meta.db_table),
+                ', '.join(
+                    connection.ops.quote_name(
+                        model._meta.get_field(name).column
+                    )
+                    for name in fields
+                ),
+                ', '.join(['%s'] * len(fields)),
+            )
+        written = 0
+        for chunk in chunked(rows, self.options['chunk_size']):
+            with transaction.atomic():
+                if fields is None:
+                    model.objects.bulk_create(chunk)
+                else:
+                    with connection.cursor() as cursor:
+                        cursor.executemany(sql, chunk)
+            written += len(chunk)
+            self.log(f'{model._meta.verbose_name_plural}: {written}/{total}')
+        end = self.last_pk(model)
+        if end - start != written:
+            raise CommandError(
+                f'В {model._meta.db_table} писал кто-то ещё, '
+                'pk новых строк идут не подряд.'
+            )
+        return range(start + 1, end + 1)
+
+    @staticmethod
+    def last_pk(model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+    def seed_users(self):
+        count = self.options['users']
+        prefix = self.options['prefix']
+        # Хэш пароля дорогой, поэтому он один на всех: пароль — имя префикса.
+        password = make_password(prefix)
+        users = (
+            User(
+                username=f'{prefix}_{number}',
+                first_name=random_text(self.rng, 1, 1),
+                password=password,
+                date_joined=self.now,
+            )
+            for number in range(count)
+        )
+        return self.insert(User, users, count)
+
+    def seed_groups(self):
+        count = self.options['groups']
+        prefix = self.options['prefix']
+        groups = (
+            Group(
+                title=random_text(self.rng, 1, 3),
+                slug=f'{prefix}-{number}'[:20],
+                description=random_text(self.rng, 5, 20),
+            )
+            for number in range(count)
+        )
+        return self.insert(Group, groups, count)
+
+    def seed_images(self):
+        names = []
+        directory = os.path.join(settings.MEDIA_ROOT, IMAGE_DIR)
+        os.makedirs(directory, exist_ok=True)
+        for number in range(self.options['images']):
+            name = f'{IMAGE_DIR}/{self.options["prefix"]}_{number}.png'
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            Image.new('RGB', (640, 480), color).save(
+                os.path.join(settings.MEDIA_ROOT, name)
+            )
+            names.append(name)
+        return names
+
+    def seed_posts(self, users, groups, images):
+        count = self.options['posts']
+        rng = self.rng
+        author_weights = pareto_weights(rng, len(users), self.options['alpha'])
+        group_weights = pareto_weights(
+            rng, len(groups), self.options['alpha']
+        )
+        texts = self.text_pool(5, 60)
+        adapt_date = connection.ops.adapt_datetimefield_value
+
+        def posts():
+            for _ in range(count):
+                group_id = None
+                if groups and rng.random() < self.options['group_ratio']:
+                    group_id = rng.choices(
+                        groups, cum_weights=group_weights
+                    )[0]
+                image = ''
+                if images and rng.random() < self.options['image_ratio']:
+                    image = rng.choice(images)
+                yield (
+                    rng.choice(texts),
+                    adapt_date(self.random_date()),
+                    rng.choices(users, cum_weights=author_weights)[0],
+                    group_id,
+                    image,
+                )
+
+        return self.insert(
+            Post, posts(), count,
+            fields=('text', 'pub_date', 'author', 'group', 'image'),
+        )
+
+    def seed_comments(self, users, posts):
+        count = self.options['comments'] if posts else 0
+        rng = self.rng
+        texts = self.text_pool(2, 20)
+        adapt_date = connection.ops.adapt_datetimefield_value
+        # Комментируют в основном «популярные» посты. Веса на каждый пост
+        # при миллионах постов заняли бы много памяти, поэтому номер поста
+        # берётся как u ** 3: плотность убывает степенно, x ** (-2/3).
+        comments = (
+            (
+                posts[int(len(posts) * rng.random() ** 3)],
+                rng.choice(users),
+                rng.choice(texts)[:150],
+                adapt_date(self.random_date()),
+            )
+            for _ in range(count)
+        )
+        self.insert(
+            Comment, comments, count,
+            fields=('post', 'author', 'text', 'created'),
+        )
+
+    def text_pool(self, low, high):
+        # Готовый набор текстов: собирать каждый заново в разы дольше.
+        return [
+            random_text(self.rng, low, high) for _ in range(TEXT_POOL_SIZE)
+        ]
+
+    def seed_follows(self, users):
+        rng = self.rng
+        # Больше пар без повторов и подписок на себя всё равно не собрать.
+        count = min(self.options['follows'], len(users) * (len(users) - 1))
+        author_weights = pareto_weights(rng, len(users), self.options['alpha'])
+        reader_weights = pareto_weights(rng, len(users), self.options['alpha'])
+        pairs = set()
+        while len(pairs) < count:
+            user_id = rng.choices(users, cum_weights=reader_weights)[0]
+            author_id = rng.choices(users, cum_weights=author_weights)[0]
+            if user_id == author_id or (user_id, author_id) in pairs:
+                author_id = rng.choice(users)
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        follows = (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in sorted(pairs)
+        )
+        self.insert(Follow, follows, count)
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import warming
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэши после деплоя: запрашивает как гость самые частые '
+        'адреса из журналов запросов (строки core.perf или nginx combined).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'logs', nargs='+', help='Файлы журналов запросов.'
+        )
+        parser.add_argument(
+            '--top', type=int, default=settings.WARM_TOP_URLS,
+            help='Сколько самых частых адресов прогреть.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.WARM_CONCURRENCY,
+            help='Сколько запросов выполнять одновременно.'
+        )
+        parser.add_argument(
+            '--base-url', default=settings.WARM_BASE_URL,
+            help=(
+                'Адрес сайта; без него страницы рендерятся в этом процессе, '
+                'что годится только для общего бэкенда кэша.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if not options['base_url'] and not warming.shared_cache():
+            # Кэш этого процесса пропадёт вместе с ним.
+            raise CommandError(
+                'Кэш не общий между процессами: укажите --base-url '
+                'или WARM_BASE_URL.'
+            )
+        counter = warming.visits(self.lines(options['logs']))
+        urls = [url for url, _ in counter.most_common(options['top'])]
+        results = warming.warm(
+            urls, concurrency=options['concurrency'],
+            base_url=options['base_url']
+        )
+        failed = [(url, status) for url, status in results if status != 200]
+        for url, status in failed:
+            self.stderr.write(f'{url}: {status}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Прогрето страниц: {len(results) - len(failed)}'
+            )
+            + (f', ошибок: {len(failed)}' if failed else '')
+        )
+
+    @staticmethod
+    def lines(paths):
+        for path in paths:
+            with open(path, errors='replace') as file:
+                yield from file
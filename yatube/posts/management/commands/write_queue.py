@@ -0,0 +1,47 @@
+import os
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.write_queue import Server, Writer
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает писателя постов, комментариев и подписок на '
+        'WRITE_QUEUE_SOCKET. Один процесс на хост; веб-воркеры ходят '
+        'к нему при WRITE_QUEUE_ENABLED.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket', default=settings.WRITE_QUEUE_SOCKET,
+            help='Путь к Unix-сокету.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.WRITE_QUEUE_BATCH_SIZE,
+            help='Сколько операций фиксировать одной транзакцией.'
+        )
+        parser.add_argument(
+            '--batch-wait', type=float,
+            default=settings.WRITE_QUEUE_BATCH_WAIT,
+            help='Сколько секунд ждать, пока пачка наберётся.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['socket']
+        # Сокет от упавшего писателя мешает bind.
+        if os.path.exists(path):
+            os.remove(path)
+        writer = Writer(options['batch_size'], options['batch_wait'])
+        server = Server(path, writer)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.stdout.write(f'Писатель слушает {path}')
+        try:
+            writer.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            os.remove(path)
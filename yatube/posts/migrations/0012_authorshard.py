@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author_id', models.IntegerField(unique=True, verbose_name='Автор')),
+                ('shard', models.CharField(max_length=100, verbose_name='Шард')),
+            ],
+        ),
+    ]
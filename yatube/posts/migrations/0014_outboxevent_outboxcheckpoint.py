@@ -0,0 +1,36 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_archivedpost_archivedcomment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=50, verbose_name='Тема')),
+                ('object_id', models.BigIntegerField(verbose_name='Объект')),
+                ('payload', models.TextField(default='{}', verbose_name='Данные')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата события')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OutboxCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=100, verbose_name='Потребитель')),
+                ('database', models.CharField(max_length=100, verbose_name='База')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Событие')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'unique_together': {('consumer', 'database')},
+            },
+        ),
+    ]
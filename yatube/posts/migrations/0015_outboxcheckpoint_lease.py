@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_outboxevent_outboxcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxcheckpoint',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Занята до'),
+        ),
+        migrations.AddField(
+            model_name='outboxcheckpoint',
+            name='owner',
+            field=models.CharField(blank=True, max_length=32, verbose_name='Занята процессом'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -78,3 +80,83 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+
+class AuthorShard(models.Model):
+    """Таблица маршрутизации posts.sharding: шард постов автора."""
+    author_id = models.IntegerField('Автор', unique=True)
+    shard = models.CharField('Шард', max_length=100)
+    # Посты переносит rebalance_shards: запись в них запрещена.
+    moving = models.BooleanField('Переезжает', default=False)
+
+
+class ArchivedPost(models.Model):
+    """Пост, перенесённый в архив (posts.archive); id сохраняется."""
+    text = models.TextField('Текст поста')
+    pub_date = models.DateTimeField('Дата публикации')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор'
+    )
+    group = models.ForeignKey(
+        'Group',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='archived_posts',
+        verbose_name='Группа'
+    )
+    image = models.ImageField(
+        'Картинка',
+        upload_to='posts/',
+        blank=True
+    )
+    archived = models.DateTimeField('Дата архивации', auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.text[:15]
+
+    class Meta:
+        ordering = ['-pub_date']
+
+
+class ArchivedComment(models.Model):
+    post = models.ForeignKey(
+        'ArchivedPost',
+        on_delete=models.CASCADE,
+        related_name='comments'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments'
+    )
+    text = models.TextField(max_length=150)
+    created = models.DateTimeField('Дата публикации')
+
+
+class OutboxEvent(models.Model):
+    """Изменение поста, комментария или подписки для posts.outbox."""
+    topic = models.CharField('Тема', max_length=50)
+    object_id = models.BigIntegerField('Объект')
+    payload = models.TextField('Данные', default='{}')
+    created = models.DateTimeField('Дата события', auto_now_add=True)
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
+
+
+class OutboxCheckpoint(models.Model):
+    """Последнее обработанное потребителем событие outbox одной базы."""
+    consumer = models.CharField('Потребитель', max_length=100)
+    database = models.CharField('База', max_length=100)
+    position = models.BigIntegerField('Событие', default=0)
+    owner = models.CharField('Занята процессом', max_length=32, blank=True)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    updated = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        unique_together = ('consumer', 'database')
@@ -0,0 +1,332 @@
+"""Transactional outbox для постов, комментариев и подписок.
+
+Сигналы моделей (posts.signals) пишут событие OutboxEvent в ту же базу и
+в той же транзакции, что и само изменение: событие есть тогда и только
+тогда, когда изменение зафиксировано. Работу, производную от записи, —
+сброс валидаторов кэша, удаление устаревших снимков — делают
+потребители из OUTBOX_CONSUMERS (posts.consumers).
+
+Потребитель читает события каждой базы по возрастанию id пачками по
+OUTBOX_BATCH_SIZE и после обработки сдвигает свою контрольную точку
+OutboxCheckpoint в default. Пачку берёт тот процесс, который занял
+контрольную точку на OUTBOX_LEASE_SECONDS секунд, поэтому потребителей
+одной базы может быть запущено сколько угодно. Упавшая пачка
+повторяется с удваивающейся паузой, затем разбирается по одному
+событию, и событие, которое так и не удалось обработать, пропускается с
+записью в лог. Доставка «хотя бы один раз»: после сбоя процесса занятая
+им пачка придёт снова, когда истечёт срок, поэтому потребители
+идемпотентны.
+
+Кто запускает потребителей, задаёт OUTBOX_DELIVERY:
+inline — после фиксации транзакции, в том же запросе, без пауз между
+повторами;
+thread — поток процесса, который будит фиксация транзакции;
+external — только отдельный процесс manage.py consume_outbox.
+В любом режиме прочитанные всеми события раз в PRUNE_INTERVAL удаляются.
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, router, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.metrics import LATENCY_BUCKETS, registry
+
+from . import sharding
+from .models import OutboxCheckpoint, OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Как часто фоновый потребитель удаляет прочитанные события, в секундах.
+PRUNE_INTERVAL = 3600
+
+
+class Consumer:
+    """Потребитель событий: name, topics (None — все темы) и handle()."""
+    name = None
+    topics = None
+    batch_size = None
+
+    def wants(self, event):
+        return self.topics is None or event.topic in self.topics
+
+    def handle(self, events):
+        """Обрабатывает пачку событий; исключение — повторить пачку."""
+        raise NotImplementedError
+
+
+def load_consumers():
+    return [import_string(path)() for path in settings.OUTBOX_CONSUMERS]
+
+
+def atomic(instance):
+    """Транзакция в базе, куда запишется instance вместе с событием.
+
+    Без точки сохранения: внутри чужой транзакции ошибка записи и так
+    отменяет её целиком.
+    """
+    return transaction.atomic(
+        using=router.db_for_write(type(instance), instance=instance),
+        savepoint=False
+    )
+
+
+def record(topic, instance, using, **data):
+    """Пишет событие об изменении instance в базу using."""
+    event = OutboxEvent.objects.using(using).create(
+        topic=topic, object_id=instance.pk, payload=json.dumps(data)
+    )
+    if settings.OUTBOX_DELIVERY == 'inline':
+        # До фиксации потребители увидели бы незаписанное изменение.
+        deliver_on_commit(using)
+    elif settings.OUTBOX_DELIVERY == 'thread':
+        transaction.on_commit(lambda: worker().wake(), using=using)
+    return event
+
+
+def deliver(consumer, events, retries=None):
+    """Передаёт события потребителю, повторяя упавшие."""
+    if retries is None:
+        retries = settings.OUTBOX_RETRIES
+    for attempt in range(retries + 1):
+        if attempt:
+            registry.inc('yatube_outbox_retries_total', consumer=consumer.name)
+            time.sleep(settings.OUTBOX_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            consumer.handle(events)
+            return
+        except Exception:
+            logger.warning(
+                'Потребитель %s не обработал события %s-%s', consumer.name,
+                events[0].pk, events[-1].pk, exc_info=True
+            )
+    if len(events) > 1:
+        # Одно плохое событие не должно задерживать соседние.
+        for event in events:
+            deliver(consumer, [event], retries)
+        return
+    registry.inc('yatube_outbox_skipped_total', consumer=consumer.name)
+    logger.error(
+        'Потребитель %s пропустил событие %s', consumer.name, events[0].pk
+    )
+
+
+def claim(consumers, alias):
+    """Занимает свободные контрольные точки потребителей в базе alias.
+
+    Возвращает метку владельца и {имя потребителя: позиция} для занятых.
+    """
+    checkpoints = OutboxCheckpoint.objects.using(DEFAULT_DB_ALIAS)
+    names = [consumer.name for consumer in consumers]
+    existing = set(
+        checkpoints.filter(database=alias, consumer__in=names)
+        .values_list('consumer', flat=True)
+    )
+    if len(existing) < len(names):
+        checkpoints.bulk_create([
+            OutboxCheckpoint(consumer=name, database=alias)
+            for name in names if name not in existing
+        ], ignore_conflicts=True)
+    owner = uuid.uuid4().hex
+    now = timezone.now()
+    checkpoints.filter(database=alias, consumer__in=names).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+    ).update(
+        owner=owner,
+        locked_until=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    )
+    return owner, dict(
+        checkpoints.filter(database=alias, owner=owner)
+        .values_list('consumer', 'position')
+    )
+
+
+def run_once(consumers, alias, retries=None):
+    """Передаёт потребителям следующую пачку базы alias.
+
+    Возвращает, сколько событий прочитано всеми потребителями вместе.
+    Потребителей, чью точку занял другой процесс, пропускает: каждое
+    событие обрабатывается одним процессом, сколько бы их ни было.
+    """
+    owner, positions = claim(consumers, alias)
+    if not positions:
+        return 0
+    consumers = [
+        consumer for consumer in consumers if consumer.name in positions
+    ]
+    read = 0
+    try:
+        # Одна выборка на всех: обычно их точки совпадают.
+        events = list(
+            OutboxEvent.objects.using(alias)
+            .filter(pk__gt=min(positions.values()))
+            .order_by('pk')[:max(
+                consumer.batch_size or settings.OUTBOX_BATCH_SIZE
+                for consumer in consumers
+            )]
+        )
+        for consumer in consumers:
+            batch = [
+                event for event in events
+                if event.pk > positions[consumer.name]
+            ][:consumer.batch_size or settings.OUTBOX_BATCH_SIZE]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            wanted = [event for event in batch if consumer.wants(event)]
+            if wanted:
+                deliver(consumer, wanted, retries)
+            positions[consumer.name] = batch[-1].pk
+            read += len(batch)
+            registry.inc(
+                'yatube_outbox_events_total', len(wanted),
+                consumer=consumer.name
+            )
+            registry.observe(
+                'yatube_outbox_batch_seconds', time.perf_counter() - started,
+                LATENCY_BUCKETS, consumer=consumer.name
+            )
+    finally:
+        # Точку, которую после истёкшего срока занял другой процесс, не
+        # трогаем.
+        for name, position in positions.items():
+            OutboxCheckpoint.objects.using(DEFAULT_DB_ALIAS).filter(
+                database=alias, consumer=name, owner=owner
+            ).update(
+                position=position, owner='', locked_until=None,
+                updated=timezone.now()
+            )
+    return read
+
+
+def prune(alias):
+    """Удаляет события, прочитанные всеми потребителями и устаревшие."""
+    names = [consumer.name for consumer in load_consumers()]
+    positions = list(
+        OutboxCheckpoint.objects.using(DEFAULT_DB_ALIAS)
+        .filter(database=alias, consumer__in=names)
+        .values_list('position', flat=True)
+    )
+    if not names or len(positions) < len(names):
+        return 0
+    cutoff = timezone.now() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    deleted, _ = OutboxEvent.objects.using(alias).filter(
+        pk__lte=min(positions), created__lt=cutoff
+    ).delete()
+    return deleted
+
+
+class Worker:
+    """Прогоняет потребителей по всем базам, пока есть события.
+
+    Без consumers список OUTBOX_CONSUMERS читается при каждом прогоне.
+    """
+
+    def __init__(self, consumers=None, interval=None, retries=None):
+        if interval is None:
+            interval = settings.OUTBOX_POLL_INTERVAL
+        self.consumers = consumers
+        self.interval = interval
+        self.retries = retries
+        self.pruned_at = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def run_pending(self, aliases=None):
+        consumers = self.consumers
+        if consumers is None:
+            consumers = load_consumers()
+        processed = 0
+        while True:
+            read = sum(
+                run_once(consumers, alias, self.retries)
+                for alias in aliases or sharding.databases()
+            )
+            if not read:
+                self.prune()
+                return processed
+            processed += read
+
+    def prune(self):
+        if time.monotonic() - self.pruned_at < PRUNE_INTERVAL:
+            return
+        self.pruned_at = time.monotonic()
+        for alias in sharding.databases():
+            prune(alias)
+
+    def serve_forever(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.run_pending()
+            except DatabaseError:
+                logger.exception('Outbox недоступен')
+            self._wake.wait(self.interval)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def worker():
+    """Фоновый потребитель процесса; поток стартует при первом событии."""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = Worker()
+            threading.Thread(
+                target=_worker.serve_forever, name='outbox', daemon=True
+            ).start()
+    return _worker
+
+
+_inline_worker = None
+
+
+def inline_worker():
+    """Потребитель для OUTBOX_DELIVERY = 'inline': работает в запросе.
+
+    Повторов с паузами нет, чтобы не задерживать ответ: упавшее событие
+    сразу пропускается с записью в лог.
+    """
+    global _inline_worker
+    with _worker_lock:
+        if _inline_worker is None:
+            _inline_worker = Worker(retries=0)
+    return _inline_worker
+
+
+_inline_callbacks = {}
+
+
+def _deliver_inline(alias):
+    inline_worker().run_pending([alias])
+
+
+def deliver_on_commit(alias):
+    """Один прогон inline-потребителей после фиксации транзакции alias.
+
+    Сколько бы событий ни записала транзакция, колбэк на неё один: он и
+    так прочитает их все.
+    """
+    callback = _inline_callbacks.setdefault(
+        alias, partial(_deliver_inline, alias)
+    )
+    connection = transaction.get_connection(alias)
+    if all(func is not callback for _, func in connection.run_on_commit):
+        transaction.on_commit(callback, using=alias)
@@ -0,0 +1,427 @@
+"""Шардирование постов и комментариев по автору.
+
+При непустом SHARD_DATABASES посты лежат в базе-шарде своего автора, а
+комментарии — рядом со своим постом. Шард автора записан в таблице
+маршрутизации AuthorShard (в default); новых авторов распределяет
+консистентное хэш-кольцо, и при добавлении шарда переезжает лишь
+часть авторов — их переносит manage.py rebalance_shards. Архивные посты
+(posts.archive) лежат в той же базе, что и свежие, а события outbox
+(posts.outbox) — в той же, что и изменённая строка.
+
+Пользователи, группы, подписки и сама таблица маршрутизации остаются в
+default. Поэтому select_related на автора и группу в шардах заменяется
+отдельной выборкой из default, а общие ленты собираются слиянием
+отсортированных выборок каждого шарда. Идентификаторы новых постов и
+комментариев выдаются здесь же и уникальны между шардами.
+"""
+import bisect
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import prefetch_related_objects
+
+from .models import (ArchivedComment, ArchivedPost, AuthorShard, Comment,
+                     OutboxEvent, Post)
+
+SHARDED_MODELS = (Post, Comment, ArchivedPost, ArchivedComment, OutboxEvent)
+AUTHOR_KEY = 'shard:author:{}'
+POST_KEY = 'shard:post:{}'
+FEED_ORDERING = ('-pub_date', '-pk')
+# Начало отсчёта времени в идентификаторах: 2020-01-01 UTC.
+ID_EPOCH_MS = 1577836800000
+# Под номер узла в идентификаторе отведено 10 бит.
+MAX_NODE_ID = 0x3FF
+
+
+def enabled():
+    return bool(settings.SHARD_DATABASES)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Консистентное хэширование с виртуальными узлами."""
+
+    def __init__(self, nodes, vnodes):
+        points = sorted(
+            (_hash(f'{node}#{number}'), node)
+            for node in nodes for number in range(vnodes)
+        )
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self.hashes, _hash(str(key)))
+        return self.nodes[index % len(self.nodes)]
+
+
+@lru_cache(maxsize=8)
+def _ring(nodes, vnodes):
+    return HashRing(nodes, vnodes)
+
+
+def ring():
+    return _ring(
+        tuple(settings.SHARD_DATABASES), settings.SHARD_VIRTUAL_NODES
+    )
+
+
+def node_id():
+    """Номер узла для идентификаторов: 10 бит из SHARD_NODE_ID."""
+    node = settings.SHARD_NODE_ID
+    if not isinstance(node, int) or not 0 <= node <= MAX_NODE_ID:
+        raise ImproperlyConfigured(
+            f'SHARD_NODE_ID должен быть целым от 0 до {MAX_NODE_ID}, '
+            f'а не {node!r}'
+        )
+    return node
+
+
+class IdGenerator:
+    """64-битные id: миллисекунды, узел и счётчик внутри миллисекунды.
+
+    Растут со временем, поэтому порядок по pk совпадает с порядком
+    создания, как у автоинкремента. Узел — SHARD_NODE_ID, у каждого
+    пишущего процесса свой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def next(self):
+        with self._lock:
+            now = int(time.time() * 1000) - ID_EPOCH_MS
+            if now <= self._last_ms:
+                self._sequence = (self._sequence + 1) & 0xFFF
+                if self._sequence == 0:
+                    # 4096 id за миллисекунду: ждём следующую.
+                    while now <= self._last_ms:
+                        now = int(time.time() * 1000) - ID_EPOCH_MS
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << 22) | (node_id() << 12) | self._sequence
+
+
+ids = IdGenerator()
+
+
+def assign_id(instance):
+    """Обработчик pre_save: id нового поста или комментария."""
+    if enabled() and instance.pk is None:
+        instance.pk = ids.next()
+
+
+class AuthorMoving(Exception):
+    """Посты автора переносит rebalance_shards: запись не принята."""
+
+
+def shard_for_author(author_id, record=False):
+    """Шард автора по таблице маршрутизации или по кольцу.
+
+    С record=True так выбирают шард для записи: маршрут читается из
+    таблицы, а не из кэша процесса, который после ребаланса ещё помнил
+    бы старый шард. Новый автор записывается в таблицу, чтобы следующий
+    ребаланс знал, где лежат его посты, а для переезжающего бросается
+    AuthorMoving.
+    """
+    key = AUTHOR_KEY.format(author_id)
+    alias = None if record else cache.get(key)
+    if alias is not None:
+        return alias
+    route = (
+        AuthorShard.objects.filter(author_id=author_id)
+        .values_list('shard', 'moving')
+        .first()
+    )
+    if route is not None:
+        alias, moving = route
+        if moving and record:
+            raise AuthorMoving(f'Посты автора {author_id} переезжают.')
+    else:
+        alias = ring().node_for(author_id)
+        if not record:
+            return alias
+        alias = AuthorShard.objects.get_or_create(
+            author_id=author_id, defaults={'shard': alias}
+        )[0].shard
+    cache.set(key, alias, settings.SHARD_ROUTE_TIMEOUT)
+    return alias
+
+
+def check_not_moving(author_id):
+    """Бросает AuthorMoving, пока посты автора переезжают.
+
+    Отметку ставит процесс ребаланса, поэтому её не кэшируют: запись,
+    прошедшая между копированием поста и его удалением, пропала бы.
+    """
+    if author_id is None:
+        return
+    if AuthorShard.objects.filter(author_id=author_id, moving=True).exists():
+        raise AuthorMoving(f'Посты автора {author_id} переезжают.')
+
+
+def _post_author(instance):
+    """Автор поста, в который пишет instance; None вне постов."""
+    if isinstance(instance, Post):
+        return instance.author_id
+    if not isinstance(instance, Comment):
+        return None
+    if Comment.post.is_cached(instance):
+        return instance.post.author_id
+    alias = instance._state.db or locate_post(instance.post_id)
+    return (
+        Post.objects.using(alias).filter(pk=instance.post_id)
+        .values_list('author_id', flat=True)
+        .first()
+    )
+
+
+def databases():
+    """Где могут лежать посты: шарды и default с данными до шардирования."""
+    return [*settings.SHARD_DATABASES, DEFAULT_DB_ALIAS]
+
+
+def locate_post(post_id):
+    """База с постом, свежим или архивным, или None.
+
+    Без шардирования — всегда None.
+    """
+    if not enabled():
+        return None
+    key = POST_KEY.format(post_id)
+    alias = cache.get(key)
+    if alias is not None:
+        return alias
+    for alias in databases():
+        # Архивный пост лежит в той же базе, что и свежие: маршрут к нему
+        # запоминаем так же.
+        for model in (Post, ArchivedPost):
+            if model.objects.using(alias).filter(pk=post_id).exists():
+                cache.set(key, alias, settings.SHARD_ROUTE_TIMEOUT)
+                return alias
+    # Отсутствие не запоминаем: пост мог быть ещё не зафиксирован в
+    # своём шарде или переезжать, и ссылка на него не должна давать 404.
+    return None
+
+
+def copy_rows(alias, objects):
+    """Вставляет объекты в базу alias как есть.
+
+    bulk_create заново проставил бы даты auto_now_add, а переехавший пост
+    должен сохранить свою. Строки, скопированные при прошлом запуске,
+    пропускаются.
+    """
+    if not objects:
+        return
+    model = type(objects[0])
+    fields = model._meta.concrete_fields
+    size = max(connections[alias].ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), size):
+        model._base_manager._insert(
+            objects[start:start + size], fields=fields, raw=True,
+            using=alias, ignore_conflicts=True
+        )
+
+
+def delete_rows(alias, model, column, values):
+    # Без QuerySet.delete(): пост не удаляется, а переезжает, и сигналы
+    # удаления сбросили бы кэши и снимки впустую.
+    table = model._meta.db_table
+    placeholders = ', '.join(['%s'] * len(values))
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {column} IN ({placeholders})', values
+        )
+
+
+def _split(queryset):
+    """Запрос без select_related и список связей для отдельной выборки."""
+    related = []
+    pending = [('', queryset.query.select_related)]
+    while pending:
+        prefix, fields = pending.pop()
+        if not isinstance(fields, dict):
+            continue
+        for name, nested in fields.items():
+            related.append(prefix + name)
+            pending.append((f'{prefix}{name}__', nested))
+    return queryset.select_related(None), related
+
+
+def local(queryset, alias):
+    """Выборка из одной базы со связями из default."""
+    if not enabled():
+        return queryset
+    queryset, related = _split(queryset)
+    objects = list(queryset.using(alias))
+    prefetch_related_objects(objects, *related)
+    return objects
+
+
+def get_post(queryset, post_id):
+    """Пост по id из той базы, где он лежит."""
+    if not enabled():
+        return queryset.get(pk=post_id)
+    alias = locate_post(post_id)
+    if alias is None:
+        raise Post.DoesNotExist('Пост не найден ни в одном шарде.')
+    queryset, related = _split(queryset)
+    try:
+        post = queryset.using(alias).get(pk=post_id)
+    except Post.DoesNotExist:
+        # Пост переехал при ребалансе, а маршрут в кэше старый. Маршрут
+        # к архивному посту верен.
+        archived = ArchivedPost.objects.using(alias).filter(pk=post_id)
+        if not archived.exists():
+            cache.delete(POST_KEY.format(post_id))
+        raise
+    prefetch_related_objects([post], *related)
+    return post
+
+
+class MergedFeed:
+    """Лента из нескольких шардов для Paginator.
+
+    Срез [start:stop] берёт из каждого шарда первые stop записей и
+    сливает их heapq.merge, так что глубокие страницы стоят k * stop
+    строк.
+    """
+
+    def __init__(self, querysets, related):
+        self.querysets = [
+            queryset.order_by(*FEED_ORDERING) for queryset in querysets
+        ]
+        self.related = related
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        parts = [
+            queryset if stop is None else queryset[:stop]
+            for queryset in self.querysets
+        ]
+        merged = heapq.merge(
+            *parts, key=lambda post: (post.pub_date, post.pk), reverse=True
+        )
+        objects = list(itertools.islice(merged, start, stop))
+        prefetch_related_objects(objects, *self.related)
+        return objects
+
+
+def feed(queryset, authors=None):
+    """Лента постов: без шардирования — сам запрос.
+
+    authors ограничивает ленту авторами (подписки, профиль); тогда
+    опрашиваются только их шарды.
+    """
+    if not enabled():
+        if authors is not None:
+            queryset = queryset.filter(author__in=authors)
+        return queryset
+    queryset, related = _split(queryset)
+    if authors is None:
+        return MergedFeed(
+            [queryset.using(alias) for alias in databases()], related
+        )
+    authors = list(authors)
+    by_shard = {}
+    for author_id in authors:
+        alias = shard_for_author(author_id)
+        by_shard.setdefault(alias, []).append(author_id)
+    # Посты до шардирования лежат в default, пока их не перенесут.
+    by_shard.setdefault(DEFAULT_DB_ALIAS, list(authors))
+    return MergedFeed(
+        [
+            queryset.using(alias).filter(author_id__in=author_ids)
+            for alias, author_ids in by_shard.items()
+        ],
+        related
+    )
+
+
+def disable_foreign_keys(sender, connection, **kwargs):
+    """Обработчик connection_created.
+
+    В шардах нет таблиц пользователей и групп, и SQLite отверг бы
+    ссылки на них. Целостность этих связей держит default.
+    """
+    if (
+        connection.vendor == 'sqlite'
+        and connection.alias in settings.SHARD_DATABASES
+    ):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+class ShardRouter:
+    """Посты и комментарии с архивом — в шарды, остальное — в default."""
+
+    def db_for_read(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get('instance')
+        db = instance._state.db if instance is not None else None
+        if model in SHARDED_MODELS:
+            return db if db in settings.SHARD_DATABASES else None
+        if db in settings.SHARD_DATABASES:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not enabled():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        # У нового объекта _state.db уже может быть выставлен по
+        # присвоенному автору, поэтому смотрим на adding.
+        if model in SHARDED_MODELS and not instance._state.adding:
+            # instance бывает и связанным объектом другой модели.
+            if isinstance(instance, model):
+                check_not_moving(_post_author(instance))
+            return instance._state.db
+        if model is Post:
+            return shard_for_author(instance.author_id, record=True)
+        if model is Comment:
+            check_not_moving(_post_author(instance))
+            if Comment.post.is_cached(instance):
+                return instance.post._state.db
+            return locate_post(instance.post_id)
+        if instance._state.db in settings.SHARD_DATABASES:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not enabled():
+            return None
+        allowed = set(databases())
+        if {obj1._state.db, obj2._state.db} <= allowed:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in settings.SHARD_DATABASES:
+            return None
+        return app_label == 'posts' and model_name in {
+            model._meta.model_name for model in SHARDED_MODELS
+        }
@@ -0,0 +1,82 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.routers import mark_write
+
+from . import conditions, outbox, sharding
+from .hot_feed import hot_feed
+from .models import Comment, Follow, Group, Post
+
+
+ACTIONS = {post_save: 'saved', post_delete: 'deleted'}
+
+
+def record(topic, instance, signal_kwargs, **data):
+    mark_write()
+    # Повтор сигнала после ответа писателя (posts.write_queue) событие не
+    # пишет: его уже записал сам писатель.
+    if not signal_kwargs.get('replayed'):
+        outbox.record(topic, instance, signal_kwargs['using'], **data)
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Запоминаем прежнюю группу: пост могли перенести в другую.
+    instance._previous_group_id = None
+    if instance.pk is not None:
+        instance._previous_group_id = (
+            Post.objects.using(instance._state.db).filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+    sharding.assign_id(instance)
+
+
+@receiver(pre_save, sender=Comment)
+def comment_saving(sender, instance, **kwargs):
+    sharding.assign_id(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    hot_feed.post_saved(instance, created, kwargs['using'])
+    previous = getattr(instance, '_previous_group_id', None)
+    record(
+        'post.saved', instance, kwargs, created=created,
+        author_id=instance.author_id, group_id=instance.group_id,
+        previous_group_id=previous if previous != instance.group_id else None
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    hot_feed.post_deleted(instance, kwargs['using'])
+    record(
+        'post.deleted', instance, kwargs,
+        author_id=instance.author_id, group_id=instance.group_id
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    hot_feed.group_changed(instance, kwargs['using'])
+    conditions.touch(f'group:{instance.slug}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, signal, **kwargs):
+    record(
+        f'comment.{ACTIONS[signal]}', instance, kwargs,
+        post_id=instance.post_id
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def follow_changed(sender, instance, signal, **kwargs):
+    record(
+        f'follow.{ACTIONS[signal]}', instance, kwargs,
+        user_id=instance.user_id, author_id=instance.author_id
+    )
@@ -0,0 +1,137 @@
+"""Статические снимки гостевых страниц.
+
+Снимок страницы /group/slug/ лежит в SNAPSHOT_ROOT/group/slug/index.html,
+а её страница N — в SNAPSHOT_ROOT/group/slug/page-N/index.html, поэтому
+nginx может отдавать их напрямую, если нет сессионной куки, например так:
+
+    map $arg_page $snapshot_page {
+        ~^([2-9]|[1-9][0-9]+)$ /page-$arg_page;
+        default '';
+    }
+    try_files /snapshots$uri$snapshot_page/index.html @django;
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.http import QueryDict
+from django.urls import reverse
+
+from core import guest
+
+from .models import Comment, Group, Post, User
+
+STATE_FILE = '.last_run'
+
+
+def snapshot_path(path, page=1):
+    """Файл снимка страницы page адреса path; None, если он вне корня.
+
+    Адрес приходит и из запроса (core.middleware), поэтому путь после
+    разрешения ссылок и «..» обязан остаться внутри SNAPSHOT_ROOT.
+    """
+    parts = [part for part in path.split('/') if part]
+    if page != 1:
+        parts.append(f'page-{page}')
+    root = os.path.realpath(settings.SNAPSHOT_ROOT)
+    result = os.path.join(root, *parts, 'index.html')
+    if os.path.commonpath([root, os.path.realpath(result)]) != root:
+        return None
+    return result
+
+
+def url_snapshot_path(url):
+    """Файл снимка для адреса из feed_urls() вида /path/?page=N."""
+    path, _, query = url.partition('?')
+    return snapshot_path(path, int(QueryDict(query).get('page', 1)))
+
+
+def feed_urls(url, count, pages):
+    urls = [url]
+    last_page = min(pages, max(1, -(-count // settings.LIMIT)))
+    urls += [f'{url}?page={number}' for number in range(2, last_page + 1)]
+    return urls
+
+
+def about_urls():
+    return [reverse('about:author'), reverse('about:tech')]
+
+
+def all_urls(pages):
+    urls = feed_urls(reverse('posts:index'), Post.objects.count(), pages)
+    for group in Group.objects.all():
+        url = reverse('posts:group_list', kwargs={'group': group.slug})
+        urls += feed_urls(url, group.posts.count(), pages)
+    authors = User.objects.filter(posts__isnull=False).distinct()
+    for author in authors:
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        urls += feed_urls(url, author.posts.count(), pages)
+    for pk in Post.objects.values_list('pk', flat=True).iterator():
+        urls.append(reverse('posts:post_detail', kwargs={'post_id': pk}))
+    return urls + about_urls()
+
+
+def touched_urls(since, pages):
+    """Страницы, затронутые постами и комментариями новее since."""
+    post_ids = set(
+        Post.objects.filter(pub_date__gt=since).values_list('pk', flat=True)
+    )
+    post_ids |= set(
+        Comment.objects.filter(created__gt=since)
+        .values_list('post_id', flat=True)
+    )
+    if not post_ids:
+        return []
+    posts = Post.objects.filter(pk__in=post_ids)
+    urls = feed_urls(reverse('posts:index'), Post.objects.count(), pages)
+    for group in Group.objects.filter(posts__in=posts).distinct():
+        url = reverse('posts:group_list', kwargs={'group': group.slug})
+        urls += feed_urls(url, group.posts.count(), pages)
+    for author in User.objects.filter(posts__in=posts).distinct():
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        urls += feed_urls(url, author.posts.count(), pages)
+    for pk in sorted(post_ids):
+        urls.append(reverse('posts:post_detail', kwargs={'post_id': pk}))
+    return urls
+
+
+def render_snapshot(url):
+    """Рендерит страницу как для гостя и сохраняет её на диск."""
+    response = guest.get(url, settings.SNAPSHOT_HOST)
+    if response.status_code != 200:
+        return url, response.status_code
+    path = url_snapshot_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(descriptor, 'wb') as file:
+        file.write(response.content)
+    os.chmod(temp_path, 0o644)
+    os.replace(temp_path, path)
+    return url, response.status_code
+
+
+def discard(urls):
+    """Удаляет снимки страниц вместе со всеми страницами пагинации."""
+    for url in urls:
+        path = url_snapshot_path(url)
+        if path is None:
+            continue
+        directory = os.path.dirname(path)
+        paths = [path]
+        if os.path.isdir(directory):
+            paths += [
+                os.path.join(directory, name, 'index.html')
+                for name in os.listdir(directory)
+                if name.startswith('page-')
+            ]
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def init_worker():
+    # Соединения родителя нельзя использовать после fork().
+    connections.close_all()
@@ -0,0 +1,23 @@
+"""Фоновые задачи posts (core.tasks)."""
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from core.tasks import task
+
+from . import warming
+
+# Миниатюра из шаблонов лент и страницы поста.
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+@task(queue='images')
+def make_thumbnail(image):
+    """Строит миниатюру заранее, чтобы её не ждал первый просмотр."""
+    get_thumbnail(image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS)
+
+
+@task(queue='warming')
+def warm_pages(urls):
+    """Прогревает первые WARM_PAGES страниц лент после записи."""
+    warming.warm(urls, settings.WARM_PAGES)
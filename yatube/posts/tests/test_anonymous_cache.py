@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Post, Group, User
+
+
+class AnonymousCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_anonymous')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test_slug',
+            description='Test description with many characters'
+        )
+        cls.post = Post.objects.create(
+            text='TEST POST!!!',
+            author=cls.user,
+            group=cls.group
+        )
+        cls.urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'group': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(AnonymousCacheTest.user)
+
+    def test_guest_pages_are_public(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('max-age=600', response['Cache-Control'])
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+                self.assertFalse(response.cookies)
+                self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_user_pages_are_private(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+
+    @override_settings(ANONYMOUS_CACHE_TIMEOUT=0)
+    def test_mode_can_be_disabled(self):
+        response = self.guest_client.get(self.urls[0])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_personal_parts(self):
+        url = reverse('posts:personal')
+        response = self.guest_client.get(url, {'part': 'nav'})
+        self.assertFalse(response.json()['authenticated'])
+        response = self.authorized_client.get(url, {
+            'part': ['nav', 'follow', 'comment_form'],
+            'username': self.user.username,
+            'post_id': self.post.pk,
+        })
+        parts = response.json()['parts']
+        self.assertIn(self.user.username, parts['nav'])
+        self.assertIn('Подписаться', parts['follow'])
+        self.assertIn('csrfmiddlewaretoken', parts['comment_form'])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_personal_parts_mark_active_links(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertContains(response, "params.set('view', 'posts:index')")
+        url = reverse('posts:personal')
+        cases = {
+            'posts:index': 'posts:index',
+            'posts:follow_index': 'posts:follow_index',
+            'about:tech': 'about:tech',
+        }
+        for view_name, active in cases.items():
+            with self.subTest(view=view_name):
+                response = self.authorized_client.get(
+                    url, {'part': ['nav', 'switcher'], 'view': view_name}
+                )
+                parts = response.json()['parts']
+                html = parts['nav'] + parts['switcher']
+                self.assertEqual(html.count('active'), 1)
+                self.assertRegex(
+                    html, rf'active[^>]*href="{reverse(active)}"'
+                )
@@ -0,0 +1,103 @@
+import os
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import (ArchivedComment, ArchivedPost, Comment, Group, Post,
+                          User)
+
+
+class ArchiveTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_archive')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test_slug',
+            description='Test description'
+        )
+        now = timezone.now()
+        # Пять старых постов и двенадцать свежих, от старых к новым.
+        for number in range(17):
+            post = Post.objects.create(
+                text=f'TEST POST {number}',
+                author=cls.user,
+                group=cls.group
+            )
+            if number < 5:
+                age = timedelta(days=400 - number)
+            else:
+                age = timedelta(minutes=17 - number)
+            Post.objects.filter(pk=post.pk).update(pub_date=now - age)
+        cls.old_post = Post.objects.get(text='TEST POST 0')
+        Comment.objects.create(
+            post=cls.old_post, author=cls.user, text='OLD COMMENT'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        call_command('archive_posts', stdout=open(os.devnull, 'w'))
+
+    def test_old_posts_moved_with_comments(self):
+        self.assertEqual(Post.objects.count(), 12)
+        self.assertEqual(
+            list(ArchivedPost.objects.values_list('text', flat=True)),
+            [f'TEST POST {number}' for number in range(4, -1, -1)]
+        )
+        archived = ArchivedPost.objects.get(pk=self.old_post.pk)
+        self.assertEqual(archived.pub_date, self.old_post.pub_date)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(ArchivedComment.objects.get().post, archived)
+
+    def test_archived_post_detail(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.old_post.pk,))
+        )
+        self.assertContains(response, 'TEST POST 0')
+        self.assertContains(response, 'OLD COMMENT')
+        self.assertNotContains(response, 'Добавить комментарий')
+        self.assertEqual(response.context['user_posts'], 17)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.old_post.pk + 100,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_feeds_continue_into_archive(self):
+        expected = [f'TEST POST {number}' for number in range(16, -1, -1)]
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=('test_slug',)),
+            reverse('posts:profile', args=('test_archive',)),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                first = self.client.get(url).context['page_obj']
+                second = self.client.get(f'{url}?page=2').context['page_obj']
+                texts = [post.text for post in [*first, *second]]
+                self.assertEqual(texts, expected)
+                self.assertEqual(first.paginator.count, 17)
+
+    def test_first_page_does_not_read_archive(self):
+        url = reverse('posts:group_list', args=('test_slug',))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        # Число постов считается вместе с архивом, но сами архивные
+        # посты первой странице не нужны.
+        column = f'"{ArchivedPost._meta.db_table}"."text"'
+        self.assertFalse(
+            [query for query in queries if column in query['sql']]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{url}?page=2')
+        self.assertTrue(
+            [query for query in queries if column in query['sql']]
+        )
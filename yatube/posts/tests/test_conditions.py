@@ -0,0 +1,129 @@
+from http import HTTPStatus
+from django.core.cache import cache, caches
+from django.test import Client, TestCase
+from django.urls import reverse
+from core.testing import on_commit_callbacks
+from posts import conditions
+from posts.models import Post, Group, User, Comment, Follow
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_conditions')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test_slug',
+            description='Test description with many characters'
+        )
+        cls.post = Post.objects.create(
+            text='TEST POST!!!',
+            author=cls.author,
+            group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches['conditions'].clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(ConditionalGetTest.user)
+
+    def revalidate(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_not_modified(self):
+        urls = {
+            reverse('posts:index'): self.guest_client,
+            reverse(
+                'posts:group_list', kwargs={'group': self.group.slug}
+            ): self.guest_client,
+            reverse(
+                'posts:profile', kwargs={'username': self.author.username}
+            ): self.authorized_client,
+            reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}
+            ): self.guest_client,
+            reverse('posts:follow_index'): self.authorized_client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                response = self.revalidate(client, url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_last_modified_sent(self):
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.guest_client.get(
+            reverse('posts:index'),
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_changes_invalidate_validators(self):
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        profile = reverse(
+            'posts:profile', kwargs={'username': self.author.username}
+        )
+        changes = {
+            detail: lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='TEST COMMENT'
+            ),
+            reverse('posts:index'): lambda: Post.objects.filter(
+                pk=self.post.pk
+            ).first().save(),
+            profile: lambda: Follow.objects.create(
+                user=self.user, author=self.author
+            ),
+        }
+        for url, change in changes.items():
+            with self.subTest(url=url):
+                etag = self.authorized_client.get(url)['ETag']
+                with on_commit_callbacks():
+                    change()
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_validators_depend_on_user(self):
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_post_edit_changes_rebuilt_validator(self):
+        # Запись в кэше пропала, а подмены валидатора никто не сделал
+        # (например, consume_outbox ещё не дошёл до события).
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        Post.objects.filter(pk=self.post.pk).update(text='EDITED')
+        caches['conditions'].clear()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_edit_moves_last_modified(self):
+        url = reverse('posts:index')
+        last_modified = self.guest_client.get(url)['Last-Modified']
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'EDITED'
+        with on_commit_callbacks():
+            post.save()
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_validators_shared_between_processes(self):
+        # Другой процесс видит тот же кэш, а не свою копию в памяти.
+        conditions.touch('index')
+        record = caches['conditions'].get(conditions._key('index'))
+        caches['conditions'].close()
+        self.assertEqual(conditions._record('index'), record)
+        self.assertNotIn('LocMemCache', type(caches['conditions']).__name__)
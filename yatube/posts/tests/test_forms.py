@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.core.cache import cache
@@ -132,3 +133,22 @@ class PostImgTest(TestCase):
                 image='posts/small.gif'
             ).exists()
         )
+
+    def test_thumbnail_built_lazily_without_task_queue(self):
+        uploaded = SimpleUploadedFile(
+            name='lazy.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\xff'
+                b'\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02'
+                b'\x00\x3b'
+            ),
+            content_type='image/gif'
+        )
+        with override_settings(TASK_QUEUE_ENABLED=False), \
+                mock.patch('posts.tasks.get_thumbnail') as get_thumbnail:
+            self.authorized_client.post(
+                reverse('posts:create'),
+                data={'text': 'Lazy thumbnail', 'image': uploaded}
+            )
+        self.assertTrue(Post.objects.filter(image='posts/lazy.gif').exists())
+        get_thumbnail.assert_not_called()
@@ -0,0 +1,102 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.testing import on_commit_callbacks
+from posts.hot_feed import hot_feed
+from posts.models import Post, Group, User
+
+
+@override_settings(HOT_FEED_ENABLED=True, HOT_FEED_POLL_INTERVAL=60)
+class HotFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_hot_feed')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test_slug',
+            description='Test description with many characters'
+        )
+        for number in range(12):
+            Post.objects.create(
+                text=f'TEST POST {number}',
+                author=cls.user,
+                group=cls.group
+            )
+
+    def setUp(self):
+        with on_commit_callbacks():
+            # Посты из setUpClass уже в БД и попадут в буфер при загрузке.
+            pass
+        cache.clear()
+        hot_feed.reset()
+        self.guest_client = Client()
+
+    def get_first_page(self, url):
+        cache.clear()
+        return self.guest_client.get(url).context['page_obj']
+
+    def test_first_pages_served_without_queries(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'group': self.group.slug}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.get_first_page(url)
+                cache.clear()
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(url)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), 10)
+                self.assertEqual(page_obj.paginator.num_pages, 2)
+                self.assertEqual(page_obj[0].text, 'TEST POST 11')
+
+    def test_new_post_appears_on_first_page(self):
+        self.get_first_page(reverse('posts:index'))
+        with on_commit_callbacks():
+            post = Post.objects.create(
+                text='NEW POST',
+                author=self.user,
+                group=self.group
+            )
+        with self.assertNumQueries(0):
+            page_obj = self.get_first_page(reverse('posts:index'))
+        self.assertEqual(page_obj[0], post)
+        self.assertEqual(page_obj.paginator.count, 13)
+
+    def test_deleted_post_disappears_from_first_page(self):
+        url = reverse('posts:group_list', kwargs={'group': self.group.slug})
+        newest = self.get_first_page(url)[0]
+        with on_commit_callbacks():
+            newest.delete()
+        page_obj = self.get_first_page(url)
+        self.assertNotIn(newest, page_obj.object_list)
+        self.assertEqual(page_obj.paginator.count, 11)
+
+    def test_rolled_back_post_stays_out_of_buffer(self):
+        self.get_first_page(reverse('posts:index'))
+        with on_commit_callbacks():
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Post.objects.create(text='NEW POST', author=self.user)
+                    raise RuntimeError
+        with self.assertNumQueries(0):
+            page_obj = self.get_first_page(reverse('posts:index'))
+        self.assertEqual(page_obj[0].text, 'TEST POST 11')
+        self.assertEqual(page_obj.paginator.count, 12)
+
+    def test_buffer_changes_only_after_commit(self):
+        self.get_first_page(reverse('posts:index'))
+        with on_commit_callbacks():
+            Post.objects.create(text='NEW POST', author=self.user)
+            page_obj = self.get_first_page(reverse('posts:index'))
+            self.assertEqual(page_obj[0].text, 'TEST POST 11')
+        page_obj = self.get_first_page(reverse('posts:index'))
+        self.assertEqual(page_obj[0].text, 'NEW POST')
+
+    def test_other_pages_use_database(self):
+        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 2)
@@ -0,0 +1,163 @@
+import os
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from core.metrics import registry
+from core.testing import on_commit_callbacks
+from posts import conditions, outbox
+from posts.models import (Comment, Follow, Group, OutboxCheckpoint,
+                          OutboxEvent, Post, User)
+
+
+class RecordingConsumer(outbox.Consumer):
+    name = 'recording'
+    topics = ('post.saved', 'comment.saved')
+    batch_size = 2
+    handled = []
+
+    def handle(self, events):
+        self.handled.append([event.topic for event in events])
+
+
+class FailingConsumer(outbox.Consumer):
+    name = 'failing'
+    handled = []
+
+    def handle(self, events):
+        if any(event.topic == 'follow.saved' for event in events):
+            raise ValueError('poison')
+        self.handled.extend(event.topic for event in events)
+
+
+@override_settings(
+    OUTBOX_DELIVERY='external',
+    OUTBOX_RETRY_DELAY=0,
+    OUTBOX_CONSUMERS=['posts.tests.test_outbox.RecordingConsumer'],
+)
+class OutboxTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_outbox')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test'
+        )
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        RecordingConsumer.handled = []
+        FailingConsumer.handled = []
+
+    def test_events_written_with_changes(self):
+        post = Post.objects.create(
+            text='TEST POST', author=self.author, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.user, text='Hi')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.filter(user=self.user).delete()
+        post.group = None
+        post.save()
+        events = list(OutboxEvent.objects.order_by('pk'))
+        self.assertEqual(
+            [event.topic for event in events],
+            ['post.saved', 'comment.saved', 'follow.saved',
+             'follow.deleted', 'post.saved']
+        )
+        self.assertEqual(events[0].object_id, post.pk)
+        self.assertEqual(events[0].data, {
+            'created': True, 'author_id': self.author.pk,
+            'group_id': self.group.pk, 'previous_group_id': None,
+        })
+        self.assertEqual(events[3].data['user_id'], self.user.pk)
+        self.assertEqual(events[4].data['previous_group_id'], self.group.pk)
+
+    def test_event_rolled_back_with_change(self):
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                Post.objects.create(text='ROLLED BACK', author=self.author)
+                raise ValueError
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_consumer_reads_batches_from_checkpoint(self):
+        post = Post.objects.create(text='TEST POST', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Comment.objects.create(post=post, author=self.user, text='Hi')
+        consumers = [RecordingConsumer()]
+        self.assertEqual(outbox.run_once(consumers, 'default'), 2)
+        self.assertEqual(outbox.run_once(consumers, 'default'), 1)
+        self.assertEqual(outbox.run_once(consumers, 'default'), 0)
+        self.assertEqual(
+            RecordingConsumer.handled, [['post.saved'], ['comment.saved']]
+        )
+        checkpoint = OutboxCheckpoint.objects.get(consumer='recording')
+        self.assertEqual(
+            checkpoint.position, OutboxEvent.objects.latest('pk').pk
+        )
+
+    def test_busy_checkpoint_skipped_until_lease_expires(self):
+        Post.objects.create(text='TEST POST', author=self.author)
+        consumers = [RecordingConsumer()]
+        OutboxCheckpoint.objects.create(
+            consumer='recording', database='default', owner='other',
+            locked_until=timezone.now() + timedelta(minutes=1)
+        )
+        self.assertEqual(outbox.run_once(consumers, 'default'), 0)
+        OutboxCheckpoint.objects.update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(outbox.run_once(consumers, 'default'), 1)
+        self.assertEqual(RecordingConsumer.handled, [['post.saved']])
+        checkpoint = OutboxCheckpoint.objects.get()
+        self.assertEqual(checkpoint.owner, '')
+        self.assertIsNone(checkpoint.locked_until)
+
+    @override_settings(OUTBOX_DELIVERY='inline')
+    def test_inline_delivery_after_commit(self):
+        with on_commit_callbacks():
+            Post.objects.create(text='TEST POST', author=self.author)
+            Comment.objects.create(
+                post=Post.objects.get(), author=self.user, text='Hi'
+            )
+            self.assertEqual(RecordingConsumer.handled, [])
+        self.assertEqual(
+            RecordingConsumer.handled, [['post.saved', 'comment.saved']]
+        )
+        self.assertEqual(
+            OutboxCheckpoint.objects.get(consumer='recording').position,
+            OutboxEvent.objects.latest('pk').pk
+        )
+
+    @override_settings(OUTBOX_RETRIES=1)
+    def test_poison_event_skipped_after_retries(self):
+        Post.objects.create(text='TEST POST', author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.filter(user=self.user).delete()
+        with self.assertLogs('posts.outbox', 'WARNING'):
+            outbox.run_once([FailingConsumer()], 'default')
+        self.assertEqual(
+            FailingConsumer.handled, ['post.saved', 'follow.deleted']
+        )
+        counters = registry.snapshot()['counters']
+        self.assertIn(
+            ['yatube_outbox_skipped_total', {'consumer': 'failing'}, 1],
+            counters
+        )
+
+    @override_settings(
+        OUTBOX_CONSUMERS=['posts.consumers.ConditionsConsumer']
+    )
+    def test_command_moves_work_out_of_request(self):
+        etag = conditions._record('profile:test_author')['etag']
+        Post.objects.create(text='TEST POST', author=self.author)
+        self.assertEqual(
+            conditions._record('profile:test_author')['etag'], etag
+        )
+        call_command('consume_outbox', '--once', stdout=open(os.devnull, 'w'))
+        self.assertNotEqual(
+            conditions._record('profile:test_author')['etag'], etag
+        )
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+from posts.models import Post, Group, User, Comment, Follow
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def seed(self, **options):
+        options = {
+            'users': 30, 'groups': 4, 'posts': 500, 'comments': 200,
+            'follows': 100, 'images': 2, 'chunk_size': 128,
+            'verbosity': 0, **options,
+        }
+        call_command('seed', stdout=StringIO(), **options)
+
+    def test_counts(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 4)
+        self.assertEqual(Post.objects.count(), 500)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 100)
+        self.assertFalse(
+            Follow.objects.filter(user=F('author')).exists()
+        )
+        self.assertTrue(Post.objects.exclude(image='').exists())
+
+    def test_skewed_authors(self):
+        self.seed()
+        per_author = sorted(
+            User.objects.annotate(count=Count('posts'))
+            .values_list('count', flat=True),
+            reverse=True
+        )
+        self.assertGreater(per_author[0], 3 * per_author[15])
+
+    def test_reproducible(self):
+        def snapshot(prefix):
+            return list(
+                Post.objects.filter(author__username__startswith=prefix)
+                .order_by('pk')
+                .values_list('text', 'pub_date', 'author__username')
+            )
+
+        self.seed(prefix='first', seed=7)
+        self.seed(prefix='second', seed=7)
+        first, second = snapshot('first_'), snapshot('second_')
+        self.assertEqual(
+            [(text, date, name[6:]) for text, date, name in first],
+            [(text, date, name[7:]) for text, date, name in second]
+        )
+
+    def test_prefix_taken(self):
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_posts_need_users(self):
+        with self.assertRaisesMessage(CommandError, '--users'):
+            self.seed(users=0)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(SHARD_DATABASES=['shard1'])
+    def test_refuses_sharded_database(self):
+        with self.assertRaisesMessage(CommandError, 'rebalance_shards'):
+            self.seed()
+        self.assertFalse(User.objects.exists())
@@ -0,0 +1,334 @@
+import os
+import shutil
+import tempfile
+from collections import Counter
+from io import StringIO
+from datetime import datetime, timezone
+from unittest import mock
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from posts import sharding
+from posts.models import (ArchivedComment, ArchivedPost, AuthorShard, Comment,
+                          Follow, Group, Post, User)
+
+SHARDS = ['shard1', 'shard2', 'shard3']
+LEGACY_DATE = datetime(2020, 5, 1, tzinfo=timezone.utc)
+
+
+class HashRingTest(SimpleTestCase):
+    def test_keys_spread_over_nodes(self):
+        ring = sharding.HashRing(['a', 'b', 'c'], 64)
+        counts = Counter(ring.node_for(key) for key in range(3000))
+        self.assertEqual(set(counts), {'a', 'b', 'c'})
+        self.assertGreater(min(counts.values()), 700)
+
+    def test_new_node_moves_only_its_share(self):
+        before = sharding.HashRing(['a', 'b'], 64)
+        after = sharding.HashRing(['a', 'b', 'c'], 64)
+        moved = [
+            key for key in range(3000)
+            if before.node_for(key) != after.node_for(key)
+        ]
+        self.assertTrue(all(after.node_for(key) == 'c' for key in moved))
+        self.assertLess(len(moved), 1500)
+
+    def test_ids_unique_and_growing(self):
+        generated = [sharding.ids.next() for _ in range(10000)]
+        self.assertEqual(generated, sorted(set(generated)))
+
+    def test_node_id_from_settings(self):
+        with self.settings(SHARD_NODE_ID=5):
+            self.assertEqual(sharding.ids.next() >> 12 & 0x3FF, 5)
+        for node in (-1, 1024, '5'):
+            with self.subTest(node=node), self.settings(SHARD_NODE_ID=node):
+                with self.assertRaises(ImproperlyConfigured):
+                    sharding.ids.next()
+
+
+class ShardedTestCase(TransactionTestCase):
+    """Тест с шардами в отдельных файлах SQLite."""
+    databases = {'default', *SHARDS}
+    shards = SHARDS[:2]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+            }
+            connections.ensure_defaults(alias)
+            connections.prepare_test_settings(alias)
+        # Все шарды известны роутеру до конца класса: иначе migrate
+        # создал бы в них лишние таблицы, а flush после теста наткнулся
+        # бы на внешние ключи.
+        cls.all_shards = override_settings(SHARD_DATABASES=SHARDS)
+        cls.all_shards.enable()
+        for alias in SHARDS:
+            call_command('migrate', database=alias, verbosity=0)
+            # migrate включает внешние ключи обратно; новое соединение
+            # их снова выключит (sharding.disable_foreign_keys).
+            connections[alias].close()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.all_shards.disable()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.shard_settings = self.settings(SHARD_DATABASES=self.shards)
+        self.shard_settings.enable()
+        cache.clear()
+
+    def tearDown(self):
+        self.shard_settings.disable()
+        # Соединение с шардом, открытое, пока он не входил в
+        # SHARD_DATABASES, проверяет внешние ключи и помешает flush.
+        for alias in SHARDS:
+            connections[alias].close()
+
+    def shard_of(self, user):
+        return sharding.ring().node_for(user.pk)
+
+
+class ShardingTest(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test')
+        self.users = [
+            User.objects.create_user(username=f'test_user_{number}')
+            for number in range(6)
+        ]
+        self.client = Client()
+        self.client.force_login(self.users[0])
+
+    def create_posts(self):
+        posts = []
+        for number in range(12):
+            author = self.users[number % len(self.users)]
+            client = Client()
+            client.force_login(author)
+            client.post(
+                reverse('posts:create'),
+                {'text': f'TEST POST {number}', 'group': self.group.pk}
+            )
+            posts.append(Post.objects.using(self.shard_of(author)).get(
+                text=f'TEST POST {number}'
+            ))
+        return posts
+
+    def test_posts_and_comments_stored_in_author_shard(self):
+        self.assertEqual(
+            len({self.shard_of(user) for user in self.users}), 2
+        )
+        posts = self.create_posts()
+        self.assertFalse(Post.objects.using('default').exists())
+        for post in posts:
+            self.assertEqual(
+                AuthorShard.objects.get(author_id=post.author_id).shard,
+                post._state.db
+            )
+        post = posts[1]
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'TEST COMMENT'}
+        )
+        self.assertTrue(
+            Comment.objects.using(post._state.db).filter(
+                post_id=post.pk, author=self.users[0]
+            ).exists()
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(response, 'TEST COMMENT')
+        self.assertEqual(response.context['post'].author, post.author)
+        self.assertEqual(response.context['user_posts'], 2)
+
+    def test_feeds_merge_shards_in_date_order(self):
+        posts = self.create_posts()
+        newest_first = [post.text for post in reversed(posts)]
+        urls = {
+            reverse('posts:index'): newest_first,
+            reverse('posts:group_list', args=('test_slug',)): newest_first,
+            reverse('posts:profile', args=('test_user_1',)):
+                ['TEST POST 7', 'TEST POST 1'],
+        }
+        for url, expected in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                first = self.client.get(url).context['page_obj']
+                texts = [post.text for post in first]
+                for number in first.paginator.page_range[1:]:
+                    page = self.client.get(f'{url}?page={number}')
+                    texts += [post.text for post in page.context['page_obj']]
+                self.assertEqual(texts, expected)
+                self.assertEqual(first.paginator.count, len(expected))
+
+    def test_missing_post_not_remembered(self):
+        author = self.users[0]
+        self.assertIsNone(sharding.locate_post(12345))
+        Post(pk=12345, text='LATE POST', author=author).save()
+        self.assertEqual(
+            sharding.locate_post(12345), self.shard_of(author)
+        )
+
+    def test_follow_feed_reads_only_followed_authors(self):
+        self.create_posts()
+        for author in self.users[1:3]:
+            Follow.objects.create(user=self.users[0], author=author)
+        response = self.client.get(reverse('posts:follow_index'))
+        authors = {post.author for post in response.context['page_obj']}
+        self.assertEqual(authors, set(self.users[1:3]))
+        self.assertEqual(len(response.context['page_obj']), 4)
+
+
+class RebalanceTest(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.users = [
+            User.objects.create_user(username=f'test_user_{number}')
+            for number in range(20)
+        ]
+        # Посты, созданные до шардирования, лежат в default.
+        for user in self.users:
+            post = Post(text=f'LEGACY {user.username}', author=user)
+            post.save(using='default')
+            Comment.objects.using('default').create(
+                post=post, author=user, text='LEGACY COMMENT'
+            )
+        Post.objects.using('default').update(pub_date=LEGACY_DATE)
+        Comment.objects.using('default').update(created=LEGACY_DATE)
+
+    def test_rebalance_moves_posts_to_new_shards(self):
+        call_command('rebalance_shards', stdout=open(os.devnull, 'w'))
+        self.assertFalse(Post.objects.using('default').exists())
+        for user in self.users:
+            shard = self.shard_of(user)
+            self.assertTrue(
+                Post.objects.using(shard).filter(author=user).exists()
+            )
+            self.assertEqual(
+                Comment.objects.using(shard).filter(author=user).count(), 1
+            )
+
+    def test_rebalance_moves_archive(self):
+        devnull = open(os.devnull, 'w')
+        call_command('archive_posts', days=0, stdout=devnull)
+        call_command('rebalance_shards', stdout=devnull)
+        self.assertFalse(ArchivedPost.objects.using('default').exists())
+        user = self.users[0]
+        shard = self.shard_of(user)
+        post = ArchivedPost.objects.using(shard).get(author=user)
+        self.assertEqual(
+            ArchivedComment.objects.using(shard).get(author=user).post_id,
+            post.pk
+        )
+        client = Client()
+        client.force_login(user)
+        response = client.get(reverse('posts:post_detail', args=(post.pk,)))
+        self.assertContains(response, 'LEGACY COMMENT')
+        response = client.get(reverse('posts:profile', args=(user.username,)))
+        self.assertEqual(
+            [item.pk for item in response.context['page_obj']], [post.pk]
+        )
+
+    def test_author_writes_rejected_while_moving(self):
+        user = self.users[0]
+        post = Post.objects.using('default').get(author=user)
+        client = Client()
+        client.force_login(user)
+        url = reverse('posts:post_edit', args=(post.pk,))
+        statuses = []
+        copy_rows = sharding.copy_rows
+
+        def copy_and_edit(alias, objects):
+            copy_rows(alias, objects)
+            if objects and objects[0] == post:
+                response = client.post(url, {'text': 'EDITED'})
+                statuses.append(response.status_code)
+
+        with mock.patch('posts.sharding.copy_rows', copy_and_edit):
+            call_command('rebalance_shards', stdout=StringIO())
+        self.assertEqual(statuses, [503])
+        self.assertFalse(AuthorShard.objects.filter(moving=True).exists())
+        self.assertEqual(client.post(url, {'text': 'EDITED'}).status_code, 302)
+        self.assertEqual(
+            Post.objects.using(self.shard_of(user)).get(pk=post.pk).text,
+            'EDITED'
+        )
+
+    def test_new_post_ignores_cached_route(self):
+        call_command('rebalance_shards', stdout=StringIO())
+        user = self.users[0]
+        # Маршрут, запомненный процессом до ребаланса.
+        cache.set(sharding.AUTHOR_KEY.format(user.pk), 'default')
+        client = Client()
+        client.force_login(user)
+        client.post(reverse('posts:create'), {'text': 'AFTER REBALANCE'})
+        self.assertTrue(
+            Post.objects.using(self.shard_of(user))
+            .filter(text='AFTER REBALANCE').exists()
+        )
+
+    def test_removed_shard_moved_only_as_source(self):
+        call_command('rebalance_shards', stdout=StringIO())
+        on_shard2 = set(
+            AuthorShard.objects.filter(shard='shard2')
+            .values_list('author_id', flat=True)
+        )
+        self.assertTrue(on_shard2)
+        with self.settings(SHARD_DATABASES=['shard1']):
+            errors = StringIO()
+            call_command('rebalance_shards', stdout=StringIO(), stderr=errors)
+            self.assertIn('shard2', errors.getvalue())
+            self.assertEqual(
+                set(AuthorShard.objects.filter(shard='shard2')
+                    .values_list('author_id', flat=True)),
+                on_shard2
+            )
+            call_command(
+                'rebalance_shards', '--source=shard2', stdout=StringIO()
+            )
+            self.assertFalse(Post.objects.using('shard2').exists())
+            self.assertEqual(Post.objects.using('shard1').count(), 20)
+            self.assertEqual(
+                set(AuthorShard.objects.values_list('shard', flat=True)),
+                {'shard1'}
+            )
+
+    def test_rebalance_keeps_dates(self):
+        call_command('rebalance_shards', stdout=open(os.devnull, 'w'))
+        for alias in self.shards:
+            for model, field in ((Post, 'pub_date'), (Comment, 'created')):
+                dates = model.objects.using(alias).values_list(
+                    field, flat=True
+                )
+                self.assertEqual(set(dates), {LEGACY_DATE})
+        with self.settings(SHARD_DATABASES=SHARDS):
+            expected = Counter(self.shard_of(user) for user in self.users)
+            call_command('rebalance_shards', stdout=open(os.devnull, 'w'))
+            counts = Counter({
+                alias: Post.objects.using(alias).count() for alias in SHARDS
+            })
+            self.assertEqual(counts, expected)
+            self.assertGreater(counts['shard3'], 0)
+            for route in AuthorShard.objects.all():
+                self.assertEqual(
+                    route.shard, sharding.ring().node_for(route.author_id)
+                )
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.testing import on_commit_callbacks
+from posts import snapshots
+from posts.models import Post, Group, User, Comment
+
+TEMP_SNAPSHOT_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(SNAPSHOT_ROOT=TEMP_SNAPSHOT_ROOT)
+class SnapshotsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_snapshots')
+        cls.group = Group.objects.create(
+            title='Test title',
+            slug='test_slug',
+            description='Test description with many characters'
+        )
+        cls.post = Post.objects.create(
+            text='TEST POST!!!',
+            author=cls.user,
+            group=cls.group
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_SNAPSHOT_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_render_snapshot(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        snapshots.render_snapshot(url)
+        with open(snapshots.snapshot_path(url), encoding='utf-8') as file:
+            content = file.read()
+        self.assertIn(self.post.text, content)
+        self.assertNotIn('csrfmiddlewaretoken', content)
+
+    def test_all_urls(self):
+        urls = snapshots.all_urls(pages=1)
+        expected = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'group': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('about:author'),
+            reverse('about:tech'),
+        ]
+        self.assertEqual(urls, expected)
+
+    def test_touched_urls(self):
+        since = timezone.now()
+        self.assertEqual(snapshots.touched_urls(since, pages=1), [])
+        Comment.objects.create(post=self.post, author=self.user, text='Hi')
+        urls = snapshots.touched_urls(since - timedelta(seconds=1), pages=1)
+        self.assertIn(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            urls
+        )
+
+    def test_deleted_post_snapshot_discarded(self):
+        post = Post.objects.create(text='TO DELETE', author=self.user)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        snapshots.render_snapshot(url)
+        with on_commit_callbacks():
+            post.delete()
+        self.assertFalse(os.path.exists(snapshots.snapshot_path(url)))
+
+    def test_deleted_comment_discards_post_snapshot(self):
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='TO DELETE'
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        snapshots.render_snapshot(url)
+        with on_commit_callbacks():
+            comment.delete()
+        self.assertFalse(os.path.exists(snapshots.snapshot_path(url)))
+
+    def test_command_writes_state(self):
+        call_command('render_snapshots', '--workers=1', stdout=StringIO())
+        state = os.path.join(TEMP_SNAPSHOT_ROOT, snapshots.STATE_FILE)
+        self.assertTrue(os.path.exists(state))
+        url = reverse('posts:group_list', kwargs={'group': self.group.slug})
+        self.assertTrue(os.path.exists(snapshots.snapshot_path(url)))
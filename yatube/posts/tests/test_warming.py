@@ -0,0 +1,123 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from core.testing import on_commit_callbacks
+from posts import conditions, warming
+from posts.models import Comment, Group, Post, User
+
+
+class WarmingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_warm')
+        cls.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test'
+        )
+        cls.post = Post.objects.create(
+            text='TEST POST', author=cls.user, group=cls.group
+        )
+        Post.objects.bulk_create(
+            Post(text=f'POST {number}', author=cls.user)
+            for number in range(11)
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches['conditions'].clear()
+
+    def test_feed_warmed_up_to_last_page(self):
+        index = reverse('posts:index')
+        self.assertEqual(
+            warming.warm([index], pages=5, concurrency=1),
+            [(index, 200), (f'{index}?page=2', 200)]
+        )
+        self.assertIsNotNone(
+            caches['conditions'].get(conditions._key('index'))
+        )
+
+    def test_visits_from_perf_and_nginx_logs(self):
+        lines = [
+            json.dumps({'method': 'GET', 'path': '/', 'status': 200}),
+            json.dumps({'method': 'POST', 'path': '/create/', 'status': 302}),
+            '127.0.0.1 - - [19/Oct/2026:10:00:00 +0000] '
+            '"GET /group/test_slug/ HTTP/1.1" 200 512 "-" "curl"',
+            '127.0.0.1 - - [19/Oct/2026:10:00:01 +0000] '
+            '"GET / HTTP/1.1" 200 512 "-" "curl"',
+            '127.0.0.1 - - [19/Oct/2026:10:00:02 +0000] '
+            '"GET /missing/ HTTP/1.1" 404 0 "-" "curl"',
+            'not a log line',
+        ]
+        self.assertEqual(
+            warming.visits(lines).most_common(),
+            [('/', 2), ('/group/test_slug/', 1)]
+        )
+
+    def write_log(self, paths):
+        with tempfile.NamedTemporaryFile('w', delete=False) as log:
+            for path in paths:
+                log.write(json.dumps(
+                    {'method': 'GET', 'path': path, 'status': 200}
+                ) + '\n')
+        self.addCleanup(os.remove, log.name)
+        return log.name
+
+    def test_command_warms_most_visited(self):
+        group = reverse('posts:group_list', args=('test_slug',))
+        log = self.write_log(['/', '/', group, '/about/author/'])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = StringIO()
+        with self.settings(CACHES={**settings.CACHES, 'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }}):
+            call_command(
+                'warm_cache', log, '--top=2', '--concurrency=1',
+                stdout=output
+            )
+            self.assertIsNotNone(
+                caches['conditions'].get(conditions._key('group:test_slug'))
+            )
+        self.assertIn('Прогрето страниц: 2', output.getvalue())
+
+    def test_command_refuses_process_local_cache(self):
+        with self.assertRaisesMessage(CommandError, '--base-url'):
+            call_command('warm_cache', self.write_log(['/']))
+
+    @override_settings(WARM_AFTER_WRITE=True)
+    def test_write_warms_affected_pages(self):
+        # События setUpTestData уже не интересны.
+        call_command('consume_outbox', '--once', stdout=StringIO())
+        with mock.patch('posts.consumers.warming.warm_later') as warm_later:
+            with on_commit_callbacks():
+                Comment.objects.create(
+                    post=self.post, author=self.user, text='Hi'
+                )
+            with on_commit_callbacks():
+                self.post.text = 'EDITED'
+                self.post.save()
+        self.assertEqual(warm_later.call_args_list, [
+            mock.call([reverse('posts:post_detail', args=(self.post.pk,))]),
+            mock.call(sorted([
+                reverse('posts:index'),
+                reverse('posts:group_list', args=('test_slug',)),
+                reverse('posts:post_detail', args=(self.post.pk,)),
+                reverse('posts:profile', args=('test_warm',)),
+            ])),
+        ])
+
+    def test_background_warming_waits_for_commit(self):
+        with mock.patch('posts.warming._submit') as submit:
+            with on_commit_callbacks():
+                warming.warm_later(['/'])
+                submit.assert_not_called()
+        submit.assert_called_once_with(['/'])
@@ -0,0 +1,232 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from core.metrics import registry
+from posts.models import Comment, Follow, Group, OutboxEvent, Post, User
+from posts.write_queue import (Job, RequestHandler, Server, Writer,
+                               submit)
+
+
+class WriterBatchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_writer')
+
+    def test_failed_operation_does_not_cancel_batch(self):
+        batch = [
+            Job({'operation': 'create_post', 'params': {
+                'text': 'FIRST', 'author_id': self.user.pk,
+                'group_id': None, 'image': ''}}),
+            Job({'operation': 'create_comment', 'params': {
+                'text': 'NO POST', 'author_id': self.user.pk}}),
+            Job({'operation': 'drop_table', 'params': {}}),
+            Job({'operation': 'follow', 'params': {
+                'user_id': self.user.pk, 'author_id': self.user.pk}}),
+        ]
+        Writer(batch_size=10, batch_wait=0).run_batch(batch)
+        self.assertIn('result', batch[0].reply)
+        self.assertIn('error', batch[1].reply)
+        self.assertIn('error', batch[2].reply)
+        self.assertIn('result', batch[3].reply)
+        self.assertTrue(all(job.done.is_set() for job in batch))
+        self.assertTrue(Post.objects.filter(text='FIRST').exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_collect_groups_waiting_operations(self):
+        writer = Writer(batch_size=3, batch_wait=0)
+        for number in range(5):
+            writer.jobs.put(Job({'number': number}))
+        self.assertEqual(len(writer.collect()), 3)
+        self.assertEqual(len(writer.collect()), 2)
+
+    @override_settings(WRITE_QUEUE_ENABLED=True)
+    def test_signals_replayed_after_acknowledgement(self):
+        author = User.objects.create_user(username='test_author')
+        client = Client()
+        client.force_login(self.user)
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=Follow, weak=False)
+        try:
+            with mock.patch('posts.write_queue.submit',
+                            return_value={'pk': 1}) as submit:
+                client.get(
+                    reverse('posts:profile_follow', args=('test_author',))
+                )
+        finally:
+            post_save.disconnect(receiver, sender=Follow)
+        submit.assert_called_once_with(
+            'follow', user_id=self.user.pk, author_id=author.pk
+        )
+        self.assertTrue(receiver.call_args[1]['replayed'])
+        self.assertFalse(Follow.objects.exists())
+        # Событие outbox пишет писатель, а не повтор сигнала.
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    @override_settings(WRITE_QUEUE_ENABLED=True,
+                       WRITE_QUEUE_SOCKET='/nonexistent/writer.sock')
+    def test_unavailable_writer_falls_back_to_direct_write(self):
+        registry.reset()
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:create'), {'text': 'DIRECT'})
+        self.assertTrue(Post.objects.filter(text='DIRECT').exists())
+        counters = registry.snapshot()['counters']
+        self.assertIn(
+            ['yatube_write_queue_fallbacks_total', {}, 1], counters
+        )
+
+
+class WriteQueueServerTest(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'writer.sock')
+        self.writer = Writer(batch_size=10, batch_wait=0.01)
+        self.server = Server(self.path, self.writer)
+        self.threads = [
+            threading.Thread(target=self.server.serve_forever),
+            threading.Thread(target=self.writer.serve_forever),
+        ]
+        for thread in self.threads:
+            thread.start()
+        self.settings = override_settings(
+            WRITE_QUEUE_ENABLED=True, WRITE_QUEUE_SOCKET=self.path
+        )
+        self.settings.enable()
+        cache.clear()
+        self.author = User.objects.create_user(username='test_author')
+        self.user = User.objects.create_user(username='test_reader')
+        self.group = Group.objects.create(
+            title='Test title', slug='test_slug', description='Test')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.server.shutdown()
+        self.writer.stop()
+        for thread in self.threads:
+            thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_views_write_through_writer(self):
+        registry.reset()
+        self.client.post(
+            reverse('posts:create'),
+            {'text': 'QUEUED', 'group': self.group.pk}
+        )
+        post = Post.objects.get(text='QUEUED')
+        self.assertEqual(post.author, self.user)
+        self.assertEqual(post.group, self.group)
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'QUEUED COMMENT'}
+        )
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+        follow_url = reverse('posts:profile_follow', args=('test_author',))
+        self.client.get(follow_url)
+        self.client.get(follow_url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=('test_author',))
+        )
+        self.assertFalse(Follow.objects.exists())
+        counters = dict(
+            (name, value)
+            for name, _, value in registry.snapshot()['counters']
+        )
+        self.assertNotIn('yatube_write_queue_fallbacks_total', counters)
+
+    def test_foreign_key_error_retried_alone(self):
+        # Внешние ключи проверяются при COMMIT, поэтому только здесь,
+        # вне транзакции теста.
+        batch = [
+            Job({'operation': 'create_post', 'params': {
+                'text': 'KEPT', 'author_id': self.user.pk,
+                'group_id': None, 'image': ''}}),
+            Job({'operation': 'create_comment', 'params': {
+                'text': 'ORPHAN', 'author_id': self.user.pk,
+                'post_id': 10 ** 6}}),
+        ]
+        Writer(batch_size=10, batch_wait=0).run_batch(batch)
+        self.assertIn('result', batch[0].reply)
+        self.assertIn('IntegrityError', batch[1].reply['error'])
+        self.assertTrue(Post.objects.filter(text='KEPT').exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_concurrent_writes_are_batched(self):
+        registry.reset()
+
+        # Представления из потоков не годятся: общая база в памяти
+        # блокирует таблицы целиком, и чтения сессий падали бы.
+        def write():
+            submit(
+                'create_post', text='BATCHED', author_id=self.user.pk,
+                group_id=None, image=''
+            )
+
+        threads = [threading.Thread(target=write) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Post.objects.filter(text='BATCHED').count(), 8)
+        histograms = {
+            name: histogram
+            for name, _, histogram in registry.snapshot()['histograms']
+        }
+        batches = histograms['yatube_write_queue_batch_size']
+        self.assertEqual(batches['sum'], 8)
+        self.assertLess(batches['count'], 8)
+
+
+class SilentHandler(RequestHandler):
+    """Писатель, который выполняет операцию и обрывает связь без ответа."""
+
+    def handle(self):
+        self.server.writer.commit([Job(json.loads(self.rfile.readline()))])
+
+
+class SilentWriterTest(TransactionTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'writer.sock')
+        self.server = Server(self.path, Writer())
+        self.server.RequestHandlerClass = SilentHandler
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.user = User.objects.create_user(username='test_author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def test_committed_write_without_reply_is_not_repeated(self):
+        registry.reset()
+        with self.settings(WRITE_QUEUE_ENABLED=True,
+                           WRITE_QUEUE_SOCKET=self.path):
+            response = self.client.post(
+                reverse('posts:create'), {'text': 'ONCE'}
+            )
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.context['unknown'])
+        self.assertEqual(Post.objects.filter(text='ONCE').count(), 1)
+        counters = [name for name, _, _ in registry.snapshot()['counters']]
+        self.assertNotIn('yatube_write_queue_fallbacks_total', counters)
@@ -16,6 +16,7 @@ urlpatterns = [
         views.add_comment, name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('personal/', views.personal, name='personal'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,26 +1,69 @@
+from functools import wraps
+
+from django.conf import settings
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.cache import cache_page
-from django.db.models import Count
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.views.decorators.cache import cache_page, never_cache
+from django.views.decorators.vary import vary_on_cookie
 from django.contrib.auth.decorators import login_required
-from .models import Post, Group, User, Comment, Follow
+from core.decorators import anonymous_cache
+from .models import ArchivedPost, Post, Group, User, Follow
 from .forms import PostForm, CommentForm
 from .paginator import paginate
+from .hot_feed import hot_feed
+from . import archive, outbox, sharding, tasks, write_queue
+from .conditions import (conditional, index_scopes, group_scopes,
+                         profile_scopes, post_scopes, follow_scopes)
+
+
+def reports_write_errors(view_func):
+    """Ошибка писателя (posts.write_queue) — страница 503, а не 500.
 
+    Повторять запись нельзя: при WriteResultUnknown писатель мог её
+    уже выполнить. Так же отвечаем, пока посты автора переезжают между
+    шардами (posts.sharding).
+    """
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        try:
+            return view_func(request, *args, **kwargs)
+        except (write_queue.WriteQueueError, sharding.AuthorMoving) as error:
+            context = {
+                'writing': True,
+                'unknown': isinstance(error, write_queue.WriteResultUnknown),
+            }
+            return render(request, 'core/503.html', context, status=503)
+    return wrapped_view
 
+
+@anonymous_cache
+@conditional(index_scopes)
 @cache_page(20, key_prefix='index_page')
 def index(request):
-    posts_list = Post.objects.select_related('group')
-    page_obj = paginate(request, posts_list)
+    page_obj = hot_feed.index_page(request)
+    if page_obj is None:
+        posts_list = Post.objects.select_related('author', 'group')
+        archived = ArchivedPost.objects.select_related('author', 'group')
+        page_obj = paginate(request, archive.feed(posts_list, archived))
     context = {
-        'page_obj': page_obj
+        'page_obj': page_obj,
+        'index': True
     }
     return render(request, 'posts/index.html', context)
 
 
+@anonymous_cache
+@conditional(group_scopes)
 def group_posts(request, group):
-    group = get_object_or_404(Group, slug=group)
-    posts_list = group.posts.all()
-    page_obj = paginate(request, posts_list)
+    hot_page = hot_feed.group_page(request, group)
+    if hot_page is not None:
+        group, page_obj = hot_page
+    else:
+        group = get_object_or_404(Group, slug=group)
+        posts_list = group.posts.select_related('author')
+        archived = group.archived_posts.select_related('author')
+        page_obj = paginate(request, archive.feed(posts_list, archived))
     context = {
         'group': group,
         'page_obj': page_obj
@@ -28,6 +71,8 @@ def group_posts(request, group):
     return render(request, 'posts/group_list.html', context)
 
 
+@anonymous_cache
+@conditional(profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     following = False
@@ -35,36 +80,59 @@ def profile(request, username):
         following = Follow.objects.filter(
             user=request.user,
             author=author).exists()
-    user_posts = (
-        author.posts.select_related('group')
-        .annotate(counted_posts=Count('author__posts'))
+    user_posts = author.posts.select_related('group')
+    archived = author.archived_posts.select_related('group')
+    page_obj = paginate(
+        request, archive.feed(user_posts, archived, authors=[author.pk])
     )
-    page_obj = paginate(request, user_posts)
     context = {
         'author': author,
         'page_obj': page_obj,
-        'counted_posts': user_posts[0].counted_posts if user_posts else 0,
+        'counted_posts': page_obj.paginator.count,
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@anonymous_cache
+@conditional(post_scopes)
 def post_detail(request, post_id):
-    post = Post.objects.select_related('group', 'author').get(pk=post_id)
+    try:
+        post = sharding.get_post(
+            Post.objects.select_related('group', 'author'), post_id
+        )
+    except Post.DoesNotExist:
+        post = archive.get_post(post_id)
     user = post.author
-    user_posts = Post.objects.filter(author=user).count()
-    comments = Comment.objects.all()
+    user_posts = archive.feed(
+        Post.objects.all(), ArchivedPost.objects.all(), authors=[user.pk]
+    ).count()
+    comments = sharding.local(
+        post.comments.select_related('author'), post._state.db
+    )
     form = CommentForm(request.POST or None)
     context = {
         'form': form,
         'comments': comments,
         'post': post,
-        'user_posts': user_posts
+        'user_posts': user_posts,
+        'archived': isinstance(post, ArchivedPost)
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def pregenerate_thumbnail(image):
+    """Ставит построение миниатюры в очередь core.tasks.
+
+    Без очереди задача выполнилась бы прямо в запросе, и автор ждал бы
+    её вместо первого читателя: тогда миниатюра строится при просмотре.
+    """
+    if settings.TASK_QUEUE_ENABLED:
+        tasks.make_thumbnail.enqueue(image=image.name)
+
+
 @login_required
+@reports_write_errors
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST':
@@ -72,19 +140,22 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            write_queue.save_post(post)
+            if post.image:
+                pregenerate_thumbnail(post.image)
             return redirect('posts:profile', username=request.user.username)
     return render(request, 'posts/create_post.html', {'form': form})
 
 
 @login_required
+@reports_write_errors
 def post_edit(request, post_id):
-    posts = Post.objects.get(pk=post_id)
+    posts = sharding.get_post(Post.objects.all(), post_id)
     form = PostForm(
         data=request.POST or None,
         files=request.FILES or None,
         instance=posts)
-    if request.user != posts.author:
+    if request.user.pk != posts.author_id:
         return redirect(f'/posts/{post_id}')
     if request.method == 'POST':
         form = PostForm(
@@ -92,7 +163,10 @@ def post_edit(request, post_id):
             files=request.FILES or None,
             instance=posts)
         if form.is_valid():
-            form.save()
+            with outbox.atomic(posts):
+                form.save()
+            if 'image' in form.changed_data and posts.image:
+                pregenerate_thumbnail(posts.image)
             return redirect(f'/posts/{post_id}')
     context = {
         'form': form,
@@ -103,43 +177,90 @@ def post_edit(request, post_id):
 
 
 @login_required
+@reports_write_errors
 def add_comment(request, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author', 'group'),
-        pk=post_id
-    )
+    try:
+        post = sharding.get_post(
+            Post.objects.select_related('author', 'group'), post_id
+        )
+    except Post.DoesNotExist:
+        raise Http404
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        write_queue.save_comment(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional(follow_scopes)
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
     author_list = request.user.follower.all().values_list('author', flat=True)
-    posts = Post.objects.select_related().filter(author__in=author_list)
-    page_obj = paginate(request, posts)
-    context = {'page_obj': page_obj}
+    posts = Post.objects.select_related('author', 'group')
+    archived = ArchivedPost.objects.select_related('author', 'group')
+    page_obj = paginate(
+        request, archive.feed(posts, archived, authors=author_list)
+    )
+    context = {'page_obj': page_obj, 'follow': True}
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@reports_write_errors
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if request.user != author and not Follow.objects.filter(
-            user=request.user, author=author).exists():
-        Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        write_queue.follow(request.user, author)
     return redirect('posts:profile', username=author)
 
 
 @login_required
+@reports_write_errors
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    subscriber = Follow.objects.filter(user=request.user, author=author)
-    if subscriber:
-        subscriber.delete()
+    write_queue.unfollow(request.user, author)
     return redirect('posts:profile', username=author)
+
+
+@never_cache
+@vary_on_cookie
+def personal(request):
+    """Личные блоки для страниц, закэшированных в режиме гостя."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'authenticated': False})
+    templates = {
+        'nav': 'includes/nav.html',
+        'switcher': 'posts/includes/switcher.html',
+        'follow': 'posts/includes/follow_button.html',
+        'comment_form': 'posts/includes/comment_form.html',
+    }
+    # Активные пункты меню и вкладки — как на самой странице.
+    view_name = request.GET.get('view', '')
+    context = {
+        'view_name': view_name,
+        'index': view_name == 'posts:index',
+        'follow': view_name == 'posts:follow_index',
+    }
+    username = request.GET.get('username')
+    if username:
+        author = get_object_or_404(User, username=username)
+        context['author'] = author
+        context['following'] = Follow.objects.filter(
+            user=request.user, author=author).exists()
+    post_id = request.GET.get('post_id')
+    if post_id and post_id.isdigit():
+        context['post'] = Post(pk=int(post_id))
+        context['form'] = CommentForm()
+    parts = {}
+    for part in request.GET.getlist('part'):
+        if part not in templates:
+            continue
+        if part == 'follow' and 'author' not in context:
+            continue
+        if part == 'comment_form' and 'post' not in context:
+            continue
+        parts[part] = render_to_string(templates[part], context, request)
+    return JsonResponse({'authenticated': True, 'parts': parts})
@@ -0,0 +1,160 @@
+"""Прогрев кэшей гостевых страниц.
+
+Первый гость после записи или после перезапуска воркеров платит полный
+рендер: пуст кэш страниц, буфер горячей ленты, миниатюры строятся на
+лету. Прогрев заранее запрашивает такие страницы
+как гость через весь стек middleware, поэтому заполняются те же кэши,
+что и при обычном запросе. Одновременно выполняется не больше
+WARM_CONCURRENCY запросов.
+
+После записи потребитель outbox posts.consumers.WarmingConsumer отдаёт
+сюда затронутые ленты, и в фоне прогреваются их первые WARM_PAGES
+страниц. При деплое manage.py warm_cache прогревает самые частые адреса
+из журнала запросов.
+
+Без WARM_BASE_URL страницы рендерятся в вызывающем процессе и попадают в
+его кэш, поэтому отдельной команде такой прогрев полезен только с общим
+бэкендом кэша (shared_cache()).
+"""
+import json
+import re
+import threading
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.error import HTTPError
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections, transaction
+
+from core import guest
+from core.metrics import registry
+
+# Строка журнала nginx в формате combined.
+COMBINED = re.compile(r'"(?:GET|HEAD) (\S+) HTTP/[\d.]+" (\d{3}) ')
+
+_pending = set()
+_lock = threading.Lock()
+_executor = None
+
+
+def shared_cache():
+    """Кэш видят и другие процессы: его можно прогреть из этого."""
+    return not isinstance(caches['default'], (DummyCache, LocMemCache))
+
+
+def fetch(url, base_url=None):
+    """Запрашивает страницу как гость: код ответа и тело."""
+    if base_url is None:
+        base_url = settings.WARM_BASE_URL
+    if not base_url:
+        response = guest.get(url, settings.WARM_HOST)
+        return response.status_code, response.content
+    try:
+        with urllib.request.urlopen(
+            base_url.rstrip('/') + url, timeout=settings.WARM_TIMEOUT
+        ) as response:
+            return response.status, response.read()
+    except HTTPError as error:
+        return error.code, b''
+    except OSError:
+        return None, b''
+
+
+def warm_feed(url, pages, base_url=None):
+    """Первые pages страниц ленты, но не дальше последней."""
+    results = []
+    for number in range(1, pages + 1):
+        page_url = url if number == 1 else f'{url}?page={number}'
+        status, content = fetch(page_url, base_url)
+        registry.inc('yatube_warmed_pages_total', status=str(status))
+        results.append((page_url, status))
+        if status != 200 or f'?page={number + 1}"'.encode() not in content:
+            break
+    return results
+
+
+def _in_thread(job, url):
+    try:
+        return job(url)
+    finally:
+        # Потоки пула живут недолго, их соединения закрываем сразу.
+        connections.close_all()
+
+
+def warm(urls, pages=1, concurrency=None, base_url=None):
+    """Прогревает адреса и возвращает [(адрес, код ответа)]."""
+    concurrency = concurrency or settings.WARM_CONCURRENCY
+    job = partial(warm_feed, pages=pages, base_url=base_url)
+    if concurrency <= 1:
+        results = map(job, urls)
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(partial(_in_thread, job), urls))
+    return [result for feed in results for result in feed]
+
+
+def warm_later(urls):
+    """Прогрев в фоне: задачей core.tasks или в пуле потоков процесса.
+
+    Задача ложится в транзакцию вызывающего, а пул получает адреса только
+    после её фиксации: иначе прогрев увидел бы страницы без записи.
+    Адреса, которые уже ждут прогрева в этом процессе, не добавляются:
+    пачка записей в одну ленту прогревает её один раз.
+    """
+    if settings.TASK_QUEUE_ENABLED:
+        from .tasks import warm_pages
+        warm_pages.enqueue(urls=list(urls))
+        return
+    transaction.on_commit(partial(_submit, list(urls)))
+
+
+def _submit(urls):
+    global _executor
+    with _lock:
+        urls = [url for url in urls if url not in _pending]
+        _pending.update(urls)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.WARM_CONCURRENCY, thread_name_prefix='warm'
+            )
+    for url in urls:
+        _executor.submit(_warm_pending, url)
+
+
+def _warm_pending(url):
+    # Адрес снимается до рендера: запись во время прогрева прогреет
+    # ленту ещё раз.
+    with _lock:
+        _pending.discard(url)
+    _in_thread(partial(warm_feed, pages=settings.WARM_PAGES), url)
+
+
+def _parse(line):
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None, None
+        if record.get('method') not in ('GET', 'HEAD'):
+            return None, None
+        return record.get('path'), record.get('status')
+    match = COMBINED.search(line)
+    if match is None:
+        return None, None
+    return match.group(1), int(match.group(2))
+
+
+def visits(lines):
+    """Частота удачных GET-адресов в журнале core.perf или nginx."""
+    counter = Counter()
+    for line in lines:
+        path, status = _parse(line)
+        if path is not None and status == 200:
+            counter[path] += 1
+    return counter
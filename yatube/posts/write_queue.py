@@ -0,0 +1,315 @@
+"""Один писатель на хост для записей постов, комментариев и подписок.
+
+При WRITE_QUEUE_ENABLED представления не пишут в SQLite сами, а
+отправляют операцию процессу manage.py write_queue через Unix-сокет
+WRITE_QUEUE_SOCKET и ждут его ответа. Писатель копит операции не дольше
+WRITE_QUEUE_BATCH_WAIT секунд и фиксирует пачку одной транзакцией, а
+каждую операцию — в своей точке сохранения: ошибка одной не отменяет
+соседние. Ответ уходит после COMMIT, поэтому для вызывающего запись
+остаётся синхронной.
+
+Сигналы моделей писатель отправляет в своём процессе, там же пишутся и
+события outbox (posts.outbox), а буферы вызывающего (hot_feed)
+обновляются повторной отправкой post_save/post_delete с replayed=True
+после ответа. Если к писателю не удалось подключиться, запись
+выполняется на месте, как без очереди; если операция уже отправлена, но
+ответа нет, повторять её нельзя, и представление сообщает об ошибке.
+"""
+import json
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.dateparse import parse_datetime
+
+from core.metrics import LATENCY_BUCKETS, registry
+from core.routers import mark_write
+
+from . import outbox
+from .models import Comment, Follow, Post
+
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class WriteQueueError(Exception):
+    """Писатель принял операцию, но выполнить её не смог."""
+
+
+class WriterUnavailable(Exception):
+    """Писатель не запущен: операция ему не передана."""
+
+
+class WriteResultUnknown(WriteQueueError):
+    """Операция передана, но ответа нет: писатель мог её выполнить."""
+
+
+def apply_create_post(text, author_id, group_id, image):
+    # Не objects.create(): шард выбирается по экземпляру (posts.sharding).
+    post = Post(
+        text=text, author_id=author_id, group_id=group_id, image=image
+    )
+    with outbox.atomic(post):
+        post.save(force_insert=True)
+    return {'pk': post.pk, 'pub_date': post.pub_date.isoformat()}
+
+
+def apply_create_comment(text, author_id, post_id):
+    comment = Comment(text=text, author_id=author_id, post_id=post_id)
+    with outbox.atomic(comment):
+        comment.save(force_insert=True)
+    return {'pk': comment.pk, 'created': comment.created.isoformat()}
+
+
+def apply_follow(user_id, author_id):
+    exists = Follow.objects.filter(
+        user_id=user_id, author_id=author_id).exists()
+    if exists:
+        return {'pk': None}
+    follow = Follow.objects.create(user_id=user_id, author_id=author_id)
+    return {'pk': follow.pk}
+
+
+def apply_unfollow(user_id, author_id):
+    deleted, _ = Follow.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    return {'deleted': deleted}
+
+
+OPERATIONS = {
+    'create_post': apply_create_post,
+    'create_comment': apply_create_comment,
+    'follow': apply_follow,
+    'unfollow': apply_unfollow,
+}
+
+
+def submit(operation, **params):
+    """Отправляет операцию писателю и ждёт результат."""
+    started = time.perf_counter()
+    message = {'operation': operation, 'params': params}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(settings.WRITE_QUEUE_TIMEOUT)
+        try:
+            client.connect(settings.WRITE_QUEUE_SOCKET)
+        except OSError as error:
+            raise WriterUnavailable(str(error)) from error
+        # Дальше операция может быть уже выполнена: повторять её на месте
+        # нельзя, иначе запись задвоится.
+        try:
+            client.sendall(json.dumps(message).encode() + b'\n')
+            with client.makefile('rb') as reader:
+                line = reader.readline()
+        except OSError as error:
+            raise WriteResultUnknown(str(error)) from error
+    if not line:
+        raise WriteResultUnknown('писатель закрыл соединение без ответа')
+    registry.observe(
+        'yatube_write_queue_wait_seconds',
+        time.perf_counter() - started, LATENCY_BUCKETS
+    )
+    reply = json.loads(line)
+    if 'error' in reply:
+        raise WriteQueueError(reply['error'])
+    return reply['result']
+
+
+def _queued(operation, **params):
+    """Результат писателя или None, если писать надо на месте.
+
+    На месте пишем, только если писатель недоступен; если операция
+    уже отправлена, ошибка уходит вызывающему.
+    """
+    if not settings.WRITE_QUEUE_ENABLED:
+        return None
+    try:
+        result = submit(operation, **params)
+    except WriterUnavailable:
+        registry.inc('yatube_write_queue_fallbacks_total')
+        return None
+    # Запись сделал писатель, но читать свои записи пользователь должен
+    # из основной базы.
+    mark_write()
+    return result
+
+
+def _replay(signal, instance, **kwargs):
+    signal.send(
+        sender=type(instance), instance=instance,
+        using=DEFAULT_DB_ALIAS, replayed=True, **kwargs
+    )
+
+
+def save_post(post):
+    """Сохраняет новый пост; картинка к этому моменту уже в хранилище."""
+    if post.image and not post.image._committed:
+        post.image.save(post.image.name, post.image.file, save=False)
+    result = _queued(
+        'create_post', text=post.text, author_id=post.author_id,
+        group_id=post.group_id, image=post.image.name or '',
+    )
+    if result is None:
+        with outbox.atomic(post):
+            post.save(force_insert=True)
+        return post
+    post.pk = result['pk']
+    post.pub_date = parse_datetime(result['pub_date'])
+    _replay(post_save, post, created=True, raw=False, update_fields=None)
+    return post
+
+
+def save_comment(comment):
+    result = _queued(
+        'create_comment', text=comment.text,
+        author_id=comment.author_id, post_id=comment.post_id,
+    )
+    if result is None:
+        with outbox.atomic(comment):
+            comment.save(force_insert=True)
+        return comment
+    comment.pk = result['pk']
+    comment.created = parse_datetime(result['created'])
+    _replay(post_save, comment, created=True, raw=False, update_fields=None)
+    return comment
+
+
+def follow(user, author):
+    result = _queued('follow', user_id=user.pk, author_id=author.pk)
+    if result is None:
+        if not Follow.objects.filter(user=user, author=author).exists():
+            with transaction.atomic(savepoint=False):
+                Follow.objects.create(user=user, author=author)
+        return
+    if result['pk'] is not None:
+        instance = Follow(pk=result['pk'], user=user, author=author)
+        _replay(
+            post_save, instance, created=True, raw=False, update_fields=None
+        )
+
+
+def unfollow(user, author):
+    result = _queued('unfollow', user_id=user.pk, author_id=author.pk)
+    if result is None:
+        Follow.objects.filter(user=user, author=author).delete()
+        return
+    if result['deleted']:
+        _replay(post_delete, Follow(user=user, author=author))
+
+
+class Job:
+
+    def __init__(self, message):
+        self.message = message
+        self.reply = None
+        self.done = threading.Event()
+
+
+class Writer:
+    """Поток, который выполняет операции пачками."""
+
+    def __init__(self, batch_size=None, batch_wait=None):
+        self.batch_size = batch_size or settings.WRITE_QUEUE_BATCH_SIZE
+        if batch_wait is None:
+            batch_wait = settings.WRITE_QUEUE_BATCH_WAIT
+        self.batch_wait = batch_wait
+        self.jobs = queue.Queue()
+        self.stopped = False
+
+    def put(self, message):
+        """Ставит операцию в очередь и ждёт ответ писателя."""
+        job = Job(message)
+        self.jobs.put(job)
+        job.done.wait()
+        return job.reply
+
+    def collect(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                if timeout <= 0:
+                    batch.append(self.jobs.get_nowait())
+                else:
+                    batch.append(self.jobs.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            self.commit(batch)
+        except Exception:
+            # SQLite проверяет внешние ключи Django только при COMMIT,
+            # и одна плохая операция отменила бы всю пачку: повторяем
+            # операции по одной.
+            for job in batch:
+                try:
+                    self.commit([job])
+                except Exception as error:
+                    job.reply = {'error': f'{type(error).__name__}: {error}'}
+        registry.observe(
+            'yatube_write_queue_batch_size', len(batch), BATCH_BUCKETS
+        )
+        registry.observe(
+            'yatube_write_queue_commit_seconds',
+            time.perf_counter() - started, LATENCY_BUCKETS
+        )
+        for job in batch:
+            job.done.set()
+
+    def commit(self, batch):
+        with transaction.atomic():
+            for job in batch:
+                job.reply = self.apply(job.message)
+
+    @staticmethod
+    def apply(message):
+        operation = OPERATIONS.get(message.get('operation'))
+        if operation is None:
+            return {'error': 'неизвестная операция'}
+        try:
+            with transaction.atomic():
+                return {'result': operation(**message.get('params', {}))}
+        except Exception as error:
+            return {'error': f'{type(error).__name__}: {error}'}
+
+    def serve_forever(self):
+        try:
+            while not self.stopped:
+                batch = [job for job in self.collect() if job is not None]
+                if batch:
+                    self.run_batch(batch)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped = True
+        # Будим поток, если он ждёт первую операцию пачки.
+        self.jobs.put(None)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            message = json.loads(line)
+        except ValueError:
+            reply = {'error': 'некорректный запрос'}
+        else:
+            reply = self.server.writer.put(message)
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, writer):
+        self.writer = writer
+        super().__init__(path, RequestHandler)
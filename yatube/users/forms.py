@@ -1,5 +1,8 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
 from django.contrib.auth import get_user_model
+from django.template import loader
+
+from . import tasks
 
 
 User = get_user_model()
@@ -13,3 +16,23 @@ class CreationForm(UserCreationForm):
         model = User
         # укажем, какие поля должны быть видны в форме и в каком порядке
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+#  письмо для сброса пароля отправляет фоновая задача, а не запрос
+class QueuedPasswordResetForm(PasswordResetForm):
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        subject = loader.render_to_string(subject_template_name, context)
+        html_body = None
+        if html_email_template_name is not None:
+            html_body = loader.render_to_string(
+                html_email_template_name, context
+            )
+        tasks.send_email.enqueue(
+            subject=''.join(subject.splitlines()),
+            body=loader.render_to_string(email_template_name, context),
+            from_email=from_email,
+            to=to_email,
+            html_body=html_body,
+        )
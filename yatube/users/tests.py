@@ -0,0 +1,32 @@
+import os
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from core.models import Task
+
+User = get_user_model()
+
+
+@override_settings(
+    TASK_QUEUE_ENABLED=True,
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+)
+class PasswordResetTest(TestCase):
+    def test_email_sent_by_task(self):
+        User.objects.create_user(
+            username='test_reset', email='reset@example.com',
+            password='Test_password1'
+        )
+        response = Client().post(
+            reverse('users:password_reset'), {'email': 'reset@example.com'}
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Task.objects.get().queue, 'email')
+        call_command('run_tasks', '--once', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reset@example.com'])
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
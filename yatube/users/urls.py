@@ -6,6 +6,7 @@ from django.contrib.auth.views import (LogoutView,
                                        PasswordResetDoneView)
 from django.urls import path, reverse_lazy
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -24,6 +25,7 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view(
+            form_class=QueuedPasswordResetForm,
             template_name='users/password_reset_form.html',
             success_url=reverse_lazy('users:password_reset_done')
         ),
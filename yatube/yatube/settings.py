@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -53,20 +54,35 @@ INSTALLED_APPS = [
     'sorl.thumbnail'
 ]
 
+# conditions — валидаторы ETag и Last-Modified (posts.conditions): их
+# подменяет запись в любом процессе, поэтому кэш должен быть общим для
+# всех процессов хоста. Если процессы живут на разных хостах, сюда
+# нужен memcached или Redis
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.backends.InstrumentedLocMemCache',
+    },
+    'conditions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_conditions'),
+    },
 }
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.MemoryProfileMiddleware',
+    'core.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.RequestCoalescingMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -74,7 +90,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATE_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -99,9 +115,103 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт минуту и переиспользуется между запросами
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплики для чтения (core.routers): псевдонимы из DATABASES. Чтения
+# представлений из REPLICA_VIEWS идут на реплики, а пользователь после
+# записи REPLICA_PIN_SECONDS секунд читает из default. Для локальной
+# проверки реплика — копия файла SQLite, которую обновляет
+# manage.py refresh_replica --interval 5:
+#     DATABASES['replica'] = {
+#         'ENGINE': 'django.db.backends.sqlite3',
+#         'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#         'TEST': {'MIRROR': 'default'},
+#     }
+#     DATABASE_REPLICAS = ['replica']
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+DATABASE_REPLICAS = []
+REPLICA_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+]
+# Окно закрепления должно быть больше отставания реплик
+REPLICA_PIN_SECONDS = 15
+REPLICA_PIN_COOKIE = 'pin_primary'
+
+# Шардирование постов и комментариев по автору (posts.sharding):
+# псевдонимы баз-шардов из DATABASES. Шарды создаёт
+# manage.py migrate --database <шард>, авторов между ними переносит
+# manage.py rebalance_shards. SHARD_ROUTE_TIMEOUT — сколько секунд
+# процесс помнит шард автора и поста, то есть как долго после ребаланса
+# он может читать старый шард. SHARD_NODE_ID (0–1023, из переменной
+# окружения YATUBE_NODE_ID) входит в id новых постов и комментариев: у
+# каждого процесса, который пишет в шарды, он должен быть свой
+SHARD_DATABASES = []
+SHARD_VIRTUAL_NODES = 64
+SHARD_ROUTE_TIMEOUT = 60
+SHARD_NODE_ID = int(os.environ.get('YATUBE_NODE_ID', '0'))
+
+# PRAGMA для каждого нового соединения SQLite (core.sqlite). WAL не
+# блокирует читателей на время записи, synchronous=NORMAL в WAL теряет
+# при сбое питания только последние транзакции, но не портит базу;
+# busy_timeout — сколько миллисекунд ждать чужую блокировку записи
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — в килобайтах: 64 МБ
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+}
+
+# Бюджет времени SQL на запрос (core.budget): секунды на представление
+# по имени URL, считая от его начала. Когда время выходит, SQLite
+# прерывает текущий запрос, гость получает последнюю копию страницы не
+# старше QUERY_BUDGET_STALE_TIMEOUT секунд, остальные — 503 с
+# Retry-After. QUERY_BUDGET_CHECK_STEPS — через сколько инструкций
+# виртуальной машины SQLite сверяться с часами
+QUERY_BUDGETS = {
+    'posts:index': 1.0,
+    'posts:group_list': 1.0,
+    'posts:profile': 1.0,
+    'posts:post_detail': 1.0,
+    'posts:follow_index': 1.5,
+}
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_CHECK_STEPS = 10000
+QUERY_BUDGET_STALE_TIMEOUT = 60 * 10
+QUERY_BUDGET_RETRY_AFTER = 5
+
+# Размыкатель цепи (core.breaker): BREAKER_THRESHOLD блокировок SQLite
+# или прерванных по бюджету запросов за BREAKER_WINDOW секунд переводят
+# процесс на BREAKER_OPEN_SECONDS секунд в режим только для чтения.
+# Страницы тогда берутся из копии последнего удачного ответа гостю или
+# из статического снимка: DEGRADED_SNAPSHOT_PATH — функция, которая
+# по пути и номеру страницы возвращает файл снимка (None — снимка нет)
+BREAKER_THRESHOLD = 5
+BREAKER_WINDOW = 10
+BREAKER_OPEN_SECONDS = 15
+DEGRADED_SNAPSHOT_PATH = 'posts.snapshots.snapshot_path'
+
+# Один писатель на хост (posts.write_queue, manage.py write_queue):
+# посты, комментарии и подписки пишутся пачками одной транзакцией.
+# BATCH_WAIT — сколько секунд копить пачку, TIMEOUT — сколько ждать ответ
+WRITE_QUEUE_ENABLED = False
+WRITE_QUEUE_SOCKET = os.path.join(tempfile.gettempdir(), 'yatube_writer.sock')
+WRITE_QUEUE_BATCH_SIZE = 50
+WRITE_QUEUE_BATCH_WAIT = 0.002
+WRITE_QUEUE_TIMEOUT = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -151,3 +261,184 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 LIMIT = 10
+
+# Кольцевой буфер свежих постов для первых страниц ленты (posts.hot_feed)
+HOT_FEED_ENABLED = False
+HOT_FEED_SIZE = 30
+HOT_FEED_POLL_INTERVAL = 5
+
+# Время жизни валидаторов ETag/Last-Modified (posts.conditions). Запись
+# меняет их сразу; истёкшие собираются заново с новой версией, и клиенты
+# один раз получают страницы целиком
+CONDITIONAL_GET_TIMEOUT = 60 * 60 * 24
+
+# max-age общих страниц для гостей (core.decorators.anonymous_cache),
+# 0 отключает режим
+ANONYMOUS_CACHE_TIMEOUT = 60 * 10
+
+# Архив старых постов (posts.archive): manage.py archive_posts переносит
+# посты старше ARCHIVE_AFTER_DAYS дней с комментариями в архивные таблицы
+# по ARCHIVE_BATCH_SIZE за транзакцию. Ленты читают архив, только когда
+# их листают дальше последнего свежего поста
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH_SIZE = 500
+
+# Transactional outbox (posts.outbox): события о постах, комментариях и
+# подписках пишутся в транзакции самого изменения, а OUTBOX_CONSUMERS
+# читают их пачками по OUTBOX_BATCH_SIZE, занимая контрольную точку на
+# OUTBOX_LEASE_SECONDS секунд. OUTBOX_DELIVERY: thread — в фоновом
+# потоке после фиксации (и раз в OUTBOX_POLL_INTERVAL секунд); external
+# — только в manage.py consume_outbox, чтобы вынести работу из
+# веб-процессов; inline — в том же запросе после фиксации, без повторов:
+# это десяток лишних запросов на каждую запись, режим для отладки.
+# Упавшая пачка повторяется OUTBOX_RETRIES раз с паузой от
+# OUTBOX_RETRY_DELAY секунд, каждый раз вдвое длиннее. Прочитанные всеми
+# события старше OUTBOX_RETENTION_DAYS дней удаляются
+OUTBOX_CONSUMERS = [
+    'posts.consumers.ConditionsConsumer',
+    'posts.consumers.SnapshotsConsumer',
+    'posts.consumers.WarmingConsumer',
+]
+OUTBOX_DELIVERY = 'thread'
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 1
+OUTBOX_LEASE_SECONDS = 60
+OUTBOX_RETRIES = 3
+OUTBOX_RETRY_DELAY = 0.1
+OUTBOX_RETENTION_DAYS = 7
+
+# Очередь фоновых задач (core.tasks): при TASK_QUEUE_ENABLED задачи
+# пишутся в базу и их выполняет manage.py run_tasks в пуле TASK_EXECUTOR
+# ('thread' или 'process') из TASK_WORKERS обработчиков, иначе — сразу на
+# месте. TASK_QUEUES — сколько задач каждой очереди выполняется
+# одновременно. Упавшая задача повторяется, всего до TASK_MAX_ATTEMPTS
+# попыток, с паузой от TASK_RETRY_DELAY секунд, каждый раз вдвое длиннее;
+# задача, которая выполняется дольше TASK_TIMEOUT секунд, считается
+# брошенной и запускается снова
+TASK_QUEUE_ENABLED = False
+TASK_QUEUES = {'default': 2, 'email': 2, 'images': 1, 'warming': 2}
+TASK_WORKERS = 4
+TASK_EXECUTOR = 'thread'
+TASK_POLL_INTERVAL = 1
+TASK_MAX_ATTEMPTS = 5
+TASK_RETRY_DELAY = 10
+TASK_TIMEOUT = 600
+
+# Прогрев кэшей (posts.warming): при WARM_AFTER_WRITE после записи в фоне
+# запрашиваются первые WARM_PAGES страниц затронутых лент, а
+# manage.py warm_cache при деплое запрашивает WARM_TOP_URLS самых частых
+# адресов из журнала, не больше WARM_CONCURRENCY одновременно. Страницы
+# запрашиваются по WARM_BASE_URL, а если он пуст — в самом процессе с
+# хостом WARM_HOST: от хоста зависят ключи кэша страниц. Без
+# WARM_BASE_URL manage.py warm_cache работает только с общим кэшем
+WARM_AFTER_WRITE = False
+WARM_PAGES = 2
+WARM_TOP_URLS = 200
+WARM_CONCURRENCY = 4
+WARM_BASE_URL = ''
+WARM_HOST = 'localhost'
+WARM_TIMEOUT = 10
+
+# Статические снимки гостевых страниц (manage.py render_snapshots).
+# SNAPSHOT_HOST — хост, с которым страницы рендерятся в самом процессе
+SNAPSHOT_ROOT = os.path.join(BASE_DIR, 'snapshots')
+SNAPSHOT_HOST = 'localhost'
+
+# Склейка одинаковых одновременных запросов гостей
+# (core.middleware.RequestCoalescingMiddleware): сколько секунд ждать
+# чужой ответ, 0 отключает склейку
+COALESCE_TIMEOUT = 5
+COALESCE_POLL_INTERVAL = 0.05
+
+# Метрики запроса (core.middleware.ServerTimingMiddleware): доля
+# запросов с заголовком Server-Timing и доля запросов в логе core.perf.
+# Server-Timing раскрывает время SQL и шаблонов любому клиенту, поэтому
+# по умолчанию выключен; бенчмарки и отладка включают его сами
+SERVER_TIMING_SAMPLE_RATE = 0
+PERF_LOG_SAMPLE_RATE = 0.01
+
+# Эндпоинт /metrics (core.metrics): процессы сбрасывают счётчики в
+# METRICS_DIR не чаще раза в METRICS_FLUSH_INTERVAL секунд, файлы
+# завершившихся процессов удаляет сам эндпоинт. Без METRICS_ENABLED
+# файлов нет, а Server-Timing и core.perf продолжают работать.
+# Эндпоинт отвечает только с заголовком Authorization: Bearer
+# METRICS_TOKEN (из переменной окружения YATUBE_METRICS_TOKEN), без
+# токена он закрыт
+METRICS_ENABLED = True
+METRICS_TOKEN = os.environ.get('YATUBE_METRICS_TOKEN', '')
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube_metrics')
+METRICS_FLUSH_INTERVAL = 1
+
+INTERNAL_IPS = [
+    '127.0.0.1',
+]
+
+# Поиск N+1 запросов (core.nplusone): 'warn', 'raise' или None.
+# Тесты запускаются в режиме 'raise' (core.testing, tests/fixtures)
+NPLUSONE_MODE = 'warn' if DEBUG else None
+NPLUSONE_THRESHOLD = 3
+NPLUSONE_IGNORE = [
+    # sorl-thumbnail читает своё хранилище по ключу на каждую картинку
+    'thumbnail_kvstore',
+]
+TEST_RUNNER = 'core.testing.DiscoverRunner'
+
+# Журнал медленных SQL-запросов с планом выполнения (core.slowlog):
+# порог в секундах, None отключает журнал. Разбор — manage.py slow_queries
+SLOW_QUERY_THRESHOLD = 0.1
+SLOW_QUERY_LOG = os.path.join(tempfile.gettempdir(), 'yatube_slow_queries.log')
+
+# Профилирование запроса по требованию (core.profiling): сотрудник
+# добавляет ?profile=1 или заголовок X-Profile, профиль и трасса SQL
+# сохраняются в PROFILE_ROOT, хранятся последние PROFILE_KEEP.
+# Список — /admin/profiles/
+PROFILE_ENABLED = True
+PROFILE_ROOT = os.path.join(BASE_DIR, 'profiles')
+PROFILE_KEEP = 50
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# Рост памяти по представлениям на снимках tracemalloc (core.memory).
+# Дорого: включать на одном однопоточном воркере. Отчёт — /admin/memory/.
+# MEMORY_PROFILE_SITES — сколько самых крупных мест выделения помнить
+# для каждого представления
+MEMORY_PROFILE_ENABLED = False
+MEMORY_PROFILE_FRAMES = 10
+MEMORY_PROFILE_TOP = 20
+MEMORY_PROFILE_SITES = 200
+
+THUMBNAIL_BACKEND = 'core.backends.InstrumentedThumbnailBackend'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'core.perf': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.nplusone': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'core.slowlog': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
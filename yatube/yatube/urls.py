@@ -17,9 +17,21 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.views import (
+    memory_profile, metrics, request_profile, request_profiles
+)
 
 urlpatterns = [
+    path(
+        'admin/profiles/', request_profiles, name='request_profiles'
+    ),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        request_profile, name='request_profile'
+    ),
+    path('admin/memory/', memory_profile, name='memory_profile'),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('auth/', include('users.urls')),
     path('', include('posts.urls', namespace='posts')),
     path('auth/', include('django.contrib.auth.urls')),